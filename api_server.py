@@ -0,0 +1,112 @@
+"""
+RAG 그래프를 HTTP로 제공하는 비동기 API 서버입니다.
+
+Streamlit 앱(app.py)은 세션마다 스크립트 전체를 동기적으로 다시 실행하므로 동시 사용자 수만큼
+워커가 필요합니다. 이 서버는 같은 그래프(create_graph)를 astream/ainvoke로 실행합니다.
+그래프의 노드는 비동기 구현을 함께 가지고 있어 LLM 호출은 공유 비동기 HTTP 클라이언트로 이벤트 루프에서
+처리되고, FAISS/SQLite 검색처럼 블로킹되는 작업만 스레드 풀에서 실행됩니다. 따라서
+하나의 프로세스가 여러 요청을 동시에 처리하며, 샤드와 그래프는 프로세스 레지스트리에서
+모든 요청이 공유합니다. 로드 밸런서 뒤에 여러 프로세스를 띄워 확장할 수 있습니다.
+
+엔드포인트:
+    GET  /health        서버 상태와 레지스트리에 상주 중인 인덱스 수
+    GET  /literatures   검색할 수 있는 작품 목록
+    POST /indexes       선택한 작품들의 인덱스를 미리 준비 (없으면 생성)
+    POST /ask           질문에 답변 (stream=true이면 NDJSON으로 진행 상황과 답변 토큰을 스트리밍)
+
+실행:
+    uvicorn api_server:app --host 0.0.0.0 --port 8000
+"""
+import json
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from utils.db_utils import get_all_literatures, get_literatures_by_titles, init_chunks_schema
+from utils.graph_utils import astream_answer
+from utils.llm_cache_utils import configure_llm_cache
+from utils.pipeline_utils import MixedLanguageError, prepare_rag_app
+from utils.registry_utils import get_vector_store_registry
+from utils.tracing_utils import trace_request
+
+# API로 불러온 샤드와 그래프의 레지스트리 참조자 이름 (요청이 없으면 SESSION_REF_TTL_SECONDS 후 만료)
+API_OWNER = "api"
+FAILED_ANSWER = "죄송합니다, 답변을 생성하지 못했습니다."
+
+load_dotenv()
+configure_llm_cache("sqlite")
+init_chunks_schema()
+app = FastAPI(title="Literature RAG API")
+
+class IndexRequest(BaseModel):
+    titles: List[str] = Field(..., min_length=1, description="Titles of the books to search together.")
+
+class AskRequest(IndexRequest):
+    question: str = Field(..., min_length=1)
+    stream: bool = Field(True, description="Stream progress and answer tokens as NDJSON.")
+
+def _prepare(titles: List[str]) -> Dict[str, Any]:
+    """Loads the shards and graph for the titles (blocking; run it in the thread pool)."""
+    details = get_literatures_by_titles(titles)
+    missing = sorted(set(titles) - {detail['title'] for detail in details})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Unknown titles: {missing}")
+    try:
+        prepared = prepare_rag_app(details, API_OWNER)
+    except MixedLanguageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    prepared["titles"] = [detail['title'] for detail in details]
+    return prepared
+
+def _serialize_documents(documents) -> List[Dict[str, Any]]:
+    return [{"content": doc.page_content, "metadata": doc.metadata} for doc in documents or []]
+
+def _final_payload(final_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "answer": final_state.get("generation") or FAILED_ANSWER,
+        "keywords": final_state.get("keywords", []),
+        "sources": _serialize_documents(final_state.get("documents")),
+    }
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "resident": len(get_vector_store_registry().resident())}
+
+@app.get("/literatures")
+async def list_literatures():
+    return await run_in_threadpool(get_all_literatures)
+
+@app.post("/indexes")
+async def prepare_index(request: IndexRequest):
+    prepared = await run_in_threadpool(_prepare, request.titles)
+    return {"titles": prepared["titles"], "language": prepared["language"], "graph_key": list(prepared["graph_key"])}
+
+@app.post("/ask")
+async def ask(request: AskRequest):
+    prepared = await run_in_threadpool(_prepare, request.titles)
+    rag_app = prepared["rag_app"]
+    inputs = {"question": request.question}
+
+    if not request.stream:
+        with trace_request(request.question) as tracer:
+            final_state = await rag_app.ainvoke(inputs, config={"callbacks": [tracer]})
+        return _final_payload(final_state)
+
+    async def events():
+        # 노드 업데이트를 모아 마지막에 답변, 키워드, 출처를 한 번에 보냅니다.
+        final_state = {}
+        with trace_request(request.question) as tracer:
+            async for event in astream_answer(rag_app, inputs, config={"callbacks": [tracer]}):
+                if event[0] == "answer":
+                    yield json.dumps({"type": "answer", "text": event[1]}, ensure_ascii=False) + "\n"
+                    continue
+                _, node_name, update = event
+                final_state.update(update or {})
+                yield json.dumps({"type": "node", "node": node_name}) + "\n"
+        yield json.dumps({"type": "final", **_final_payload(final_state)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
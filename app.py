@@ -4,28 +4,31 @@ RAG 챗봇을 위한 메인 Streamlit 애플리케이션 파일입니다.
 이 파일은 사용자 인터페이스(UI), 상태 관리, 그리고 사용자의 소설 선택부터
 챗봇의 답변 표시까지 전체 RAG 파이프라인을 제어하고 조율하는 역할을 합니다.
 """
+import uuid
 import streamlit as st
 from dotenv import load_dotenv
-from pathlib import Path
-from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_openai import OpenAIEmbeddings
 
-from utils.db_utils import get_all_literatures, get_literature_details_by_titles
-from utils.load_and_split_text_utils import split_documents
-from utils.vector_store_utils import get_or_create_vector_store
+from utils.db_utils import get_all_literatures, get_literatures_by_titles, init_chunks_schema
+from utils.pipeline_utils import (
+    get_corpus_language, load_book_chunks, prepare_rag_app, MixedLanguageError, EMBEDDING_MODEL_NAME,
+)
+from utils.registry_utils import get_vector_store_registry
+from utils.llm_cache_utils import configure_llm_cache
 from utils.rag_chain_utils import create_conversational_rag_chain
-from utils.graph_utils import create_graph
-from utils.highlight_utils import highlight_text
+from utils.graph_utils import stream_answer
+from utils.tracing_utils import trace_request
+from utils.highlight_utils import find_keyword_spans, render_highlights
 
 def main():
     load_dotenv()
+    # 모든 세션이 공유하는 LLM 응답 캐시 (재실행 시에도 기존 캐시를 유지합니다)
+    configure_llm_cache("sqlite")
     st.set_page_config(page_title="RAG Chatbot", page_icon="🤖", layout="wide")
     st.title("RAG 챗봇")
 
-    CWD = Path.cwd()
-    
     try:
+        init_chunks_schema()
         all_literatures = get_all_literatures()
         book_titles = [lit['title'] for lit in all_literatures]
     except Exception as e:
@@ -50,37 +53,52 @@ def main():
     if 'selected_book_titles' in st.session_state and st.session_state.selected_book_titles:
         
         # --- 1. Data Preparation ---
-        details = get_literature_details_by_titles(st.session_state.selected_book_titles)
+        # 본문은 읽지 않고 메타데이터만 가져옵니다. 청크는 인덱스를 새로 만들 때만 사용합니다.
+        details = get_literatures_by_titles(st.session_state.selected_book_titles)
         
-        languages = {detail['language'] for detail in details}
-        if len(languages) > 1:
+        # DB에는 한국어가 'kr' 또는 'ko'로 저장되어 있을 수 있습니다.
+        try:
+            language = get_corpus_language(details)
+        except MixedLanguageError:
             st.error("죄송합니다. 현재는 여러 언어의 책을 동시에 검색할 수 없습니다. 동일한 언어의 책만 선택해주세요.")
             st.stop()
         
-        language = languages.pop()
         selected_names_display = ", ".join(st.session_state.selected_book_titles)
 
-        with st.spinner("데이터베이스에서 본문을 로드하는 중..."):
-            documents = [Document(page_content=d['body']) for d in details]
-        
-        with st.spinner("문서를 청크로 나누는 중..."):
-            all_chunks = split_documents(documents)
+        def load_book_chunks_with_spinner(book):
+            # 샤드를 처음 불러올 때 호출되며, 청크를 샤드의 매니페스트와 비교하는 데 사용합니다.
+            with st.spinner(f"'{book['title']}' 청크를 불러오는 중..."):
+                return load_book_chunks(book)
 
-        embedding_model_name = "text-embedding-3-small"
         if language == 'ko':
-            st.info(f"한국어 임베딩 모델을 사용합니다: {embedding_model_name}")
-            embeddings = OpenAIEmbeddings(model=embedding_model_name)
+            st.info(f"한국어 임베딩 모델을 사용합니다: {EMBEDDING_MODEL_NAME}")
         else:
-            st.info(f"영어(기본) 임베딩 모델을 사용합니다: {embedding_model_name}")
-            embeddings = OpenAIEmbeddings(model=embedding_model_name)
-
-        sanitized_model_name = embedding_model_name.replace("-", "_").replace("/", "_")
-        sanitized_titles = [t.lower().replace(" ", "_") for t in sorted(st.session_state.selected_book_titles)]
-        index_name_suffix = f"{language}_{sanitized_model_name}_{'_'.join(sanitized_titles)}"
-        FAISS_INDEX_PATH = CWD / "faiss_literature" / index_name_suffix
+            st.info(f"영어(기본) 임베딩 모델을 사용합니다: {EMBEDDING_MODEL_NAME}")
+
+        # 샤드와 그래프는 프로세스 레지스트리에서 모든 세션이 공유합니다.
+        # 이미 임베딩한 텍스트는 로컬 캐시에서 재사용합니다.
+        registry = get_vector_store_registry()
+        if "session_id" not in st.session_state:
+            st.session_state.session_id = uuid.uuid4().hex
+        session_id = st.session_state.session_id
+
+        progress_bars = {}
+        def report_embedding_progress(book, done, total):
+            # 새 샤드를 임베딩하는 동안 완료된 배치만큼 진행률을 갱신합니다.
+            if book['id'] not in progress_bars:
+                progress_bars[book['id']] = st.progress(0.0)
+            progress_bars[book['id']].progress(done / total, text=f"'{book['title']}' 임베딩 중... ({done}/{total})")
 
         with st.spinner("벡터 저장소를 준비하는 중입니다..."):
-            vector_store = get_or_create_vector_store(all_chunks, FAISS_INDEX_PATH, embeddings)
+            prepared = prepare_rag_app(
+                details, session_id, load_chunks=load_book_chunks_with_spinner, registry=registry,
+                progress_callback=report_embedding_progress,
+            )
+            for progress_bar in progress_bars.values():
+                progress_bar.empty()
+            st.session_state.rag_app = prepared["rag_app"]
+            # 이전에 선택했던 책 조합의 참조는 해제합니다.
+            registry.release(session_id, keep=prepared["resource_keys"])
             st.success("벡터 저장소 준비가 완료되었습니다!")
 
         # --- 2. UI Layout and RAG Chain ---
@@ -89,9 +107,6 @@ def main():
         with main_col:
             st.header(f"'{selected_names_display}' (언어: {language.upper()})에 대해 질문해보세요")
 
-            if 'rag_app' not in st.session_state:
-                st.session_state.rag_app = create_graph(vector_store)
-
             if "messages" not in st.session_state:
                 st.session_state.messages = []
 
@@ -113,25 +128,40 @@ def main():
                     inputs = {"question": prompt}
                     final_state = {}
                     
-                    for step in st.session_state.rag_app.stream(inputs):
-                        node_name = list(step.keys())[0]
-                        status_message = {
-                            "translate_question": "질문 번역 중...",
-                            "route_question": "질문 유형 분석 중...",
-                            "retrieve": "소설 내용 검색 중...",
-                            "grade_documents": "검색된 문서 평가 중...",
-                            "generate": "답변 생성 중...",
-                            "translate_generation": "답변 번역 중...",
-                        }.get(node_name, "")
-                        if status_message:
-                            status_placeholder.info(status_message)
-                        final_state.update(step)
+                    # 노드별 소요 시간, 토큰, 비용을 기록하여 어드민 페이지에서 집계합니다.
+                    with trace_request(prompt) as tracer:
+                        for event in stream_answer(st.session_state.rag_app, inputs, config={"callbacks": [tracer]}):
+                            if event[0] == "answer":
+                                # 답변 토큰이 도착하는 대로 화면에 이어서 표시합니다.
+                                status_placeholder.empty()
+                                answer_placeholder.markdown(event[1] + "▌")
+                                continue
+
+                            _, node_name, update = event
+                            status_message = {
+                                "analyze_question": "질문 분석 중...",
+                                "lookup_answer_cache": "이전 답변 확인 중...",
+                                "retrieve": "소설 내용 검색 중...",
+                                "grade_documents": "검색된 문서 평가 중...",
+                                "generate": "답변 생성 중...",
+                                "translate_generation": "답변 번역 중...",
+                            }.get(node_name, "")
+                            if status_message:
+                                status_placeholder.info(status_message)
+                            # 노드별 업데이트를 순서대로 합쳐 최종 상태를 만듭니다.
+                            final_state.update(update or {})
 
                     status_placeholder.empty()
                     
-                    answer = final_state.get("translate_generation", {}).get("generation", "죄송합니다, 답변을 생성하지 못했습니다.")
-                    st.session_state.latest_sources = final_state.get("generate", {}).get("documents", [])
-                    st.session_state.latest_keywords = final_state.get("generate", {}).get("keywords", [])
+                    # 답변은 생성, 번역 또는 답변 캐시 노드 중 마지막으로 답변을 만든 노드의 것입니다.
+                    answer = final_state.get("generation") or "죄송합니다, 답변을 생성하지 못했습니다."
+                    st.session_state.latest_sources = final_state.get("documents", [])
+                    st.session_state.latest_keywords = final_state.get("keywords", [])
+                    # 키워드 위치는 답변이 도착했을 때 한 번만 찾고, 재실행 시에는 저장된 위치로 그립니다.
+                    st.session_state.latest_highlight_spans = [
+                        find_keyword_spans(doc.page_content, st.session_state.latest_keywords)
+                        for doc in st.session_state.latest_sources
+                    ]
                     
                     answer_placeholder.markdown(answer)
                     st.session_state.messages.append({"role": "assistant", "content": answer})
@@ -148,11 +178,12 @@ def main():
                 st.write("")
 
             if st.session_state.get("latest_sources"):
-                keywords = st.session_state.get("latest_keywords", [])
+                highlight_spans = st.session_state.get("latest_highlight_spans", [])
                 for i, doc in enumerate(st.session_state.latest_sources):
                     is_expanded = (i == 0)
                     with st.expander(f"출처 {i+1} {'(가장 관련 높음)' if i == 0 else ''}", expanded=is_expanded):
-                        highlighted_content = highlight_text(doc.page_content, keywords)
+                        spans = highlight_spans[i] if i < len(highlight_spans) else []
+                        highlighted_content = render_highlights(doc.page_content, spans)
                         st.markdown(highlighted_content, unsafe_allow_html=True)
             else:
                 st.info("질문을 입력하면 관련 출처가 여기에 표시됩니다.")
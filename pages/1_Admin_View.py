@@ -3,11 +3,18 @@ LangGraph 워크플로우를 시각화하는 어드민 페이지입니다.
 
 메인 앱('app.py')에서 사용자가 소설을 선택하고 벡터 저장소 준비를 완료하면
 세션 상태(session_state)에 저장되는 LangGraph 객체를 가져와
-Mermaid 다이어그램으로 렌더링하여 보여줍니다.
+Mermaid 다이어그램으로 렌더링하여 보여줍니다. 또한 프로세스 레지스트리에
+상주 중인 인덱스와 그 메모리 사용량, 최근 요청의 노드별 지연 시간·토큰·비용,
+문서 평가 통계와 답변 캐시 적중률을 함께 보여줍니다.
 """
 import streamlit as st
 from streamlit_mermaid import st_mermaid
 
+from utils.answer_cache_utils import get_answer_cache
+from utils.graph_utils import get_grading_stats
+from utils.registry_utils import get_vector_store_registry
+from utils.tracing_utils import get_trace_aggregator
+
 st.set_page_config(page_title="Admin: Graph View", layout="wide")
 st.title("📊 LangGraph 워크플로우 시각화")
 
@@ -44,3 +51,82 @@ else:
         "LangGraph 객체를 찾을 수 없습니다. "
         "먼저 메인 페이지('app.py')로 돌아가서 소설을 선택하고 '선택 완료' 버튼을 눌러주세요."
     )
+
+# --- 최근 요청의 노드별 지연 시간, 토큰, 비용 ---
+st.divider()
+st.subheader("⏱️ 요청 추적 (최근 요청 기준)")
+
+trace_summary = get_trace_aggregator().summary()
+if trace_summary["requests"]:
+    latency = trace_summary["latency"]
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("요청 수", trace_summary["requests"])
+    col2.metric("지연 시간 p50 / p95", f"{latency['p50_ms']:.0f} / {latency['p95_ms']:.0f} ms")
+    col3.metric("예상 비용", f"${trace_summary['cost_usd']:.4f}")
+    col4.metric(
+        "LLM 캐시 적중률",
+        f"{trace_summary['llm_cache_hit_rate']:.0%}" if trace_summary["llm_cache_hit_rate"] is not None else "-",
+    )
+    col5.metric("평균 재시도", trace_summary["mean_retries"])
+
+    node_rows = [{k: v for k, v in row.items() if k != "histogram"} for row in trace_summary["nodes"]]
+    st.markdown("**노드별 지연 시간과 비용** (share_of_total: 전체 요청 시간 중 해당 노드가 차지한 비율)")
+    st.dataframe(node_rows, use_container_width=True)
+    st.bar_chart({row["node"]: row["share_of_total"] for row in trace_summary["nodes"]})
+
+    if trace_summary["contexts"]:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("평균 문맥 토큰", trace_summary["mean_context_tokens"])
+        col2.metric("평균 문맥 구절 수", trace_summary["mean_context_passages"])
+        col3.metric("예산 때문에 잘린 문맥", f"{trace_summary['truncated_contexts']} / {trace_summary['contexts']}")
+
+    with st.expander("노드별 지연 시간 히스토그램"):
+        st.dataframe(
+            [{"node": row["node"], **row["histogram"]} for row in trace_summary["nodes"]],
+            use_container_width=True,
+        )
+    with st.expander("최근 요청 원본 기록"):
+        st.json(get_trace_aggregator().recent()[-10:])
+else:
+    st.info("아직 추적된 요청이 없습니다. 메인 페이지에서 질문을 입력하면 여기에 집계됩니다.")
+
+# --- 프로세스 레지스트리에 상주 중인 인덱스 ---
+st.divider()
+st.subheader("🗂️ 메모리에 상주 중인 인덱스")
+
+registry = get_vector_store_registry()
+resident = registry.resident()
+if resident:
+    col1, col2, col3 = st.columns(3)
+    col1.metric("상주 항목 수", len(resident))
+    col2.metric("사용 중인 메모리 (추정)", f"{registry.total_bytes / 1024 / 1024:.1f} MB")
+    col3.metric("메모리 예산", f"{registry.max_bytes / 1024 / 1024:.0f} MB")
+    st.dataframe(resident, use_container_width=True)
+else:
+    st.info("아직 메모리에 불러온 인덱스가 없습니다.")
+
+# --- 문서 평가 통계 ---
+st.divider()
+st.subheader("🧮 문서 평가 통계")
+
+grading_stats = get_grading_stats()
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("LLM으로 평가", grading_stats["llm_graded"])
+col2.metric("유사도로 채택", grading_stats["auto_accepted"])
+col3.metric("유사도로 제외", grading_stats["auto_rejected"])
+col4.metric("생략된 평가 호출", grading_stats["llm_grading_avoided"])
+
+# --- 의미 기반 답변 캐시 ---
+st.divider()
+st.subheader("💬 답변 캐시")
+
+answer_cache_stats = get_answer_cache().stats()
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("저장된 답변", answer_cache_stats["entries"])
+col2.metric("인덱스 수", answer_cache_stats["indexes"])
+col3.metric("적중 / 실패", f"{answer_cache_stats['hits']} / {answer_cache_stats['misses']}")
+col4.metric(
+    "적중률",
+    f"{answer_cache_stats['hit_rate']:.0%}" if answer_cache_stats["hit_rate"] is not None else "-",
+)
+st.caption(f"질문 임베딩의 코사인 유사도가 {answer_cache_stats['similarity_threshold']} 이상이면 이전 답변을 재사용합니다.")
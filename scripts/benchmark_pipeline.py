@@ -0,0 +1,202 @@
+"""
+OpenAI API 없이 RAG 파이프라인 전체의 성능을 측정하는 벤치마크 스크립트입니다.
+
+'utils/fake_model_utils.py'의 결정적인 가짜 채팅/임베딩 모델(지연 시간 주입 가능)로
+create_graph를 처음부터 끝까지 실행하며, 번들된 작품(iliad, mobyDick, 탁류)에 대해
+인덱스 생성 시간, 노드별 지연 시간, 전체 지연 시간의 p50/p95, 동시성 수준별 처리량을
+측정합니다. 결과는 JSON으로 저장되므로 커밋 간 성능 비교에 사용할 수 있습니다.
+
+'literature.db'는 임시 복사본을 사용하므로 번들된 데이터베이스는 변경되지 않습니다.
+
+사용 예:
+    python scripts/benchmark_pipeline.py --concurrency 1 4 8 --requests 32 --llm-latency 0.05
+"""
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import db_utils, vector_store_utils
+from utils.db_utils import get_all_literatures
+from utils.fake_model_utils import FakeChatModel, FakeEmbeddings
+from utils.graph_utils import GRADING_MODES, PipelineChains, create_graph
+from utils.load_and_split_text_utils import get_or_create_chunks, chunks_to_documents, CHUNK_SIZE, CHUNK_OVERLAP
+from utils.retriever_utils import HybridRetriever, RETRIEVAL_MODES
+from utils.tracing_utils import percentile
+from utils.vector_store_utils import get_or_create_sharded_vector_store, INDEX_TYPES
+
+CWD = Path(__file__).parent.parent
+RESULTS_DIR = CWD / "benchmark_results"
+
+# 질문 파일을 지정하지 않았을 때 사용하는 기본 질문 (영어/한국어 혼합)
+DEFAULT_QUESTIONS = [
+    "Who is Achilles and why is he angry?",
+    "What happens to Hector at the end of the Iliad?",
+    "Who is Captain Ahab?",
+    "Why does Ahab hunt the white whale?",
+    "초봉이는 어떤 인물인가요?",
+    "정주사는 왜 미두장에 다니나요?",
+]
+
+def summarize(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=CWD, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def build_index(books: list, shard_root: Path, embeddings: FakeEmbeddings, index_type: str = "flat") -> tuple:
+    """Builds fresh shards for the given books and returns (vector_store, timings)."""
+    chunk_counts = {}
+
+    def load_chunks(book):
+        started = time.perf_counter()
+        chunks = get_or_create_chunks(book["id"], CHUNK_SIZE, CHUNK_OVERLAP)
+        chunk_counts[book["title"]] = {"chunks": len(chunks), "chunking_seconds": round(time.perf_counter() - started, 3)}
+        return chunks_to_documents(chunks, book)
+
+    started = time.perf_counter()
+    vector_store = get_or_create_sharded_vector_store(
+        books, shard_root, embeddings, "fake-embedding", CHUNK_SIZE, CHUNK_OVERLAP, load_chunks, index_type=index_type
+    )
+    return vector_store, {"seconds": round(time.perf_counter() - started, 3), "books": chunk_counts}
+
+def run_question(rag_app, question: str) -> dict:
+    """Runs one question through the graph, timing every node from the stream of updates."""
+    node_seconds = []
+    started = previous = time.perf_counter()
+    for update in rag_app.stream({"question": question}, stream_mode="updates"):
+        now = time.perf_counter()
+        for node_name in update:
+            node_seconds.append((node_name, now - previous))
+        previous = now
+    return {"question": question, "total_seconds": time.perf_counter() - started, "node_seconds": node_seconds}
+
+def run_level(rag_app, questions: list, concurrency: int, requests: int) -> dict:
+    """Sends `requests` questions with at most `concurrency` in flight and aggregates the timings."""
+    batch = [questions[i % len(questions)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        runs = list(executor.map(lambda q: run_question(rag_app, q), batch))
+    wall_seconds = time.perf_counter() - started
+
+    per_node = {}
+    for run in runs:
+        for node_name, seconds in run["node_seconds"]:
+            per_node.setdefault(node_name, []).append(seconds)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(requests / wall_seconds, 2),
+        "end_to_end": summarize([run["total_seconds"] for run in runs]),
+        "nodes": {node_name: summarize(values) for node_name, values in per_node.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline offline with fake models.")
+    parser.add_argument("--books", nargs="*", help="Titles to index (default: every book in literature.db).")
+    parser.add_argument("--questions", type=Path, help="Text file with one question per line.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="Concurrency levels to measure.")
+    parser.add_argument("--requests", type=int, default=24, help="Questions sent per concurrency level.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Injected latency per chat call, in seconds.")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Injected latency per embedding call, in seconds.")
+    parser.add_argument("--embedding-latency-per-text", type=float, default=0.0, help="Extra embedding latency per text, in seconds.")
+    parser.add_argument("--grading-mode", choices=GRADING_MODES, default="concurrent")
+    parser.add_argument("--retrieval-mode", choices=RETRIEVAL_MODES, default="hybrid")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmark_results/<revision>_<timestamp>.json).")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own log output.")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        questions = [line.strip() for line in args.questions.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        scratch = Path(scratch)
+        # 청크 테이블이 생성되더라도 번들된 데이터베이스는 건드리지 않도록 복사본을 사용합니다.
+        shutil.copy(db_utils.DB_PATH, scratch / "literature.db")
+        db_utils.DB_PATH = scratch / "literature.db"
+        db_utils.init_chunks_schema()
+
+        books = get_all_literatures()
+        if args.books:
+            books = [book for book in books if book["title"] in args.books]
+        if not books:
+            print("No books selected.")
+            return
+        print(f"Indexing {len(books)} book(s): {', '.join(book['title'] for book in books)}")
+
+        # 가짜 임베딩에는 API 한도가 없으므로 분당 요청/토큰 한도를 적용하지 않습니다.
+        vector_store_utils.EMBEDDING_REQUESTS_PER_MINUTE = vector_store_utils.EMBEDDING_TOKENS_PER_MINUTE = float("inf")
+
+        log_sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        embeddings = FakeEmbeddings(latency_seconds=args.embedding_latency, latency_per_text_seconds=args.embedding_latency_per_text)
+        with log_sink:
+            vector_store, index_build = build_index(books, scratch / "shards", embeddings, args.index_type)
+        print(f"Index built in {index_build['seconds']}s")
+
+        retriever = HybridRetriever(vector_store=vector_store, literatures=books, mode=args.retrieval_mode)
+        chains = PipelineChains(FakeChatModel(latency_seconds=args.llm_latency))
+        with log_sink:
+            rag_app = create_graph(vector_store, grading_mode=args.grading_mode, chains=chains, retriever=retriever)
+
+        levels = []
+        for concurrency in args.concurrency:
+            with log_sink:
+                level = run_level(rag_app, questions, concurrency, args.requests)
+            levels.append(level)
+            print(
+                f"concurrency={concurrency:>3}  throughput={level['throughput_rps']:>7} req/s  "
+                f"p50={level['end_to_end']['p50_ms']}ms  p95={level['end_to_end']['p95_ms']}ms"
+            )
+
+    revision = git_revision()
+    result = {
+        "revision": revision,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "books": [book["title"] for book in books],
+            "questions": len(questions),
+            "requests_per_level": args.requests,
+            "llm_latency_seconds": args.llm_latency,
+            "embedding_latency_seconds": args.embedding_latency,
+            "embedding_latency_per_text_seconds": args.embedding_latency_per_text,
+            "grading_mode": args.grading_mode,
+            "retrieval_mode": args.retrieval_mode,
+            "index_type": args.index_type,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+        },
+        "index_build": index_build,
+        "levels": levels,
+    }
+    output = args.output or RESULTS_DIR / f"{revision}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
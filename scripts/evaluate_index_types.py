@@ -0,0 +1,136 @@
+"""
+FAISS 인덱스 종류별 재현율(recall)과 검색 지연 시간을 비교하는 스크립트입니다.
+
+선택한 작품의 청크를 한 번만 임베딩한 뒤, 정확한(Flat) 인덱스의 top-k 결과를 기준으로
+각 인덱스 종류(HNSW, IVF-Flat, IVF-PQ, SQ8, fp16)의 recall@k, 질의당 검색 시간,
+인덱스 크기, 생성(학습 포함) 시간을 측정하여 표로 출력하고 JSON으로 저장합니다.
+질의는 무작위로 고른 청크의 일부 구절을 사용하며, 데이터베이스에는 아무것도 쓰지 않습니다.
+
+사용 예:
+    python scripts/evaluate_index_types.py --books Iliad Mobydick --queries 200 --k 4
+    python scripts/evaluate_index_types.py --fake   # API 키 없이 가짜 임베딩으로 실행
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.db_utils import get_all_literatures, get_literature_body
+from utils.load_and_split_text_utils import split_text_with_offsets, CHUNK_SIZE, CHUNK_OVERLAP
+from utils.tracing_utils import percentile
+from utils.vector_store_utils import build_faiss_index, INDEX_TYPES
+
+CWD = Path(__file__).parent.parent
+RESULTS_DIR = CWD / "benchmark_results"
+EMBEDDING_MODEL_NAME = "text-embedding-3-small"
+# 질의로 사용할 구절의 단어 수
+QUERY_WORDS = 30
+
+def load_embeddings(fake: bool):
+    if fake:
+        from utils.fake_model_utils import FakeEmbeddings
+        return FakeEmbeddings()
+    from langchain_openai import OpenAIEmbeddings
+    from utils.embedding_cache_utils import CachedEmbeddings
+    load_dotenv()
+    return CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL_NAME), EMBEDDING_MODEL_NAME)
+
+def sample_queries(texts: list, count: int, seed: int) -> list:
+    """Picks a random passage of QUERY_WORDS words from randomly chosen chunks."""
+    rng = random.Random(seed)
+    queries = []
+    for text in rng.sample(texts, min(count, len(texts))):
+        words = text.split()
+        start = rng.randrange(max(1, len(words) - QUERY_WORDS))
+        queries.append(" ".join(words[start:start + QUERY_WORDS]))
+    return queries
+
+def evaluate(index: faiss.Index, queries: np.ndarray, exact_ids: np.ndarray, k: int) -> dict:
+    """Measures recall@k against the exact ids and the per-query search latency."""
+    latencies, hits = [], 0
+    for query, expected in zip(queries, exact_ids):
+        started = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - started)
+        hits += len(set(ids[0]) & set(expected))
+    return {
+        "recall_at_k": round(hits / (len(queries) * k), 4),
+        "mean_search_ms": round(sum(latencies) / len(latencies) * 1000, 4),
+        "p95_search_ms": round(percentile(latencies, 95) * 1000, 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index types by recall and latency against an exact index.")
+    parser.add_argument("--books", nargs="*", help="Titles to index (default: every book in literature.db).")
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled query passages.")
+    parser.add_argument("--k", type=int, default=4, help="Top-k used for recall.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fake", action="store_true", help="Use deterministic fake embeddings instead of OpenAI.")
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmark_results/index_types_<timestamp>.json).")
+    args = parser.parse_args()
+
+    books = get_all_literatures()
+    if args.books:
+        books = [book for book in books if book["title"] in args.books]
+    if not books:
+        print("No books selected.")
+        return
+
+    texts = []
+    for book in books:
+        chunks = split_text_with_offsets(get_literature_body(book["id"]), CHUNK_SIZE, CHUNK_OVERLAP)
+        texts.extend(chunk["content"] for chunk in chunks)
+    print(f"{len(texts)} chunks from {len(books)} book(s): {', '.join(book['title'] for book in books)}")
+
+    embeddings = load_embeddings(args.fake)
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype="float32")
+    queries = np.asarray(embeddings.embed_documents(sample_queries(texts, args.queries, args.seed)), dtype="float32")
+
+    exact_index, _ = build_faiss_index(vectors, "flat")
+    _, exact_ids = exact_index.search(queries, args.k)
+
+    results = []
+    for index_type in args.index_types:
+        started = time.perf_counter()
+        index, factory_string = build_faiss_index(vectors, index_type)
+        build_seconds = time.perf_counter() - started
+        size_bytes = faiss.serialize_index(index).nbytes
+        results.append({
+            "index_type": index_type,
+            "factory": factory_string,
+            "build_seconds": round(build_seconds, 3),
+            "size_mb": round(size_bytes / 1024 / 1024, 3),
+            "bytes_per_vector": round(size_bytes / len(texts), 1),
+            **evaluate(index, queries, exact_ids, args.k),
+        })
+
+    print(f"\n{'index':<10}{'factory':<22}{'recall@' + str(args.k):>10}{'mean ms':>10}{'p95 ms':>10}{'size MB':>10}{'build s':>10}")
+    for row in results:
+        print(
+            f"{row['index_type']:<10}{row['factory']:<22}{row['recall_at_k']:>10}{row['mean_search_ms']:>10}"
+            f"{row['p95_search_ms']:>10}{row['size_mb']:>10}{row['build_seconds']:>10}"
+        )
+
+    output = args.output or RESULTS_DIR / f"index_types_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "books": [book["title"] for book in books],
+        "chunks": len(texts),
+        "queries": len(queries),
+        "k": args.k,
+        "embedding_model": "fake" if args.fake else EMBEDDING_MODEL_NAME,
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nResults saved to {output}")
+
+if __name__ == "__main__":
+    main()
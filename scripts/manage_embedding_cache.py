@@ -0,0 +1,38 @@
+"""
+임베딩 캐시('embedding_cache.db')의 크기를 확인하고 오래된 항목을 정리하는 스크립트입니다.
+
+사용 예:
+    python3 scripts/manage_embedding_cache.py                     # 크기 확인
+    python3 scripts/manage_embedding_cache.py --max-entries 50000 # 최근 사용된 5만 개만 유지
+    python3 scripts/manage_embedding_cache.py --max-age-days 30   # 30일 동안 쓰이지 않은 항목 삭제
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.embedding_cache_utils import get_embedding_cache_stats, evict_embedding_cache
+
+def print_stats():
+    stats = get_embedding_cache_stats()
+    print(f"Entries: {stats['entries']}")
+    print(f"Vector bytes: {stats['vector_bytes'] / 1024 / 1024:.1f} MB")
+    print(f"File size on disk: {stats['file_bytes'] / 1024 / 1024:.1f} MB")
+    for model in stats["models"]:
+        print(f" - {model['model']}: {model['entries']} entries, {model['vector_bytes'] / 1024 / 1024:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report on or evict entries from the embedding cache.")
+    parser.add_argument("--max-entries", type=int, help="Keep at most this many entries (least recently used are dropped first).")
+    parser.add_argument("--max-age-days", type=float, help="Drop entries not used for this many days.")
+    args = parser.parse_args()
+
+    if args.max_entries is not None or args.max_age_days is not None:
+        deleted = evict_embedding_cache(max_entries=args.max_entries, max_age_days=args.max_age_days)
+        print(f"Evicted {deleted} entries.\n")
+
+    print_stats()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+여러 질문을 한 번에 RAG 파이프라인에 실행하고 결과를 JSONL로 저장하는 스크립트입니다.
+
+선택한 작품들의 인덱스를 한 번만 준비(없으면 생성)한 뒤, 질문 JSONL 파일의 질문들을
+정해진 동시성 한도 안에서 그래프로 실행합니다. OpenAI의 요청 한도(429)에 걸리면 모든 작업자가
+함께 기다렸다가(지수 백오프) 해당 질문을 다시 실행합니다. 질문마다 답변, 출처, 키워드,
+노드별 소요 시간, 토큰과 예상 비용을 기록하므로 처리량 측정과 프롬프트 변경의 회귀 테스트에
+사용할 수 있습니다.
+
+질문 파일은 한 줄에 하나의 JSON 객체이며 'question' 필드가 필요합니다. 'id' 등 다른 필드는
+결과에 그대로 복사됩니다. 예: {"id": "iliad-1", "question": "Who is Achilles?"}
+
+사용 예:
+    python scripts/run_batch_questions.py --books Iliad --questions questions.jsonl --concurrency 8
+    python scripts/run_batch_questions.py --books 탁류 --questions q.jsonl --fake   # API 키 없이 가짜 모델로 실행
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.db_utils import get_literatures_by_titles, init_chunks_schema
+from utils.graph_utils import GRADING_MODES, PipelineChains
+from utils.llm_cache_utils import configure_llm_cache
+from utils.pipeline_utils import prepare_rag_app, MixedLanguageError
+from utils.rate_limit_utils import RateLimitBackoff, is_rate_limit_error
+from utils.retriever_utils import RETRIEVAL_MODES, DEFAULT_RETRIEVAL_MODE
+from utils.tracing_utils import TraceAggregator, percentile, trace_request
+
+CWD = Path(__file__).parent.parent
+RESULTS_DIR = CWD / "benchmark_results"
+# 레지스트리에 등록되는 참조자 이름
+BATCH_OWNER = "batch"
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def load_questions(path: Path) -> list:
+    items = []
+    for line_number, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if not item.get("question"):
+            raise ValueError(f"{path}:{line_number}: missing 'question'")
+        items.append(item)
+    return items
+
+def serialize_sources(documents) -> list:
+    return [
+        {
+            "title": doc.metadata.get("title"),
+            "chunk_id": doc.metadata.get("chunk_id"),
+            "start_index": doc.metadata.get("start_index"),
+            "end_index": doc.metadata.get("end_index"),
+            "content": doc.page_content,
+        }
+        for doc in documents or []
+    ]
+
+def run_question(rag_app, item: dict, aggregator: TraceAggregator) -> dict:
+    """Runs one question through the graph and returns its answer, sources and timings."""
+    final_state = {}
+    with trace_request(item["question"], aggregator=aggregator) as tracer:
+        for update in rag_app.stream({"question": item["question"]}, config={"callbacks": [tracer]}, stream_mode="updates"):
+            for node_update in update.values():
+                final_state.update(node_update or {})
+    trace = tracer.trace.to_dict()
+    return {
+        "answer": final_state.get("generation"),
+        "keywords": final_state.get("keywords", []),
+        "sources": serialize_sources(final_state.get("documents")),
+        "question_type": final_state.get("question_type"),
+        "retries": trace["retries"],
+        "total_seconds": round(trace["total_seconds"], 3),
+        "node_seconds": [{"node": node["node"], "seconds": round(node["seconds"], 3)} for node in trace["nodes"]],
+        "input_tokens": trace["input_tokens"],
+        "output_tokens": trace["output_tokens"],
+        "cost_usd": round(trace["cost_usd"], 6),
+    }
+
+def run_with_backoff(rag_app, item: dict, aggregator: TraceAggregator, backoff: RateLimitBackoff, max_attempts: int) -> dict:
+    for attempt in range(max_attempts):
+        backoff.wait()
+        try:
+            return {**item, **run_question(rag_app, item, aggregator), "attempts": attempt + 1}
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_attempts - 1:
+                return {**item, "error": f"{type(e).__name__}: {e}", "attempts": attempt + 1}
+            delay = backoff.hit(attempt)
+            print(f"요청 한도 초과: {delay:.1f}초 후 다시 시도합니다. ({item['question'][:40]})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of questions through the RAG graph concurrently.")
+    parser.add_argument("--books", nargs="+", required=True, help="Titles to search (same language).")
+    parser.add_argument("--questions", type=Path, required=True, help="JSONL file with one {'question': ...} object per line.")
+    parser.add_argument("--output", type=Path, help="Result JSONL (default: benchmark_results/batch_<timestamp>.jsonl).")
+    parser.add_argument("--concurrency", type=positive_int, default=4, help="Questions in flight at once.")
+    parser.add_argument("--max-attempts", type=positive_int, default=6, help="Attempts per question when rate limited.")
+    parser.add_argument("--initial-backoff", type=float, default=2.0, help="First rate-limit wait, in seconds (doubles each retry).")
+    parser.add_argument("--max-backoff", type=float, default=60.0, help="Longest rate-limit wait, in seconds.")
+    parser.add_argument("--grading-mode", choices=GRADING_MODES, default="concurrent")
+    parser.add_argument("--retrieval-mode", choices=RETRIEVAL_MODES, default=DEFAULT_RETRIEVAL_MODE)
+    parser.add_argument("--no-llm-cache", action="store_true", help="Do not reuse cached LLM responses or answers (for fresh prompt comparisons).")
+    parser.add_argument("--fake", action="store_true", help="Use the deterministic fake chat and embedding models instead of OpenAI.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not args.no_llm_cache:
+        configure_llm_cache("sqlite")
+    init_chunks_schema()
+
+    items = load_questions(args.questions)
+    details = get_literatures_by_titles(args.books)
+    missing = sorted(set(args.books) - {detail["title"] for detail in details})
+    if missing:
+        print(f"Unknown titles: {missing}")
+        return
+    if not items:
+        print("No questions to run.")
+        return
+
+    model_options = {}
+    if args.fake:
+        from utils import vector_store_utils
+        from utils.fake_model_utils import FakeChatModel, FakeEmbeddings
+        # 가짜 임베딩에는 API 한도가 없으므로 분당 요청/토큰 한도를 적용하지 않습니다.
+        vector_store_utils.EMBEDDING_REQUESTS_PER_MINUTE = vector_store_utils.EMBEDDING_TOKENS_PER_MINUTE = float("inf")
+        model_options = {"embeddings": FakeEmbeddings(), "embedding_model_name": "fake-embedding", "chains": PipelineChains(FakeChatModel())}
+
+    started = time.perf_counter()
+    try:
+        prepared = prepare_rag_app(
+            details, BATCH_OWNER, retrieval_mode=args.retrieval_mode, grading_mode=args.grading_mode,
+            use_answer_cache=not args.no_llm_cache, **model_options,
+        )
+    except MixedLanguageError as e:
+        print(e)
+        return
+    rag_app = prepared["rag_app"]
+    print(f"Index ready in {time.perf_counter() - started:.1f}s ({len(details)} book(s), language: {prepared['language']})")
+
+    output = args.output or RESULTS_DIR / f"batch_{time.strftime('%Y%m%d_%H%M%S')}.jsonl"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    aggregator = TraceAggregator(window=len(items), export_path=None)
+    backoff = RateLimitBackoff(args.initial_backoff, args.max_backoff)
+
+    results, started = [], time.perf_counter()
+    with open(output, "w", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(run_with_backoff, rag_app, {"index": i, **item}, aggregator, backoff, args.max_attempts)
+            for i, item in enumerate(items)
+        ]
+        # 끝나는 순서대로 바로 기록하므로 중간에 멈춰도 그때까지의 결과는 남습니다.
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            status = "error" if "error" in result else f"{result['total_seconds']}s"
+            print(f"[{done}/{len(items)}] {result['question'][:60]} ({status})")
+    wall_seconds = time.perf_counter() - started
+
+    succeeded = [result for result in results if "error" not in result]
+    summary = aggregator.summary()
+    print(f"\n{len(succeeded)}/{len(results)} answered in {wall_seconds:.1f}s ({len(results) / wall_seconds:.2f} questions/s)")
+    if succeeded:
+        totals = [result["total_seconds"] for result in succeeded]
+        print(f"latency p50={percentile(totals, 50):.2f}s p95={percentile(totals, 95):.2f}s")
+    print(f"tokens in/out: {summary['input_tokens']}/{summary['output_tokens']}  estimated cost: ${summary['cost_usd']}")
+    print(f"Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,41 @@
 """
-SQLite 데이터베이스('literature.db')를 설정하기 위한 일회성 스크립트입니다.
+SQLite 데이터베이스('literature.db')를 설정하기 위한 스크립트입니다.
 
 이 스크립트는 'literature' 테이블을 생성하고, 'data' 디렉토리에 있는
-.txt 파일의 내용으로 테이블을 채웁니다. 이 스크립트는 한 번만 실행하거나,
-'data' 폴더에 새로운 책을 추가했을 때 실행하도록 설계되었습니다.
+.txt 파일의 내용으로 테이블을 채운 뒤, 본문을 청크로 나누어 'chunks' 테이블에
+저장합니다. 파일별 내용 해시(content hash)와
+수정 시각(mtime)을 기록해 두므로, 다시 실행하면 바뀐 책만 읽어서 갱신하고
+어떤 책이 변경(dirty)되었는지 보고합니다. 'data' 폴더에 새로운 책을 추가하거나
+수정했을 때 실행하도록 설계되었습니다.
 """
+import hashlib
 import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.db_utils import ensure_chunks_table, save_chunks
+from utils.load_and_split_text_utils import split_text_with_offsets, CHUNK_SIZE, CHUNK_OVERLAP
+
+# 파일 이름(stem)별 작품 메타데이터. 없는 항목은 기본값(Unknown, None, 'en')을 사용합니다.
+BOOK_METADATA = {
+    "iliad": {"author": "Homer", "publish_year": -800},
+    "탁류": {"author": "채만식", "publish_year": 1937, "language": "ko"},
+}
+
+# 파일 읽기/해시 계산과 청크 분할에 사용할 작업자 수
+MAX_WORKERS = 8
+
 def ensure_literature_table(conn: sqlite3.Connection):
     """
     Ensures the 'literature' table and its unique index exist.
-    Adds the 'language' column if it doesn't exist.
+    Adds the 'language' and change-tracking columns if they don't exist.
     """
     cursor = conn.cursor()
-    
+
     # Create the table if it doesn't exist
     create_table_sql = """
     CREATE TABLE IF NOT EXISTS literature (
@@ -37,79 +58,203 @@ def ensure_literature_table(conn: sqlite3.Connection):
         # This error occurs if the column already exists, which is fine.
         print("Column 'language' already exists.")
 
+    # Change-tracking columns used to skip unchanged files on the next run
+    for column_sql in ("content_hash TEXT", "source_mtime REAL", "source_size INTEGER", "updated_at REAL"):
+        try:
+            cursor.execute(f"ALTER TABLE literature ADD COLUMN {column_sql}")
+            print(f"Column '{column_sql.split()[0]}' added to the table.")
+        except sqlite3.OperationalError:
+            pass
+
     # Create a unique index on the 'title' column
     create_index_sql = "CREATE UNIQUE INDEX IF NOT EXISTS idx_literature_title ON literature(title)"
     cursor.execute(create_index_sql)
     print("Unique index on 'title' ensured.")
-    
+
     conn.commit()
 
-def setup_database():
+def book_title_for(book_path: Path) -> str:
+    """Derives the literature title from a .txt file name."""
+    return book_path.stem.replace("_", " ").title()
+
+def read_book(book_path: Path) -> dict:
+    """
+    Reads a book file and computes its content hash. Runs in a worker thread.
+    Returns None if the file cannot be read.
+    """
+    try:
+        stat = book_path.stat()
+        with open(book_path, 'r', encoding='utf-8') as f:
+            book_body = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error processing {book_path}: {e}")
+        return None
+    return {
+        "path": book_path,
+        "body": book_body,
+        "content_hash": hashlib.sha256(book_body.encode("utf-8")).hexdigest(),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+    }
+
+def find_candidate_files(conn: sqlite3.Connection, txt_files: list[Path]) -> list[Path]:
+    """
+    Returns the files whose mtime or size differ from what was recorded on the last run.
+    Files with matching mtime and size are skipped without being read.
+    """
+    recorded = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute("SELECT title, source_mtime, source_size FROM literature")
+    }
+    candidates = []
+    for book_path in txt_files:
+        stat = book_path.stat()
+        if recorded.get(book_title_for(book_path)) != (stat.st_mtime, stat.st_size):
+            candidates.append(book_path)
+    return candidates
+
+def ingest_books(conn: sqlite3.Connection, txt_files: list[Path]) -> list[dict]:
+    """
+    Reads changed files in parallel and writes them in a single transaction.
+
+    Returns:
+        The books whose content changed (or that are new), as dicts with 'id' and 'title'.
+    """
+    candidates = find_candidate_files(conn, txt_files)
+    print(f"{len(txt_files) - len(candidates)} file(s) unchanged since the last run, {len(candidates)} to check.")
+    if not candidates:
+        return []
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        books = [book for book in executor.map(read_book, candidates) if book is not None]
+
+    recorded_hashes = {row[0]: row[1] for row in conn.execute("SELECT title, content_hash FROM literature")}
+    now = time.time()
+    dirty_titles = []
+
+    with conn:  # 하나의 트랜잭션으로 기록합니다.
+        for book in books:
+            book_title = book_title_for(book["path"])
+            if recorded_hashes.get(book_title) == book["content_hash"]:
+                # 내용은 같고 파일 시각만 바뀐 경우: 본문은 다시 쓰지 않습니다.
+                conn.execute(
+                    "UPDATE literature SET source_mtime = ?, source_size = ? WHERE title = ?",
+                    (book["mtime"], book["size"], book_title),
+                )
+                print(f" -> No changes for '{book_title}'.")
+                continue
+
+            metadata = BOOK_METADATA.get(book["path"].stem, {})
+            author = metadata.get("author", "Unknown")
+            publish_year = metadata.get("publish_year")
+            language = metadata.get("language", "en")
+
+            conn.execute("""
+            INSERT INTO literature (title, author, publish_year, body, language, content_hash, source_mtime, source_size, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(title) DO UPDATE SET
+                author=excluded.author,
+                publish_year=excluded.publish_year,
+                body=excluded.body,
+                language=excluded.language,
+                content_hash=excluded.content_hash,
+                source_mtime=excluded.source_mtime,
+                source_size=excluded.source_size,
+                updated_at=excluded.updated_at
+            """, (book_title, author, publish_year, book["body"], language,
+                  book["content_hash"], book["mtime"], book["size"], now))
+            dirty_titles.append(book_title)
+            print(f" -> Successfully inserted or updated '{book_title}'.")
+
+    if not dirty_titles:
+        return []
+    placeholders = ', '.join('?' for _ in dirty_titles)
+    rows = conn.execute(f"SELECT id, title FROM literature WHERE title IN ({placeholders})", dirty_titles)
+    return [{"id": row[0], "title": row[1]} for row in rows]
+
+def _split_body(args):
+    """Splits one body into chunks. Runs in a worker process."""
+    literature_id, body = args
+    return literature_id, split_text_with_offsets(body, CHUNK_SIZE, CHUNK_OVERLAP)
+
+def chunk_books(conn: sqlite3.Connection, dirty_books: list[dict]):
+    """
+    Splits dirty books (and books not yet chunked with the current parameters) into
+    the 'chunks' table, so the app never has to read or split whole bodies.
+    """
+    ensure_chunks_table(conn)
+    literature_ids = {book["id"] for book in dirty_books}
+    unchunked = conn.execute(
+        """
+        SELECT id FROM literature WHERE id NOT IN (
+            SELECT DISTINCT literature_id FROM chunks WHERE chunk_size = ? AND chunk_overlap = ?
+        )
+        """,
+        (CHUNK_SIZE, CHUNK_OVERLAP),
+    )
+    literature_ids.update(row[0] for row in unchunked)
+    if not literature_ids:
+        print("All books are already chunked.")
+        return
+
+    print(f"Splitting {len(literature_ids)} book(s) into chunks (size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP})...")
+    placeholders = ', '.join('?' for _ in literature_ids)
+    bodies = conn.execute(f"SELECT id, body FROM literature WHERE id IN ({placeholders})", list(literature_ids)).fetchall()
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(_split_body, bodies))
+
+    with conn:
+        for literature_id, chunks in results:
+            save_chunks(conn, literature_id, chunks, CHUNK_SIZE, CHUNK_OVERLAP)
+            print(f" -> Stored {len(chunks)} chunks for literature {literature_id}.")
+
+def setup_database() -> list[dict]:
     """
     Connects to the database, ensures table structure, and populates it with
     literature from .txt files in the data directory.
+
+    Returns:
+        The books that became dirty on this run, so downstream indexes know what to rebuild.
     """
     # Define paths
     CWD = Path(__file__).parent.parent
     DB_PATH = CWD / "data" / "literature.db"
     DATA_PATH = CWD / "data"
 
+    dirty_books = []
     try:
         # Ensure the parent directory for the database exists
         DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        
-        with sqlite3.connect(DB_PATH) as conn:
+
+        conn = sqlite3.connect(DB_PATH)
+        try:
             print(f"Successfully connected to the database at {DB_PATH}")
+            conn.execute("PRAGMA journal_mode=WAL")
             ensure_literature_table(conn)
-            cursor = conn.cursor()
 
             txt_files = list(DATA_PATH.glob("*.txt"))
             if not txt_files:
                 print(f"No .txt files found in {DATA_PATH}.")
-                return
+                return dirty_books
 
             print(f"Found {len(txt_files)} .txt file(s) to process.")
+            dirty_books = ingest_books(conn, txt_files)
+            chunk_books(conn, dirty_books)
+        finally:
+            conn.close()
 
-            for book_path in txt_files:
-                try:
-                    book_title = book_path.stem.replace("_", " ").title()
-                    
-                    # Default metadata
-                    author, publish_year, language = "Unknown", None, "en"
-
-                    if book_path.stem == "iliad":
-                        author, publish_year = "Homer", -800
-                    # Example for a Korean book if you add one later
-                    # elif book_path.stem == "some_korean_book":
-                    #     author, language = "Some Author", "ko"
-
-                    print(f"Processing '{book_title}'...")
-                    
-                    with open(book_path, 'r', encoding='utf-8') as f:
-                        book_body = f.read()
-                    
-                    cursor.execute("""
-                    INSERT INTO literature (title, author, publish_year, body, language)
-                    VALUES (?, ?, ?, ?, ?)
-                    ON CONFLICT(title) DO UPDATE SET
-                        author=excluded.author,
-                        publish_year=excluded.publish_year,
-                        body=excluded.body,
-                        language=excluded.language
-                    """, (book_title, author, publish_year, book_body, language))
-                    
-                    if cursor.rowcount > 0:
-                        print(f" -> Successfully inserted or updated '{book_title}'.")
-                    else:
-                        print(f" -> No changes for '{book_title}'.")
-
-                except Exception as e:
-                    print(f"Error processing {book_path}: {e}")
-
+        if dirty_books:
+            print("\nDirty books (their indexes re-embed only the changed chunks on the next load):")
+            for book in dirty_books:
+                print(f" - [{book['id']}] {book['title']}")
+        else:
+            print("\nNo books changed.")
         print(f"\nDatabase setup complete.")
 
     except sqlite3.Error as e:
         print(f"A database error occurred: {e}")
 
+    return dirty_books
+
 if __name__ == "__main__":
     setup_database()
@@ -0,0 +1,30 @@
+"""
+pytest 공통 설정입니다.
+
+테스트는 OpenAI API 없이 utils/fake_model_utils.py의 가짜 모델로 실행하며,
+저장소의 'literature.db'는 수정하지 않도록 임시 디렉토리에 복사한 사본을 사용합니다.
+"""
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import db_utils, vector_store_utils
+from utils.rate_limit_utils import RequestBudget
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """Points db_utils at a copy of literature.db and returns its path."""
+    db_path = tmp_path / "literature.db"
+    shutil.copy(db_utils.DB_PATH, db_path)
+    monkeypatch.setattr(db_utils, "DB_PATH", db_path)
+    db_utils.init_chunks_schema()
+    return db_path
+
+@pytest.fixture(autouse=True)
+def unlimited_embedding_budget(monkeypatch):
+    # 가짜 임베딩에는 API 한도가 없으므로 분당 요청/토큰 한도를 적용하지 않습니다.
+    monkeypatch.setattr(vector_store_utils, "get_embedding_budget", lambda: RequestBudget(float("inf"), float("inf")))
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from utils import answer_cache_utils, graph_utils
+from utils.answer_cache_utils import SemanticAnswerCache
+from utils.fake_model_utils import FakeChatModel, FakeEmbeddings
+from utils.graph_utils import PipelineChains, create_graph
+from utils.retriever_utils import HybridRetriever
+from utils.vector_store_utils import build_vector_store
+
+QUESTION = "Who is Ishmael?"
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings()
+
+@pytest.fixture
+def cache(tmp_path):
+    return SemanticAnswerCache(tmp_path / "answer_cache.db", similarity_threshold=0.9)
+
+def store(cache, embeddings, question=QUESTION, index_key="index-1", scope="scope", language="en", answer="The narrator."):
+    source = Document(page_content="Call me Ishmael.", metadata={"chunk_id": 1, "title": "Mobydick"})
+    cache.store(scope, index_key, language, question, embeddings.embed_query(question), answer, ["ishmael"], [source])
+
+def test_similar_question_returns_the_stored_answer(cache, embeddings):
+    store(cache, embeddings)
+    cached = cache.lookup("index-1", "en", embeddings.embed_query(QUESTION))
+
+    assert cached["answer"] == "The narrator." and cached["keywords"] == ["ishmael"]
+    assert cached["documents"][0].page_content == "Call me Ishmael."
+    assert cached["documents"][0].metadata == {"chunk_id": 1, "title": "Mobydick"}
+    assert cached["similarity"] == pytest.approx(1.0, abs=1e-5)
+    assert cache.stats()["hits"] == 1
+
+def test_dissimilar_question_other_language_or_index_misses(cache, embeddings):
+    store(cache, embeddings)
+    assert cache.lookup("index-1", "en", embeddings.embed_query("What color is the whale?")) is None
+    assert cache.lookup("index-1", "ko", embeddings.embed_query(QUESTION)) is None
+    assert cache.lookup("index-2", "en", embeddings.embed_query(QUESTION)) is None
+    assert cache.stats()["misses"] == 3
+
+def test_expired_answer_is_deleted(cache, embeddings, monkeypatch):
+    store(cache, embeddings)
+    now = answer_cache_utils.time.time()
+    monkeypatch.setattr(answer_cache_utils.time, "time", lambda: now + cache.ttl_seconds + 1)
+
+    assert cache.lookup("index-1", "en", embeddings.embed_query(QUESTION)) is None
+    assert cache.stats()["entries"] == 0
+
+def test_expired_best_match_falls_through_to_the_next_one(tmp_path, embeddings, monkeypatch):
+    cache = SemanticAnswerCache(tmp_path / "answer_cache.db", similarity_threshold=-1.0, ttl_seconds=60)
+    now = answer_cache_utils.time.time()
+    monkeypatch.setattr(answer_cache_utils.time, "time", lambda: now - 120)
+    store(cache, embeddings, answer="Expired.")
+    monkeypatch.setattr(answer_cache_utils.time, "time", lambda: now)
+    store(cache, embeddings, question="Who is Ahab?", answer="The captain.")
+
+    assert cache.lookup("index-1", "en", embeddings.embed_query(QUESTION))["answer"] == "The captain."
+    assert cache.stats()["entries"] == 1
+
+def test_entries_beyond_the_limit_are_evicted(tmp_path, embeddings):
+    cache = SemanticAnswerCache(tmp_path / "answer_cache.db", max_entries_per_index=2)
+    for question in ("Who is Ahab?", "Who is Queequeg?", "Who is Starbuck?"):
+        store(cache, embeddings, question=question, answer=question)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("index-1", "en", embeddings.embed_query("Who is Ahab?")) is None
+    assert cache.lookup("index-1", "en", embeddings.embed_query("Who is Starbuck?"))["answer"] == "Who is Starbuck?"
+
+def test_invalidate_stale_keeps_only_the_current_index_of_a_scope(cache, embeddings):
+    store(cache, embeddings, index_key="old")
+    store(cache, embeddings, index_key="other-scope", scope="other")
+    store(cache, embeddings, index_key="new")
+
+    assert cache.invalidate_stale("scope", "new") == 1
+    assert cache.lookup("old", "en", embeddings.embed_query(QUESTION)) is None
+    assert cache.lookup("new", "en", embeddings.embed_query(QUESTION)) is not None
+    assert cache.lookup("other-scope", "en", embeddings.embed_query(QUESTION)) is not None
+
+def test_answers_survive_a_restart(tmp_path, embeddings):
+    store(SemanticAnswerCache(tmp_path / "answer_cache.db"), embeddings)
+    reopened = SemanticAnswerCache(tmp_path / "answer_cache.db")
+    assert reopened.lookup("index-1", "en", embeddings.embed_query(QUESTION))["answer"] == "The narrator."
+
+def make_cached_app(cache, embeddings):
+    texts = ["Call me Ishmael.", "Ahab hunted the white whale.", "Queequeg was a harpooneer."]
+    documents = [Document(id=str(i), page_content=text, metadata={"chunk_id": i}) for i, text in enumerate(texts)]
+    vector_store, _ = build_vector_store(documents, embeddings)
+    app = create_graph(
+        vector_store, chains=PipelineChains(FakeChatModel()),
+        retriever=HybridRetriever(vector_store=vector_store, mode="vector", k=3),
+        answer_cache=cache, answer_cache_scope="scope", answer_cache_key="index-1",
+    )
+    return app
+
+def test_graph_answers_a_repeated_question_from_the_cache(cache, embeddings):
+    app = make_cached_app(cache, embeddings)
+    first = app.invoke({"question": "Who called himself Ishmael?"})
+    nodes = [node for update in app.stream({"question": "Who called himself Ishmael?"}, stream_mode="updates") for node in update]
+
+    assert first["generation"] and not first.get("answer_cache_hit")
+    assert "retrieve" not in nodes and "lookup_answer_cache" in nodes
+    assert cache.stats()["hits"] == 1
+
+def test_async_graph_stores_and_reuses_answers(cache, embeddings):
+    app = make_cached_app(cache, embeddings)
+
+    async def ask_twice():
+        first = await app.ainvoke({"question": "Who called himself Ishmael?"})
+        second = await app.ainvoke({"question": "Who called himself Ishmael?"})
+        return first, second
+
+    first, second = asyncio.run(ask_twice())
+    assert not first.get("answer_cache_hit") and second["answer_cache_hit"]
+    assert second["generation"] == first["generation"]
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_lookup_reuses_an_existing_query_embedding(cache, use_async):
+    class NoEmbeddings:
+        def embed_query(self, text):
+            raise AssertionError("the question was embedded again")
+
+        async def aembed_query(self, text):
+            raise AssertionError("the question was embedded again")
+
+    state = {"question": QUESTION, "original_language": "en", "query_embedding": FakeEmbeddings().embed_query(QUESTION)}
+    if use_async:
+        result = asyncio.run(graph_utils.alookup_answer_cache(state, cache, "index-1", NoEmbeddings()))
+    else:
+        result = graph_utils.lookup_answer_cache(state, cache, "index-1", NoEmbeddings())
+    assert result["query_embedding"] == state["query_embedding"] and not result["answer_cache_hit"]
@@ -0,0 +1,47 @@
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+from utils import db_utils
+from utils.load_and_split_text_utils import CHUNK_OVERLAP, CHUNK_SIZE, get_or_create_chunks
+
+ILIAD_ID = 2
+
+@pytest.fixture
+def statements(scratch_db, monkeypatch):
+    """Records every SQL statement run through db_utils.get_db_connection."""
+    get_or_create_chunks(ILIAD_ID, CHUNK_SIZE, CHUNK_OVERLAP)
+    executed = []
+    open_connection = db_utils.get_db_connection
+
+    @contextmanager
+    def traced_connection():
+        with open_connection() as conn:
+            conn.set_trace_callback(executed.append)
+            yield conn
+
+    monkeypatch.setattr(db_utils, "get_db_connection", traced_connection)
+    return executed
+
+def test_chunk_reads_do_not_touch_the_schema(statements):
+    assert db_utils.get_chunks(ILIAD_ID, CHUNK_SIZE, CHUNK_OVERLAP)
+    assert db_utils.get_chunk_hashes(ILIAD_ID, CHUNK_SIZE, CHUNK_OVERLAP)
+    assert db_utils.search_chunks_fts("achilles", [ILIAD_ID], CHUNK_SIZE, CHUNK_OVERLAP)
+
+    assert statements
+    schema_work = [s for s in statements if "CREATE" in s.upper() or "sqlite_master" in s or "INSERT" in s.upper()]
+    assert schema_work == []
+
+def test_init_chunks_schema_runs_once_per_database(scratch_db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(db_utils, "ensure_chunks_table", calls.append)
+    db_utils.init_chunks_schema()
+    assert calls == []
+
+    other_db = scratch_db.with_name("other.db")
+    sqlite3.connect(other_db).close()
+    monkeypatch.setattr(db_utils, "DB_PATH", other_db)
+    db_utils.init_chunks_schema()
+    db_utils.init_chunks_schema()
+    assert len(calls) == 1
@@ -0,0 +1,49 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from utils.embedding_cache_utils import CachedEmbeddings
+from utils.fake_model_utils import FakeEmbeddings
+from utils.tracing_utils import estimate_tokens
+from utils.vector_store_utils import embed_documents_in_batches
+
+@pytest.fixture
+def fast_thread_switching():
+    # 스레드 전환을 잦게 만들어 잠금 없는 카운터 갱신이 드러나도록 합니다.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+def test_counters_are_exact_under_concurrent_batches(tmp_path, fast_thread_switching):
+    embeddings = CachedEmbeddings(FakeEmbeddings(), "fake", tmp_path / "embedding_cache.db")
+    batches = [[f"text {batch} {i}" for i in range(20)] for batch in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(embeddings.embed_documents, batches))
+        list(executor.map(embeddings.embed_documents, batches))
+        list(executor.map(embeddings.embed_query, [batch[0] for batch in batches]))
+
+    assert embeddings.misses == 16 * 20
+    assert embeddings.hits == 16 * 20 + 16
+
+class RecordingBudget:
+    def __init__(self):
+        self.acquired = []
+
+    def acquire(self, tokens):
+        self.acquired.append(tokens)
+
+def test_cached_batches_do_not_use_the_request_budget(tmp_path):
+    embeddings = CachedEmbeddings(FakeEmbeddings(), "fake", tmp_path / "embedding_cache.db")
+    texts = [f"text {i}" for i in range(10)]
+    first = embed_documents_in_batches(texts[:6], embeddings, batch_size=3, budget=RecordingBudget())
+
+    budget = RecordingBudget()
+    vectors = embed_documents_in_batches(texts, embeddings, batch_size=3, budget=budget)
+
+    assert np.allclose(vectors[:6], first)
+    # 새 텍스트 4개(배치 2개)만 한도에 포함됩니다.
+    assert len(budget.acquired) == 2
+    assert sum(budget.acquired) == sum(estimate_tokens(text) for text in texts[6:])
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from utils import graph_utils
+from utils.fake_model_utils import FakeChatModel, FakeEmbeddings
+from utils.graph_utils import PipelineChains, grade_documents
+from utils.retriever_utils import HybridRetriever, reciprocal_rank_fusion
+from utils.vector_store_utils import build_vector_store
+
+QUESTION = "Who is Achilles?"
+
+@pytest.fixture(scope="module")
+def chains():
+    return PipelineChains(FakeChatModel())
+
+def make_doc(chunk_id, text, **metadata):
+    return Document(id=str(chunk_id), page_content=text, metadata={"chunk_id": chunk_id, **metadata})
+
+@pytest.mark.parametrize("value, expected", [("", None), ("none", None), ("None", None), ("0.6", 0.6)])
+def test_threshold_from_env(monkeypatch, value, expected):
+    monkeypatch.setenv("GRADING_TEST_THRESHOLD", value)
+    assert graph_utils._threshold_from_env("GRADING_TEST_THRESHOLD") == expected
+
+def test_threshold_unset_is_disabled(monkeypatch):
+    monkeypatch.delenv("GRADING_TEST_THRESHOLD", raising=False)
+    assert graph_utils._threshold_from_env("GRADING_TEST_THRESHOLD") is None
+
+@pytest.mark.parametrize("grading_mode", graph_utils.GRADING_MODES)
+def test_gate_applies_only_to_vector_only_documents(chains, grading_mode):
+    confident = make_doc(1, "The ships sailed home.", similarity=0.9)
+    far_vector_only = make_doc(2, "Achilles sulked in his tent.", similarity=0.05)
+    far_but_lexical = make_doc(3, "Achilles raised his spear.", similarity=0.05, bm25=-3.2)
+    lexical_only = make_doc(4, "Achilles wept for Patroclus.", bm25=-2.1)
+    unrelated = make_doc(5, "Hector went to Troy.", similarity=0.3)
+    state = {"question": QUESTION, "documents": [confident, far_vector_only, far_but_lexical, lexical_only, unrelated]}
+
+    before = graph_utils.get_grading_stats()
+    result = grade_documents(state, chains, grading_mode, accept_threshold=0.6, reject_threshold=0.1)
+    after = graph_utils.get_grading_stats()
+
+    assert [doc.id for doc in result["documents"]] == ["1", "3", "4"]
+    assert after["auto_accepted"] - before["auto_accepted"] == 1
+    assert after["auto_rejected"] - before["auto_rejected"] == 1
+    assert after["llm_graded"] - before["llm_graded"] == 3
+
+def test_gate_disabled_by_default_grades_everything_with_llm(chains):
+    documents = [make_doc(1, "The ships sailed home.", similarity=0.99), make_doc(2, "Achilles sulked.", similarity=-0.4)]
+    result = grade_documents({"question": QUESTION, "documents": documents}, chains, "concurrent", None, None)
+    assert [doc.id for doc in result["documents"]] == ["2"]
+
+def test_all_rejected_counts_a_retry(chains):
+    result = grade_documents(
+        {"question": QUESTION, "documents": [make_doc(1, "Achilles.", similarity=0.0)], "retries": 1},
+        chains, "concurrent", accept_threshold=None, reject_threshold=0.1,
+    )
+    assert result == {"documents": [], "retries": 2}
+
+class TruncatedBatchGradeChatModel(FakeChatModel):
+    """Cuts off the multi-document grading response, as a long structured output might be."""
+
+    def _respond(self, prompt):
+        text = super()._respond(prompt)
+        if "assessing relevance of retrieved documents" in prompt:
+            return text[:20]
+        return text
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_single_call_falls_back_to_per_document_grading(use_async):
+    chains = PipelineChains(TruncatedBatchGradeChatModel())
+    documents = [make_doc(1, "Achilles sulked in his tent."), make_doc(2, "The ships sailed home.")]
+    state = {"question": QUESTION, "documents": documents}
+
+    if use_async:
+        result = asyncio.run(graph_utils.agrade_documents(state, chains, "single_call", accept_threshold=None, reject_threshold=None))
+    else:
+        result = grade_documents(state, chains, "single_call", accept_threshold=None, reject_threshold=None)
+    assert [doc.id for doc in result["documents"]] == ["1"]
+
+def test_rrf_keeps_metadata_of_every_list():
+    vector_results = [make_doc(1, "a", similarity=0.2), make_doc(2, "b", similarity=0.1)]
+    lexical_results = [make_doc(2, "b", bm25=-5.0), make_doc(3, "c", bm25=-1.0)]
+    fused = reciprocal_rank_fusion([vector_results, lexical_results], top_k=3)
+
+    assert [doc.id for doc in fused] == ["2", "1", "3"]
+    assert fused[0].metadata["similarity"] == 0.1 and fused[0].metadata["bm25"] == -5.0
+    assert "bm25" not in fused[1].metadata
+    assert "similarity" not in fused[2].metadata
+    # 공유되는 원본 문서는 바뀌지 않습니다.
+    assert "rrf_score" not in vector_results[1].metadata and "similarity" not in lexical_results[0].metadata
+
+def test_vector_similarity_is_cosine():
+    texts = ["Achilles sulked in his tent", "Hector went back to Troy", "ships on the wine dark sea"]
+    embeddings = FakeEmbeddings()
+    vector_store, _ = build_vector_store([make_doc(i, text) for i, text in enumerate(texts)], embeddings)
+    retriever = HybridRetriever(vector_store=vector_store, mode="vector", k=3)
+
+    query_embedding = embeddings.embed_query(texts[0])
+    documents = retriever._vector_search_with_similarity(query_embedding, k=3)
+
+    vectors = embeddings.embed_documents(texts)
+    expected = {str(i): sum(a * b for a, b in zip(query_embedding, vector)) for i, vector in enumerate(vectors)}
+    assert documents[0].id == "0"
+    for doc in documents:
+        assert doc.metadata["similarity"] == pytest.approx(expected[doc.id], abs=1e-5)
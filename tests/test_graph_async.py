@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from utils.fake_model_utils import FakeChatModel, FakeEmbeddings
+from utils.graph_utils import GRADING_MODES, PipelineChains, astream_answer, create_graph, stream_answer
+from utils.retriever_utils import HybridRetriever
+from utils.vector_store_utils import build_vector_store
+
+TEXTS = [
+    "Achilles sulked in his tent after the quarrel with Agamemnon.",
+    "Hector said farewell to Andromache at the Scaean gate.",
+    "The Greek ships were drawn up on the shore near Troy.",
+]
+
+class CountingChatModel(FakeChatModel):
+    """Fake chat model that records whether it was called through the sync or the async API."""
+    calls: dict = {}
+
+    def _count(self, kind):
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def _generate(self, *args, **kwargs):
+        self._count("sync")
+        return super()._generate(*args, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        self._count("sync")
+        yield from super()._stream(*args, **kwargs)
+
+    async def _agenerate(self, *args, **kwargs):
+        self._count("async")
+        return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        self._count("async")
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+@pytest.fixture
+def model():
+    CountingChatModel.calls = {}
+    return CountingChatModel()
+
+def make_app(model, grading_mode="concurrent"):
+    documents = [Document(id=str(i), page_content=text, metadata={"chunk_id": i}) for i, text in enumerate(TEXTS)]
+    vector_store, _ = build_vector_store(documents, FakeEmbeddings())
+    retriever = HybridRetriever(vector_store=vector_store, mode="vector", k=3)
+    return create_graph(vector_store, grading_mode, chains=PipelineChains(model), retriever=retriever)
+
+@pytest.mark.parametrize("grading_mode", GRADING_MODES)
+def test_ainvoke_calls_models_asynchronously(model, grading_mode):
+    app = make_app(model, grading_mode)
+    result = asyncio.run(app.ainvoke({"question": "Why did Achilles sulk in his tent?"}))
+
+    assert result["generation"]
+    assert model.calls.get("async", 0) >= 3
+    assert "sync" not in model.calls
+
+def test_astream_answer_calls_models_asynchronously(model):
+    app = make_app(model)
+
+    async def collect():
+        return [event async for event in astream_answer(app, {"question": "Why did Achilles sulk in his tent?"})]
+
+    events = asyncio.run(collect())
+    assert events
+    assert "sync" not in model.calls
+
+def test_invoke_still_uses_sync_api(model):
+    app = make_app(model)
+    result = app.invoke({"question": "Why did Achilles sulk in his tent?"})
+
+    assert result["generation"]
+    assert "async" not in model.calls
+
+class BrokenJsonChatModel(FakeChatModel):
+    """Answers the structured answer prompt with JSON that cuts off, so generate falls back to plain text."""
+
+    def _respond(self, prompt):
+        text = super()._respond(prompt)
+        if "question-answering tasks" in prompt:
+            return text[:40]
+        return text
+
+def test_stream_answer_streams_the_plaintext_fallback():
+    app = make_app(BrokenJsonChatModel())
+    events = list(stream_answer(app, {"question": "Why did Achilles sulk in his tent?"}))
+
+    answers = [event[1] for event in events if event[0] == "answer"]
+    final_state = {}
+    for event in events:
+        if event[0] == "node":
+            final_state.update(event[2] or {})
+    assert final_state["keywords"] == []
+    assert len(answers) > 1
+    assert answers[-1] == final_state["generation"]
@@ -0,0 +1,36 @@
+import faiss
+import numpy as np
+import pytest
+
+from utils.vector_store_utils import MIN_TRAINING_POINTS_PER_CENTROID, build_faiss_index, get_index_factory_string
+
+DIMENSION = 256
+
+@pytest.mark.parametrize("n_vectors, expected", [
+    (10, "Flat"),
+    (100, "IVF2,Flat"),
+    (623, "IVF15,Flat"),
+    (624, "IVF16,PQ16x4"),
+    (5000, "IVF128,PQ16x7"),
+    (50000, "IVF894,PQ16x8"),
+])
+def test_ivf_pq_is_sized_for_its_training_set(n_vectors, expected):
+    assert get_index_factory_string("ivf_pq", DIMENSION, n_vectors) == expected
+
+@pytest.mark.parametrize("n_vectors", [624, 1167, 5000, 9984, 10 ** 6])
+def test_every_centroid_has_enough_training_points(n_vectors):
+    factory = get_index_factory_string("ivf_pq", DIMENSION, n_vectors)
+    nlist = int(factory.split(",")[0][3:])
+    nbits = int(factory.rsplit("x", 1)[1])
+    assert n_vectors >= MIN_TRAINING_POINTS_PER_CENTROID * max(nlist, 2 ** nbits)
+
+@pytest.mark.parametrize("n_vectors", [50, 300])
+def test_small_ivf_pq_shard_builds_as_exact_or_ivf_flat(n_vectors):
+    vectors = np.random.default_rng(0).random((n_vectors, DIMENSION), dtype="float32")
+    index, factory = build_faiss_index(vectors, "ivf_pq")
+    assert "PQ" not in factory
+    assert index.ntotal == n_vectors
+    _, ids = index.search(vectors[:5], 1)
+    assert ids[:, 0].tolist() == list(range(5))
+    ivf = faiss.try_extract_index_ivf(index)
+    assert ivf is None or ivf.nprobe > 1
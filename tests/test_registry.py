@@ -0,0 +1,131 @@
+import threading
+import time
+
+from utils.registry_utils import ResourceRegistry
+
+def factory_of(value, calls=None):
+    def factory():
+        if calls is not None:
+            calls.append(value)
+        return value
+    return factory
+
+def test_acquire_builds_once_and_counts_hits():
+    registry, calls = ResourceRegistry(max_bytes=100), []
+    assert registry.acquire("a", factory_of("A", calls), "s1") == "A"
+    assert registry.acquire("a", factory_of("other", calls), "s2") == "A"
+    assert calls == ["A"]
+    [entry] = registry.resident()
+    assert entry["hits"] == 1 and entry["sessions"] == 2
+
+def test_evicts_least_recently_used_unreferenced_entries():
+    registry = ResourceRegistry(max_bytes=20)
+    for key in ("a", "b"):
+        registry.acquire(key, factory_of(key), "s1", size_fn=lambda value: 10)
+    registry.release("s1")
+    registry.acquire("a", factory_of("a"), "s2", size_fn=lambda value: 10)  # 'b'가 가장 오래 쓰이지 않은 항목이 됩니다.
+    registry.acquire("c", factory_of("c"), "s2", size_fn=lambda value: 10)
+    assert sorted(entry["key"] for entry in registry.resident()) == ["a", "c"]
+
+def test_entries_in_use_are_not_evicted():
+    registry = ResourceRegistry(max_bytes=10)
+    registry.acquire("a", factory_of("a"), "s1", size_fn=lambda value: 10)
+    registry.acquire("b", factory_of("b"), "s2", size_fn=lambda value: 10)
+    assert registry.total_bytes == 20
+    registry.release("s1")
+    assert [entry["key"] for entry in registry.resident()] == ["b"]
+
+def test_release_keeps_the_given_keys():
+    registry = ResourceRegistry(max_bytes=10)
+    registry.acquire("a", factory_of("a"), "s1", size_fn=lambda value: 5)
+    registry.acquire("b", factory_of("b"), "s1", size_fn=lambda value: 5)
+    registry.release("s1", keep=["b"])
+    registry.acquire("c", factory_of("c"), "s2", size_fn=lambda value: 5)
+    assert sorted(entry["key"] for entry in registry.resident()) == ["b", "c"]
+
+def test_expired_session_references_are_evictable():
+    registry = ResourceRegistry(max_bytes=10, session_ttl_seconds=0.05)
+    registry.acquire("a", factory_of("a"), "idle", size_fn=lambda value: 10)
+    time.sleep(0.1)
+    registry.acquire("b", factory_of("b"), "s2", size_fn=lambda value: 10)
+    assert [entry["key"] for entry in registry.resident()] == ["b"]
+
+def test_evicting_a_dependency_drops_its_dependents():
+    registry = ResourceRegistry(max_bytes=25)
+    registry.acquire("shard", factory_of("shard"), "s1", size_fn=lambda value: 20)
+    registry.acquire("graph", factory_of("graph"), "s1", depends_on=["shard"])
+    registry.acquire("graph2", factory_of("graph2"), "s1", depends_on=["graph"])
+    registry.release("s1")
+    registry.acquire("other", factory_of("other"), "s2", size_fn=lambda value: 10)
+    assert [entry["key"] for entry in registry.resident()] == ["other"]
+
+def test_concurrent_callers_share_one_build():
+    registry, calls = ResourceRegistry(max_bytes=100), []
+    started = threading.Event()
+
+    def slow_factory():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(registry.acquire("a", slow_factory, f"s{i}"))) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len({id(result) for result in results}) == 1
+    assert registry.resident()[0]["sessions"] == 4
+
+def test_building_one_key_does_not_block_other_keys():
+    registry = ResourceRegistry(max_bytes=100)
+    registry.acquire("ready", factory_of("ready"), "s1")
+    building, release_build = threading.Event(), threading.Event()
+
+    def blocked_factory():
+        building.set()
+        release_build.wait(5)
+        return "slow"
+
+    thread = threading.Thread(target=registry.acquire, args=("slow", blocked_factory, "s2"))
+    thread.start()
+    assert building.wait(5)
+    started = time.perf_counter()
+    assert registry.acquire("ready", factory_of("unused"), "s3") == "ready"
+    assert registry.acquire("new", factory_of("new"), "s3") == "new"
+    assert [entry["key"] for entry in registry.resident()] == ["new", "ready"]
+    assert time.perf_counter() - started < 1
+    release_build.set()
+    thread.join()
+    assert registry.acquire("slow", factory_of("unused"), "s3") == "slow"
+
+def test_failed_build_is_reported_to_waiters_and_retried():
+    registry = ResourceRegistry(max_bytes=100)
+    building, fail = threading.Event(), threading.Event()
+
+    def failing_factory():
+        building.set()
+        fail.wait(5)
+        raise RuntimeError("embedding failed")
+
+    errors = []
+    def acquire(factory):
+        try:
+            registry.acquire("a", factory, "s1")
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    builder = threading.Thread(target=acquire, args=(failing_factory,))
+    builder.start()
+    assert building.wait(5)
+    waiter = threading.Thread(target=acquire, args=(factory_of("unused"),))
+    waiter.start()
+    time.sleep(0.05)
+    fail.set()
+    builder.join()
+    waiter.join()
+    assert errors == ["embedding failed", "embedding failed"]
+    assert registry.resident() == []
+    assert registry.acquire("a", factory_of("A"), "s1") == "A"
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.globals import get_llm_cache, set_llm_cache
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from utils.context_utils import build_context, get_tokenizer
+from utils.fake_model_utils import FakeChatModel
+from utils.llm_cache_utils import LRUResponseCache
+from utils.tracing_utils import TraceAggregator, trace_request
+
+QUESTIONS = [f"Question number {i} about Achilles?" for i in range(8)]
+
+@pytest.fixture
+def chain():
+    previous = get_llm_cache()
+    set_llm_cache(LRUResponseCache())
+    yield ChatPromptTemplate.from_template("{question}") | FakeChatModel(latency_seconds=0.01) | StrOutputParser()
+    set_llm_cache(previous)
+
+def cached_flags(aggregator):
+    return [call["cached"] for trace in aggregator.recent() for call in trace["llm_calls"]]
+
+def test_cache_hits_are_attributed_in_threaded_batch(chain):
+    chain.batch([{"question": q} for q in QUESTIONS[::2]])
+    aggregator = TraceAggregator(export_path=None)
+    with trace_request("batch", aggregator) as tracer:
+        chain.batch([{"question": q} for q in QUESTIONS], config={"callbacks": [tracer], "max_concurrency": 8})
+
+    flags = cached_flags(aggregator)
+    assert len(flags) == len(QUESTIONS)
+    assert sum(flags) == len(QUESTIONS[::2])
+    assert aggregator.summary()["llm_cache_hit_rate"] == 0.5
+
+def test_cache_hits_are_attributed_in_async_batch(chain):
+    chain.batch([{"question": q} for q in QUESTIONS[:2]])
+    aggregator = TraceAggregator(export_path=None)
+
+    async def run():
+        with trace_request("abatch", aggregator) as tracer:
+            await chain.abatch([{"question": q} for q in QUESTIONS], config={"callbacks": [tracer]})
+
+    asyncio.run(run())
+    flags = cached_flags(aggregator)
+    assert len(flags) == len(QUESTIONS)
+    assert sum(flags) == 2
+
+def test_context_sizes_are_recorded_on_the_trace_without_logging(capsys):
+    text = "Achilles sulked in his tent. " * 20
+    documents = [
+        Document(page_content=text, metadata={"literature_id": 1, "start_index": 0, "end_index": len(text)}),
+        Document(page_content=text, metadata={"literature_id": 1, "start_index": 10000, "end_index": 10000 + len(text)}),
+    ]
+    # tiktoken 인코딩을 불러오지 못했다는 (프로세스당 한 번의) 안내는 확인 대상이 아닙니다.
+    get_tokenizer("gpt-4o-mini")
+    capsys.readouterr()
+    aggregator = TraceAggregator(export_path=None)
+    with trace_request("context", aggregator):
+        build_context(documents, "gpt-4o-mini", token_budget=100000)
+        build_context(documents, "gpt-4o-mini", token_budget=60)
+
+    assert capsys.readouterr().out == ""
+    full, cut = aggregator.recent()[0]["contexts"]
+    assert (full["chunks"], full["passages"], full["used_passages"], full["truncated"]) == (2, 2, 2, False)
+    assert cut["used_passages"] == 1 and cut["truncated"] and cut["tokens"] <= 60
+    summary = aggregator.summary()
+    assert summary["contexts"] == 2 and summary["truncated_contexts"] == 1
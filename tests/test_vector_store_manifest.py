@@ -0,0 +1,169 @@
+import json
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from utils import vector_store_utils
+from utils.db_utils import get_db_connection, get_literature_body, get_literatures_by_titles, save_chunks
+from utils.fake_model_utils import FakeEmbeddings
+from utils.load_and_split_text_utils import CHUNK_OVERLAP, CHUNK_SIZE, chunk_content_hash, split_text_with_offsets
+from utils.pipeline_utils import load_book_chunk_entries, load_book_chunks, load_book_chunks_by_ids
+from utils.registry_utils import ResourceRegistry
+from utils.retriever_utils import HybridRetriever
+from utils.vector_store_utils import INDEX_MANIFEST_FILENAME, get_or_create_sharded_vector_store
+
+OPENING = "Sing, O goddess, the anger of Achilles"
+
+class CountingEmbeddings(Embeddings):
+    """FakeEmbeddings that counts the texts it is asked to embed."""
+
+    def __init__(self):
+        self.inner = FakeEmbeddings()
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.inner.embed_query(text)
+
+@pytest.fixture
+def book(scratch_db):
+    return get_literatures_by_titles(["Iliad"])[0]
+
+class ShardLoader:
+    """Opens the book's shard the way prepare_rag_app does, counting full chunk loads."""
+
+    def __init__(self, root, book, index_type="flat"):
+        self.root, self.book, self.index_type = root, book, index_type
+        self.full_loads = 0
+
+    def load_chunks(self, book):
+        self.full_loads += 1
+        return load_book_chunks(book)
+
+    def open(self, embeddings):
+        store = get_or_create_sharded_vector_store(
+            [self.book], self.root, embeddings, "fake", CHUNK_SIZE, CHUNK_OVERLAP, self.load_chunks,
+            index_type=self.index_type, load_chunk_entries=load_book_chunk_entries, load_chunks_by_ids=load_book_chunks_by_ids,
+        )
+        return store.shards[self.book["id"]]
+
+    @property
+    def manifest_path(self):
+        return next(self.root.iterdir()) / INDEX_MANIFEST_FILENAME
+
+def edit_body(book, old, new):
+    body = get_literature_body(book["id"]).replace(old, new, 1)
+    with get_db_connection() as conn:
+        conn.execute("UPDATE literature SET body = ? WHERE id = ?", (body, book["id"]))
+        save_chunks(conn, book["id"], split_text_with_offsets(body, CHUNK_SIZE, CHUNK_OVERLAP), CHUNK_SIZE, CHUNK_OVERLAP)
+        conn.commit()
+
+def test_unchanged_shard_is_checked_without_loading_chunks(tmp_path, book):
+    loader = ShardLoader(tmp_path / "shards", book)
+    first = CountingEmbeddings()
+    shard = loader.open(first)
+    assert loader.full_loads == 1 and first.embedded == shard.index.ntotal
+
+    again = CountingEmbeddings()
+    loader.open(again)
+    assert loader.full_loads == 1
+    assert again.embedded == 0
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_edit_embeds_and_reads_only_changed_chunks(tmp_path, book, index_type):
+    loader = ShardLoader(tmp_path / "shards", book, index_type)
+    loader.open(CountingEmbeddings())
+    edit_body(book, OPENING, "Sing, O muse, the ZEBRAQUUX anger of Achilles")
+
+    embeddings = CountingEmbeddings()
+    shard = loader.open(embeddings)
+    assert loader.full_loads == 1
+    assert 0 < embeddings.embedded <= 2
+
+    manifest = json.loads(loader.manifest_path.read_text(encoding="utf-8"))
+    current = load_book_chunks(book)
+    assert sorted(map(tuple, manifest["chunks"])) == sorted((doc.id, chunk_content_hash(doc.page_content)) for doc in current)
+    assert manifest["ntotal"] == shard.index.ntotal == len(current)
+    assert manifest["literature_ids"] == [book["id"]]
+    assert "ZEBRAQUUX" in shard.similarity_search("Sing, O muse, the ZEBRAQUUX anger of Achilles", k=1)[0].page_content
+
+def test_lossy_index_is_rebuilt_from_every_chunk(tmp_path, book, monkeypatch):
+    # IVF-PQ 학습은 느리므로 flat 인덱스를 손실 압축 인덱스로 취급하여 재생성 경로를 확인합니다.
+    monkeypatch.setattr(vector_store_utils, "LOSSY_INDEX_TYPES", ("flat",))
+    loader = ShardLoader(tmp_path / "shards", book)
+    loader.open(CountingEmbeddings())
+    edit_body(book, OPENING, "Sing, O muse, the ZEBRAQUUX anger of Achilles")
+
+    embeddings = CountingEmbeddings()
+    shard = loader.open(embeddings)
+    assert loader.full_loads == 2
+    assert embeddings.embedded == shard.index.ntotal
+
+def test_manifest_for_other_parameters_forces_rebuild(tmp_path, book):
+    loader = ShardLoader(tmp_path / "shards", book)
+    loader.open(CountingEmbeddings())
+    manifest = json.loads(loader.manifest_path.read_text(encoding="utf-8"))
+    loader.manifest_path.write_text(json.dumps({**manifest, "embedding_model": "other"}), encoding="utf-8")
+
+    embeddings = CountingEmbeddings()
+    shard = loader.open(embeddings)
+    assert embeddings.embedded == shard.index.ntotal
+    assert json.loads(loader.manifest_path.read_text(encoding="utf-8"))["embedding_model"] == "fake"
+
+def test_shard_without_manifest_adopts_one(tmp_path, book):
+    loader = ShardLoader(tmp_path / "shards", book)
+    loader.open(CountingEmbeddings())
+    loader.manifest_path.unlink()
+
+    embeddings = CountingEmbeddings()
+    loader.open(embeddings)
+    assert embeddings.embedded == 0
+    assert loader.manifest_path.exists()
+
+def test_loaded_shard_skips_deleted_chunks_and_registry_reloads_it(tmp_path, book):
+    registry = ResourceRegistry(max_bytes=1 << 30)
+
+    def open_store():
+        return get_or_create_sharded_vector_store(
+            [book], tmp_path / "shards", FakeEmbeddings(), "fake", CHUNK_SIZE, CHUNK_OVERLAP, load_book_chunks,
+            registry=registry, owner="s1", load_chunk_entries=load_book_chunk_entries, load_chunks_by_ids=load_book_chunks_by_ids,
+        )
+
+    stale = open_store()
+    query = FakeEmbeddings().embed_query(OPENING)
+    deleted_id = stale.similarity_search_with_score_by_vector(query, k=1)[0][0].id
+    edit_body(book, OPENING, "Sing, O muse, the ZEBRAQUUX anger of Achilles")
+
+    # 다시 불러오기 전의 샤드는 지워진 청크를 건너뛰고 나머지 결과를 돌려줍니다.
+    results = stale.similarity_search_with_score_by_vector(query, k=4)
+    assert results and deleted_id not in [doc.id for doc, _ in results]
+
+    fresh = open_store()
+    assert fresh.shard_keys != stale.shard_keys
+    assert "ZEBRAQUUX" in fresh.similarity_search("Sing, O muse, the ZEBRAQUUX anger of Achilles", k=1)[0].page_content
+
+def test_hits_of_a_shard_are_read_in_one_query(tmp_path, book, monkeypatch):
+    store = get_or_create_sharded_vector_store(
+        [book], tmp_path / "shards", FakeEmbeddings(), "fake", CHUNK_SIZE, CHUNK_OVERLAP, load_book_chunks,
+        load_chunk_entries=load_book_chunk_entries,
+    )
+    calls = []
+    get_chunks_by_ids = vector_store_utils.get_chunks_by_ids
+    monkeypatch.setattr(vector_store_utils, "get_chunks_by_ids", lambda ids: calls.append(ids) or get_chunks_by_ids(ids))
+
+    assert len(store.similarity_search(OPENING, k=4)) == 4
+    assert len(calls) == 1 and len(calls[0]) == 4
+
+def test_sharded_store_is_query_only_and_feeds_the_retriever(tmp_path, book):
+    store = get_or_create_sharded_vector_store(
+        [book], tmp_path / "shards", FakeEmbeddings(), "fake", CHUNK_SIZE, CHUNK_OVERLAP, load_book_chunks,
+        load_chunk_entries=load_book_chunk_entries,
+    )
+    assert not hasattr(store, "add_texts") and not hasattr(store, "from_texts")
+
+    retriever = HybridRetriever(vector_store=store, literatures=[book], mode="vector", k=2)
+    documents, _ = retriever.retrieve_page(OPENING)
+    assert len(documents) == 2 and all(doc.metadata["title"] == book["title"] for doc in documents)
@@ -0,0 +1,208 @@
+"""
+질문 임베딩으로 이전 답변을 찾아 재사용하는 의미 기반(semantic) 답변 캐시입니다.
+
+같은 작품에 대해 표현만 다른 질문("Who is Ishmael?" / "Tell me about Ishmael")이 반복되면,
+(번역된) 질문의 임베딩과 가장 가까운 이전 질문을 찾아 유사도가 기준 이상이면 검색, 평가,
+생성, 번역을 모두 건너뛰고 저장된 답변, 출처, 키워드를 바로 돌려줍니다.
+
+캐시 항목은 인덱스 식별자(index_key: 그래프 구성과 샤드 파일의 지문)별로 구분되므로,
+샤드가 다시 만들어지면 이전 인덱스로 만든 답변은 더 이상 사용되지 않고 삭제됩니다.
+답변은 SQLite('answer_cache.db')에 저장되어 재시작 후에도 유지되고, 검색에 사용하는
+정규화된 임베딩 행렬은 인덱스별로 메모리에 올려 둡니다.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+ANSWER_CACHE_DB_PATH = Path(__file__).parent.parent / "data" / "answer_cache.db"
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+# 이 코사인 유사도 이상인 이전 질문의 답변을 재사용합니다.
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.9"))
+ANSWER_CACHE_MAX_ENTRIES_PER_INDEX = 5000
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype="float32")
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticAnswerCache:
+    """인덱스별로 질문 임베딩과 최종 답변을 저장하고, 가장 비슷한 이전 질문의 답변을 찾습니다."""
+
+    def __init__(
+        self,
+        db_path: Path = ANSWER_CACHE_DB_PATH,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        max_entries_per_index: int = ANSWER_CACHE_MAX_ENTRIES_PER_INDEX,
+        ttl_seconds: Optional[float] = ANSWER_CACHE_TTL_SECONDS,
+    ):
+        self.db_path = db_path
+        self.similarity_threshold = similarity_threshold
+        self.max_entries_per_index = max_entries_per_index
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # (index_key, answer_language) -> (행 id 배열, 정규화된 임베딩 행렬)
+        self._vectors: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS answer_cache (
+            id INTEGER PRIMARY KEY,
+            scope TEXT NOT NULL,
+            index_key TEXT NOT NULL,
+            answer_language TEXT NOT NULL,
+            question TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            answer TEXT NOT NULL,
+            keywords TEXT NOT NULL,
+            sources TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_hit_at REAL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_index ON answer_cache(index_key, answer_language)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_scope ON answer_cache(scope)")
+        self._conn.commit()
+
+    def _load(self, index_key: str, answer_language: str) -> Tuple[np.ndarray, np.ndarray]:
+        key = (index_key, answer_language)
+        if key not in self._vectors:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM answer_cache WHERE index_key = ? AND answer_language = ? ORDER BY id",
+                (index_key, answer_language),
+            ).fetchall()
+            ids = np.array([row[0] for row in rows], dtype="int64")
+            matrix = np.stack([np.frombuffer(row[1], dtype="float32") for row in rows]) if rows else np.empty((0, 0), dtype="float32")
+            self._vectors[key] = (ids, matrix)
+        return self._vectors[key]
+
+    def lookup(self, index_key: str, answer_language: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached answer of the most similar earlier question, if it is similar enough.
+        Expired answers are deleted on the way, and the next most similar one is used instead.
+
+        Returns:
+            None on a miss, otherwise a dict with 'question', 'answer', 'keywords',
+            'documents' (LangChain Documents) and 'similarity'.
+        """
+        now = time.time()
+        with self._lock:
+            ids, matrix = self._load(index_key, answer_language)
+            row = None
+            expired_ids = []
+            if len(ids):
+                similarities = matrix @ _normalize(embedding)
+                # 기준 이상인 후보를 유사도 순으로 확인하여, 만료된 항목은 지우고 다음 후보를 사용합니다.
+                candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+                for candidate in candidates[np.argsort(-similarities[candidates], kind="stable")]:
+                    row = self._conn.execute(
+                        "SELECT id, question, answer, keywords, sources, created_at FROM answer_cache WHERE id = ?",
+                        (int(ids[candidate]),),
+                    ).fetchone()
+                    if row is not None and self.ttl_seconds is not None and now - row[5] > self.ttl_seconds:
+                        expired_ids.append(row[0])
+                        row = None
+                    if row is not None:
+                        similarity = float(similarities[candidate])
+                        break
+            if expired_ids:
+                self._conn.executemany("DELETE FROM answer_cache WHERE id = ?", [(i,) for i in expired_ids])
+                self._conn.commit()
+                self._vectors.pop((index_key, answer_language), None)
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answer_cache SET hits = hits + 1, last_hit_at = ? WHERE id = ?", (now, row[0]))
+            self._conn.commit()
+            self.hits += 1
+        return {
+            "question": row[1],
+            "answer": row[2],
+            "keywords": json.loads(row[3]),
+            "documents": [Document(page_content=s["page_content"], metadata=s["metadata"]) for s in json.loads(row[4])],
+            "similarity": similarity,
+        }
+
+    def store(
+        self,
+        scope: str,
+        index_key: str,
+        answer_language: str,
+        question: str,
+        embedding: List[float],
+        answer: str,
+        keywords: List[str],
+        documents: List[Document],
+    ):
+        """Stores a final answer with its (translated) question embedding."""
+        vector = _normalize(embedding)
+        sources = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents]
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO answer_cache (scope, index_key, answer_language, question, embedding, answer, keywords, sources, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (scope, index_key, answer_language, question, vector.tobytes(), answer,
+                 json.dumps(keywords, ensure_ascii=False), json.dumps(sources, ensure_ascii=False), time.time()),
+            )
+            # 인덱스별 최대 개수를 넘으면 가장 오래 쓰이지 않은 항목부터 제거합니다.
+            evicted = self._conn.execute(
+                """
+                DELETE FROM answer_cache WHERE id IN (
+                    SELECT id FROM answer_cache WHERE index_key = ?
+                    ORDER BY COALESCE(last_hit_at, created_at) DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (index_key, self.max_entries_per_index),
+            ).rowcount
+            self._conn.commit()
+
+            key = (index_key, answer_language)
+            if evicted:
+                self._vectors.pop(key, None)
+            elif key in self._vectors:
+                ids, matrix = self._vectors[key]
+                matrix = np.vstack([matrix, vector]) if len(ids) else vector.reshape(1, -1)
+                self._vectors[key] = (np.append(ids, cursor.lastrowid), matrix)
+
+    def invalidate_stale(self, scope: str, index_key: str) -> int:
+        """Deletes the answers of a scope (graph configuration + shard paths) built from another version of its index."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM answer_cache WHERE scope = ? AND index_key != ?", (scope, index_key)
+            ).rowcount
+            self._conn.commit()
+            if deleted:
+                print(f"답변 캐시: 인덱스가 바뀌어 이전 답변 {deleted}개를 삭제했습니다.")
+                self._vectors = {key: value for key, value in self._vectors.items() if key[0] == index_key}
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, indexes = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT index_key) FROM answer_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "indexes": indexes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "similarity_threshold": self.similarity_threshold,
+        }
+
+@lru_cache(maxsize=None)
+def get_answer_cache() -> SemanticAnswerCache:
+    """Returns the process-wide answer cache shared by every session and API request."""
+    return SemanticAnswerCache()
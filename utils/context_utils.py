@@ -0,0 +1,137 @@
+"""
+답변 생성 프롬프트에 넣을 문맥(context)을 만드는 유틸리티 파일입니다.
+
+긴 문단의 청크는 최대 200자씩 겹치도록 분할되므로, 이웃한 청크를 그대로 이어 붙이면 같은 문장이
+프롬프트에 두 번 들어갑니다. 이 파일은 같은 작품의 겹치거나 맞닿은 청크를 본문 위치(start/end offset)로
+하나의 구절로 합치고, 중복을 제거한 뒤 관련도 순서로 정렬하여, tiktoken으로 센 토큰 예산
+안에 들어가도록 잘라냅니다. 프롬프트 토큰은 답변 생성 비용과 지연 시간의 대부분을 차지합니다.
+"""
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.documents import Document
+
+from utils.tracing_utils import estimate_tokens, record_context
+
+# 답변 생성 프롬프트의 문맥에 사용할 최대 토큰 수
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# 문단 경계에서 나뉜 청크 사이에는 구분자(공백, 줄바꿈)만 남으므로 이 정도 간격은 이어진 것으로 봅니다.
+ADJACENT_GAP_CHARS = 3
+# 예산 끝에서 잘라낸 구절이 이보다 짧으면 넣지 않습니다.
+MIN_PARTIAL_PASSAGE_TOKENS = 50
+PASSAGE_SEPARATOR = "\n\n"
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str) -> Optional[Any]:
+    """Returns the tiktoken encoding of a model, or None if it cannot be loaded (e.g. offline)."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"tiktoken 인코딩을 불러오지 못해 토큰 수를 추정합니다: {e}")
+        return None
+
+def get_token_counter(model: str) -> Callable[[str], int]:
+    tokenizer = get_tokenizer(model)
+    if tokenizer is None:
+        return estimate_tokens
+    return lambda text: len(tokenizer.encode(text))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cuts text to at most max_tokens tokens."""
+    tokenizer = get_tokenizer(model)
+    if tokenizer is None:
+        # 추정치가 예산 안에 들어올 때까지 글자 수 비율만큼 줄여 나갑니다.
+        while text and estimate_tokens(text) > max_tokens:
+            text = text[:min(len(text) - 1, int(len(text) * max_tokens / estimate_tokens(text)))]
+        return text
+    return tokenizer.decode(tokenizer.encode(text)[:max_tokens])
+
+def _source_span(doc: Document):
+    """Returns (source, start, end) for a chunk, or None if its position in the body is unknown."""
+    metadata = doc.metadata
+    source = metadata.get("literature_id", metadata.get("title", metadata.get("source")))
+    start = metadata.get("start_index")
+    if source is None or start is None:
+        return None
+    return source, start, metadata.get("end_index", start + len(doc.page_content))
+
+def merge_passages(documents: List[Document]) -> List[Dict[str, Any]]:
+    """
+    Merges overlapping or adjacent chunks of the same book and drops duplicates.
+
+    Args:
+        documents: Chunks in relevance order (most relevant first).
+
+    Returns:
+        Passages ({'text', 'rank', 'chunks'}) ordered by the best relevance rank among their chunks.
+    """
+    passages, seen_texts = [], set()
+    spans_by_source: Dict[Any, List[tuple]] = {}
+    for rank, doc in enumerate(documents):
+        span = _source_span(doc)
+        if span is None:
+            if doc.page_content not in seen_texts:
+                seen_texts.add(doc.page_content)
+                passages.append({"text": doc.page_content, "rank": rank, "chunks": 1})
+            continue
+        source, start, end = span
+        spans_by_source.setdefault(source, []).append((start, end, rank, doc.page_content))
+
+    for spans in spans_by_source.values():
+        spans.sort()
+        current = None
+        for start, end, rank, text in spans:
+            if current and 0 < start - current["end"] <= ADJACENT_GAP_CHARS:
+                current["text"] += "\n" + text
+                current["end"] = end
+                current["rank"] = min(current["rank"], rank)
+                current["chunks"] += 1
+                continue
+            if current and start <= current["end"]:
+                overlap = current["end"] - start
+                # 위치 정보와 실제 본문이 맞는 경우에만 겹치는 부분을 잘라내고 이어 붙입니다.
+                if end <= current["end"] or current["text"].endswith(text[:overlap]):
+                    if end > current["end"]:
+                        current["text"] += text[overlap:]
+                        current["end"] = end
+                    current["rank"] = min(current["rank"], rank)
+                    current["chunks"] += 1
+                    continue
+            current = {"text": text, "start": start, "end": end, "rank": rank, "chunks": 1}
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage["rank"])
+    return [{"text": p["text"], "rank": p["rank"], "chunks": p["chunks"]} for p in passages]
+
+def build_context(documents: List[Document], model: str, token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Builds the generation context from graded chunks: merged, deduplicated, ordered by
+    relevance and trimmed to token_budget tokens (counted with the model's tiktoken encoding).
+    """
+    count_tokens = get_token_counter(model)
+    separator_tokens = count_tokens(PASSAGE_SEPARATOR)
+    passages = merge_passages(documents)
+
+    selected, used_tokens, truncated = [], 0, False
+    for passage in passages:
+        cost = count_tokens(passage["text"]) + (separator_tokens if selected else 0)
+        if used_tokens + cost <= token_budget:
+            selected.append(passage["text"])
+            used_tokens += cost
+            continue
+        # 예산이 남아 있으면 다음 구절의 앞부분만 넣고 멈춥니다.
+        remaining = token_budget - used_tokens - (separator_tokens if selected else 0)
+        if remaining >= MIN_PARTIAL_PASSAGE_TOKENS or not selected:
+            partial = truncate_to_tokens(passage["text"], max(0, remaining), model)
+            selected.append(partial)
+            used_tokens += count_tokens(partial) + (separator_tokens if len(selected) > 1 else 0)
+        truncated = True
+        break
+
+    # 요청마다 로그를 남기지 않고, 추적 중인 요청에만 구절 수와 토큰 수를 기록합니다 (어드민 페이지에서 확인).
+    record_context(len(documents), len(passages), len(selected), used_tokens, token_budget, truncated)
+    return PASSAGE_SEPARATOR.join(selected)
@@ -11,6 +11,8 @@ from contextlib import contextmanager
 
 # Define the path to the database relative to the project root
 DB_PATH = Path(__file__).parent.parent / "data" / "literature.db"
+# init_chunks_schema()를 이미 실행한 데이터베이스 경로
+_chunks_schema_ready = set()
 
 @contextmanager
 def get_db_connection():
@@ -35,13 +37,13 @@ def get_all_literatures() -> List[Dict[str, Any]]:
 
 def get_literature_details_by_titles(titles: List[str]) -> List[Dict[str, str]]:
     """
-    Retrieves the body and language for a given list of literature titles.
+    Retrieves the id, title, body and language for a given list of literature titles.
     
     Args:
         titles: A list of literature titles to fetch.
         
     Returns:
-        A list of dictionaries, each containing 'body' and 'language'.
+        A list of dictionaries, each containing 'id', 'title', 'body' and 'language'.
     """
     if not titles:
         return []
@@ -49,8 +51,234 @@ def get_literature_details_by_titles(titles: List[str]) -> List[Dict[str, str]]:
     with get_db_connection() as conn:
         cursor = conn.cursor()
         placeholders = ', '.join('?' for _ in titles)
-        query = f"SELECT body, language FROM literature WHERE title IN ({placeholders})"
+        query = f"SELECT id, title, body, language FROM literature WHERE title IN ({placeholders})"
         cursor.execute(query, titles)
         details = [dict(row) for row in cursor.fetchall()]
     
     return details
+
+def get_literatures_by_titles(titles: List[str]) -> List[Dict[str, Any]]:
+    """
+    Retrieves the metadata (without the body) for a given list of literature titles.
+
+    Returns:
+        A list of dictionaries, each containing 'id', 'title' and 'language'.
+    """
+    if not titles:
+        return []
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        placeholders = ', '.join('?' for _ in titles)
+        query = f"SELECT id, title, language FROM literature WHERE title IN ({placeholders})"
+        cursor.execute(query, titles)
+        literatures = [dict(row) for row in cursor.fetchall()]
+
+    return literatures
+
+def get_literature_body(literature_id: int) -> str:
+    """Retrieves the full body of a single literature."""
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT body FROM literature WHERE id = ?", (literature_id,)).fetchone()
+    return row["body"] if row else ""
+
+def ensure_chunks_table(conn: sqlite3.Connection):
+    """
+    Ensures the 'chunks' table exists.
+    Each row is one chunk of a literature body for a given set of chunking parameters,
+    with its character offsets into the body.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS chunks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        literature_id INTEGER NOT NULL REFERENCES literature(id) ON DELETE CASCADE,
+        chunk_size INTEGER NOT NULL,
+        chunk_overlap INTEGER NOT NULL,
+        ordinal INTEGER NOT NULL,
+        start_offset INTEGER NOT NULL,
+        end_offset INTEGER NOT NULL,
+        chunk_hash TEXT NOT NULL,
+        content TEXT NOT NULL
+    )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chunks_literature ON chunks(literature_id, chunk_size, chunk_overlap, ordinal)"
+    )
+    ensure_chunks_fts(conn)
+
+def init_chunks_schema():
+    """
+    Creates the 'chunks' table and its FTS index if they are missing (once per database per process).
+    Called at startup by the app, the API server and the scripts, so that chunk reads never run DDL.
+    """
+    if DB_PATH in _chunks_schema_ready:
+        return
+    with get_db_connection() as conn:
+        ensure_chunks_table(conn)
+        conn.commit()
+    _chunks_schema_ready.add(DB_PATH)
+
+def ensure_chunks_fts(conn: sqlite3.Connection):
+    """
+    Ensures the FTS5 (BM25) index over chunk contents exists.
+    The index is an external-content table kept in sync with 'chunks' by triggers.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'").fetchone()
+    if exists:
+        return
+    conn.execute("""
+    CREATE VIRTUAL TABLE chunks_fts USING fts5(
+        content, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """)
+    conn.executescript("""
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE OF content ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+    END;
+    """)
+    # 이미 저장되어 있던 청크도 색인합니다.
+    conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+    conn.commit()
+
+def save_chunks(conn: sqlite3.Connection, literature_id: int, chunks: List[Dict[str, Any]], chunk_size: int, chunk_overlap: int):
+    """
+    Replaces the stored chunks of a literature for the given chunking parameters.
+
+    Chunks whose text did not change keep their row id (only ordinal and offsets are updated),
+    so ids stay stable across re-ingestion and can be used as vector store document ids.
+
+    Args:
+        conn: An open connection; the caller is responsible for committing.
+        chunks: Dicts with 'ordinal', 'start_offset', 'end_offset', 'chunk_hash' and 'content'.
+    """
+    ensure_chunks_table(conn)
+    existing_ids: Dict[str, List[int]] = {}
+    rows = conn.execute(
+        "SELECT id, chunk_hash FROM chunks WHERE literature_id = ? AND chunk_size = ? AND chunk_overlap = ? ORDER BY ordinal",
+        (literature_id, chunk_size, chunk_overlap),
+    )
+    for chunk_id, chunk_hash in rows:
+        existing_ids.setdefault(chunk_hash, []).append(chunk_id)
+
+    for chunk in chunks:
+        reusable_ids = existing_ids.get(chunk["chunk_hash"])
+        if reusable_ids:
+            conn.execute(
+                "UPDATE chunks SET ordinal = ?, start_offset = ?, end_offset = ? WHERE id = ?",
+                (chunk["ordinal"], chunk["start_offset"], chunk["end_offset"], reusable_ids.pop(0)),
+            )
+        else:
+            conn.execute(
+                """
+                INSERT INTO chunks (literature_id, chunk_size, chunk_overlap, ordinal, start_offset, end_offset, chunk_hash, content)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (literature_id, chunk_size, chunk_overlap, chunk["ordinal"], chunk["start_offset"],
+                 chunk["end_offset"], chunk["chunk_hash"], chunk["content"]),
+            )
+
+    stale_ids = [chunk_id for ids in existing_ids.values() for chunk_id in ids]
+    conn.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in stale_ids])
+
+def get_chunks(literature_id: int, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """
+    Retrieves the stored chunks of a literature in order.
+
+    Returns:
+        A list of dictionaries with 'id', 'ordinal', 'start_offset', 'end_offset',
+        'chunk_hash' and 'content'. Empty if the literature has not been chunked yet.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.execute(
+            """
+            SELECT id, ordinal, start_offset, end_offset, chunk_hash, content FROM chunks
+            WHERE literature_id = ? AND chunk_size = ? AND chunk_overlap = ?
+            ORDER BY ordinal
+            """,
+            (literature_id, chunk_size, chunk_overlap),
+        )
+        chunks = [dict(row) for row in cursor.fetchall()]
+    return chunks
+
+def get_chunk_hashes(literature_id: int, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """
+    Retrieves the id and content hash of the stored chunks of a literature in order, without their text
+    (enough to tell whether a saved index still matches the chunks).
+
+    Returns:
+        A list of dictionaries with 'id' and 'chunk_hash'. Empty if the literature has not been chunked yet.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.execute(
+            """
+            SELECT id, chunk_hash FROM chunks
+            WHERE literature_id = ? AND chunk_size = ? AND chunk_overlap = ?
+            ORDER BY ordinal
+            """,
+            (literature_id, chunk_size, chunk_overlap),
+        )
+        chunks = [dict(row) for row in cursor.fetchall()]
+    return chunks
+
+def get_chunks_by_ids(chunk_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Retrieves stored chunks by primary key (used to fetch only the top-k hits of a vector search).
+
+    Returns:
+        A dictionary mapping chunk id to its row ('id', 'literature_id', 'ordinal',
+        'start_offset', 'end_offset', 'content'). Unknown ids are omitted.
+    """
+    if not chunk_ids:
+        return {}
+    with get_db_connection() as conn:
+        placeholders = ', '.join('?' for _ in chunk_ids)
+        cursor = conn.execute(
+            f"SELECT id, literature_id, ordinal, start_offset, end_offset, content FROM chunks WHERE id IN ({placeholders})",
+            list(chunk_ids),
+        )
+        chunks = {row["id"]: dict(row) for row in cursor.fetchall()}
+    return chunks
+
+def search_chunks_fts(
+    match_query: str,
+    literature_ids: List[int],
+    chunk_size: int,
+    chunk_overlap: int,
+    k: int = 4,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Runs a BM25-ranked full-text search over the chunks of the given literatures.
+
+    Args:
+        match_query: An FTS5 MATCH expression.
+        offset: Number of top-ranked rows to skip (for paging through results).
+
+    Returns:
+        Chunk rows ordered by relevance, each with an additional 'bm25' score (lower is better).
+    """
+    if not match_query or not literature_ids:
+        return []
+
+    with get_db_connection() as conn:
+        placeholders = ', '.join('?' for _ in literature_ids)
+        cursor = conn.execute(
+            f"""
+            SELECT c.id, c.literature_id, c.ordinal, c.start_offset, c.end_offset, c.chunk_hash, c.content,
+                   bm25(chunks_fts) AS bm25
+            FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid
+            WHERE chunks_fts MATCH ? AND c.literature_id IN ({placeholders})
+              AND c.chunk_size = ? AND c.chunk_overlap = ?
+            ORDER BY bm25 LIMIT ? OFFSET ?
+            """,
+            [match_query, *literature_ids, chunk_size, chunk_overlap, k, offset],
+        )
+        chunks = [dict(row) for row in cursor.fetchall()]
+    return chunks
@@ -0,0 +1,221 @@
+"""
+임베딩 결과를 로컬 SQLite 파일에 캐싱하는 유틸리티 파일입니다.
+
+임베딩 모델 이름과 청크 텍스트의 해시를 키로 사용하므로, 인덱스 이름이나
+청크 구성이 바뀌거나 'faiss_literature' 디렉토리가 삭제되어도 이미 임베딩한
+텍스트는 다시 API를 호출하지 않고 재사용합니다.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+
+from utils.tracing_utils import record_embedding_call
+
+# literature.db 옆에 별도의 캐시 파일을 둡니다.
+EMBEDDING_CACHE_DB_PATH = Path(__file__).parent.parent / "data" / "embedding_cache.db"
+
+# SQLite의 바인딩 변수 개수 제한을 넘지 않도록 조회/갱신을 나눠서 수행합니다.
+_SQL_BATCH_SIZE = 500
+
+@contextmanager
+def get_cache_connection(db_path: Path = EMBEDDING_CACHE_DB_PATH):
+    """Provides a connection to the embedding cache, creating the table if needed."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            PRIMARY KEY (model, text_hash)
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used_at)")
+        yield conn
+    finally:
+        conn.close()
+
+def hash_text(text: str) -> str:
+    """Returns the content hash used as the cache key for a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _encode_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def _decode_vector(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+class CachedEmbeddings(Embeddings):
+    """
+    다른 Embeddings 객체 앞에 놓이는 영구 캐시입니다.
+
+    캐시에 없는 텍스트만 모아서 한 번에 원래 모델로 임베딩하고,
+    결과를 일괄적으로 캐시에 기록합니다.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, db_path: Path = EMBEDDING_CACHE_DB_PATH):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        # 인덱스 생성 시 여러 배치가 스레드 풀에서 동시에 임베딩되므로 카운터 갱신을 보호합니다.
+        self._lock = threading.Lock()
+
+    def _count(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _lookup(self, conn: sqlite3.Connection, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        for start in range(0, len(hashes), _SQL_BATCH_SIZE):
+            batch = hashes[start:start + _SQL_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embedding_cache WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name, *batch],
+            ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = _decode_vector(blob)
+        return found
+
+    def _touch(self, conn: sqlite3.Connection, hashes: List[str], now: float):
+        for start in range(0, len(hashes), _SQL_BATCH_SIZE):
+            batch = hashes[start:start + _SQL_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            conn.execute(
+                f"UPDATE embedding_cache SET last_used_at = ? WHERE model = ? AND text_hash IN ({placeholders})",
+                [now, self.model_name, *batch],
+            )
+
+    def uncached_texts(self, texts: List[str]) -> List[str]:
+        """Returns the distinct texts that are not in the cache yet (what embed_documents would send to the model)."""
+        missing = {}
+        for text in texts:
+            missing.setdefault(hash_text(text), text)
+        with get_cache_connection(self.db_path) as conn:
+            cached = self._lookup(conn, list(missing))
+        return [text for text_hash, text in missing.items() if text_hash not in cached]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        hashes = [hash_text(text) for text in texts]
+        with get_cache_connection(self.db_path) as conn:
+            cached = self._lookup(conn, list(set(hashes)))
+
+            # 같은 텍스트가 여러 번 들어와도 한 번만 임베딩합니다.
+            missing = {}
+            for text, text_hash in zip(texts, hashes):
+                if text_hash not in cached and text_hash not in missing:
+                    missing[text_hash] = text
+            hit_count = sum(1 for h in hashes if h in cached)
+            self._count(hit_count, len(missing))
+
+            now = time.time()
+            if missing:
+                print(f"임베딩 캐시: {hit_count}개 적중, {len(missing)}개 새로 임베딩합니다.")
+                new_vectors = self.underlying.embed_documents(list(missing.values()))
+                rows = []
+                for text_hash, vector in zip(missing.keys(), new_vectors):
+                    cached[text_hash] = vector
+                    rows.append((self.model_name, text_hash, _encode_vector(vector), now, now))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (model, text_hash, vector, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self._touch(conn, [h for h in set(hashes) if h not in missing], now)
+            conn.commit()
+
+        record_embedding_call(self.model_name, texts, list(missing.values()), time.perf_counter() - started)
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        text_hash = hash_text(text)
+        with get_cache_connection(self.db_path) as conn:
+            cached = self._lookup(conn, [text_hash])
+            now = time.time()
+            if text_hash in cached:
+                self._count(1, 0)
+                self._touch(conn, [text_hash], now)
+                conn.commit()
+                record_embedding_call(self.model_name, [text], [], time.perf_counter() - started)
+                return cached[text_hash]
+
+            self._count(0, 1)
+            vector = self.underlying.embed_query(text)
+            conn.execute(
+                "INSERT OR REPLACE INTO embedding_cache (model, text_hash, vector, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (self.model_name, text_hash, _encode_vector(vector), now, now),
+            )
+            conn.commit()
+        record_embedding_call(self.model_name, [text], [text], time.perf_counter() - started)
+        return vector
+
+def get_embedding_cache_stats(db_path: Path = EMBEDDING_CACHE_DB_PATH) -> Dict[str, Any]:
+    """
+    Reports the size of the embedding cache.
+
+    Returns:
+        A dictionary with the total entry count, the stored vector bytes,
+        the file size on disk and a per-model breakdown.
+    """
+    with get_cache_connection(db_path) as conn:
+        rows = conn.execute(
+            "SELECT model, COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embedding_cache GROUP BY model ORDER BY model"
+        ).fetchall()
+    models = [{"model": model, "entries": entries, "vector_bytes": size} for model, entries, size in rows]
+    file_bytes = sum(p.stat().st_size for p in db_path.parent.glob(db_path.name + "*") if p.is_file())
+    return {
+        "entries": sum(m["entries"] for m in models),
+        "vector_bytes": sum(m["vector_bytes"] for m in models),
+        "file_bytes": file_bytes,
+        "models": models,
+    }
+
+def evict_embedding_cache(
+    max_entries: Optional[int] = None,
+    max_age_days: Optional[float] = None,
+    db_path: Path = EMBEDDING_CACHE_DB_PATH,
+) -> int:
+    """
+    Evicts entries from the embedding cache.
+
+    Args:
+        max_entries: Keep at most this many entries, dropping the least recently used first.
+        max_age_days: Drop entries that have not been used for this many days.
+
+    Returns:
+        The number of deleted entries.
+    """
+    deleted = 0
+    with get_cache_connection(db_path) as conn:
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            deleted += conn.execute("DELETE FROM embedding_cache WHERE last_used_at < ?", (cutoff,)).rowcount
+        if max_entries is not None:
+            deleted += conn.execute(
+                """
+                DELETE FROM embedding_cache WHERE rowid IN (
+                    SELECT rowid FROM embedding_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (max_entries,),
+            ).rowcount
+        conn.commit()
+        if deleted:
+            conn.execute("VACUUM")
+    return deleted
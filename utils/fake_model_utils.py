@@ -0,0 +1,166 @@
+"""
+OpenAI API 없이 파이프라인을 실행하기 위한 결정적인(deterministic) 가짜 모델을 제공하는 파일입니다.
+
+API 키가 없는 CI나 외부망이 막힌 환경에서도 create_graph를 처음부터 끝까지 실행하고
+성능을 측정할 수 있도록, graph_utils의 프롬프트를 알아보고 형식에 맞는 응답을 돌려주는
+채팅 모델과 해시 기반 임베딩 모델을 제공합니다. 두 모델 모두 네트워크 지연을 흉내 내는
+인위적인 지연 시간(latency)을 설정할 수 있습니다.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from typing import Any, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD_PATTERN = re.compile(r"\w+")
+_STOPWORDS = {"the", "a", "an", "is", "are", "was", "were", "who", "what", "how", "why", "of", "in", "to", "and", "does", "do"}
+
+def _content_words(text: str) -> set:
+    return {word for word in _WORD_PATTERN.findall(text.lower()) if len(word) > 2 and word not in _STOPWORDS}
+
+def _section(text: str, start: str, end: Optional[str] = None) -> str:
+    """
+    Returns the part of a rendered prompt between two markers.
+    Without an end marker, the text after the last start marker is returned
+    (chunk texts may themselves contain words like 'Question:').
+    """
+    if start not in text:
+        return ""
+    if end is None:
+        return text.rsplit(start, 1)[1].strip()
+    section = text.split(start, 1)[1]
+    if end in section:
+        section = section.rsplit(end, 1)[0]
+    return section.strip()
+
+class FakeChatModel(BaseChatModel):
+    """
+    graph_utils의 프롬프트에 형식이 맞는 응답을 결정적으로 돌려주는 채팅 모델입니다.
+
+    - 문서 평가: 질문과 문서가 내용어(content word)를 공유하면 'yes'
+    - 답변 생성: 문맥의 첫 문장과 문맥에서 찾은 질문 키워드로 JSON 답변 생성
+    - 번역: 입력 앞에 '[en]' 또는 '[ko]'를 붙여 그대로 반환
+    응답마다 단어 수로 추정한 토큰 사용량(usage_metadata)을 함께 기록합니다.
+    """
+
+    model_name: str = "fake-chat"
+    latency_seconds: float = 0.0
+    stream_chunk_size: int = 8
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    def _respond(self, prompt: str) -> str:
+        if "question router" in prompt:
+            question = _section(prompt, "Question:")
+            language = "ko" if re.search(r"[가-힣]", question) else "en"
+            translated_question = f"[en] {question}" if language == "ko" else question
+            return json.dumps(
+                {"language": language, "translated_question": translated_question, "question_type": "novel_related"},
+                ensure_ascii=False,
+            )
+        if "routing a user question" in prompt:
+            return json.dumps({"question_type": "novel_related"})
+        if "assessing relevance of retrieved documents" in prompt:
+            question_words = _content_words(_section(prompt, "Question:"))
+            documents = re.split(r"^\s*\[(\d+)\]\s", _section(prompt, "Documents:", "Question:"), flags=re.M)
+            grades = [
+                {"index": int(index), "score": "yes" if question_words & _content_words(body) else "no"}
+                for index, body in zip(documents[1::2], documents[2::2])
+            ]
+            return json.dumps({"grades": grades})
+        if "assessing relevance of a retrieved document" in prompt:
+            question_words = _content_words(_section(prompt, "Question:"))
+            document_words = _content_words(_section(prompt, "Document:", "Question:"))
+            return json.dumps({"score": "yes" if question_words & document_words else "no"})
+        if "question-answering tasks" in prompt:
+            context = _section(prompt, "Context:", "Question:")
+            question_words = _content_words(_section(prompt, "Question:"))
+            keywords = sorted(word for word in question_words if word in context.lower())[:5]
+            first_sentence = re.split(r"(?<=[.!?])\s", context.strip(), maxsplit=1)[0][:300]
+            return json.dumps({"answer": first_sentence, "keywords": keywords}, ensure_ascii=False)
+        if "based on the context" in prompt:
+            return _section(prompt, "Context:", "Question:")[:300]
+        if "Translate the following English text to Korean:" in prompt:
+            return "[ko] " + _section(prompt, "Translate the following English text to Korean:")
+        return "This is a deterministic answer from the offline benchmark model."
+
+    def _usage(self, prompt: str, text: str) -> dict:
+        input_tokens, output_tokens = len(prompt.split()), len(text.split())
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _make_message(self, prompt: str, text: str) -> AIMessage:
+        return AIMessage(content=text, usage_metadata=self._usage(prompt, text))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_seconds)
+        prompt = messages[-1].content
+        return ChatResult(generations=[ChatGeneration(message=self._make_message(prompt, self._respond(prompt)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_seconds)
+        prompt = messages[-1].content
+        return ChatResult(generations=[ChatGeneration(message=self._make_message(prompt, self._respond(prompt)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        # 첫 토큰까지의 지연을 흉내 낸 뒤 응답을 조각내어 내보냅니다.
+        time.sleep(self.latency_seconds)
+        prompt = messages[-1].content
+        text = self._respond(prompt)
+        for start in range(0, len(text), self.stream_chunk_size):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text[start:start + self.stream_chunk_size]))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        # OpenAI의 stream_usage처럼 마지막 조각에 토큰 사용량을 담아 보냅니다.
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, text)))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self.latency_seconds)
+        prompt = messages[-1].content
+        text = self._respond(prompt)
+        for start in range(0, len(text), self.stream_chunk_size):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text[start:start + self.stream_chunk_size]))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, text)))
+
+class FakeEmbeddings(Embeddings):
+    """
+    단어를 해시하여 고정 차원에 누적한 뒤 정규화하는 결정적인 임베딩 모델입니다.
+    같은 단어를 공유하는 텍스트끼리 가까워지므로 검색 결과도 의미 있게 나옵니다.
+    """
+
+    def __init__(self, size: int = 256, latency_seconds: float = 0.0, latency_per_text_seconds: float = 0.0):
+        self.size = size
+        self.latency_seconds = latency_seconds
+        self.latency_per_text_seconds = latency_per_text_seconds
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in _WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.size
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_seconds + self.latency_per_text_seconds * len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_seconds)
+        return self._embed(text)
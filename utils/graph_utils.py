@@ -1,17 +1,30 @@
 """
 LangGraph를 사용하여 RAG 파이프라인을 그래프로 구성하고 실행하는 파일입니다.
 
-입력 질문 번역, 질문 라우팅, 문서 검색, 품질 평가, 답변 생성, 최종 답변 번역의
+입력 질문 분석(언어 감지/번역/라우팅), 문서 검색, 품질 평가, 답변 생성, 최종 답변 번역의
 과정을 체계적으로 관리하는 다국어 처리 RAG 워크플로우를 정의합니다.
+프롬프트, 파서, 체인과 LLM 클라이언트는 프로세스당 한 번만 만들어 모든 노드 호출과
+세션이 공유합니다.
 """
-from typing import List, TypedDict
+import asyncio
+import os
+import threading
+from functools import lru_cache
+from typing import Any, List, Optional, TypedDict
+import httpx
 from langchain_core.documents import Document
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser, PydanticOutputParser
+from langchain_core.utils.json import parse_partial_json
 from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END
 
+from utils.answer_cache_utils import SemanticAnswerCache
+from utils.context_utils import build_context
+from utils.retriever_utils import HybridRetriever, chunk_key
+
 # --- 1. Graph State 정의 ---
 class GraphState(TypedDict):
     question: str
@@ -21,129 +34,471 @@ class GraphState(TypedDict):
     generation: str
     keywords: List[str]
     retries: int
+    query_embedding: Optional[List[float]]
+    seen_chunk_ids: List[Any]
+    generation_language: str
+    answer_cache_hit: bool
 
-# --- 2. Node 함수 정의 ---
-def translate_question(state: GraphState):
-    """입력된 질문의 언어를 감지하고, 한국어일 경우 영어로 번역하는 노드"""
-    print("---노드: 질문 번역---")
-    question = state["question"]
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    prompt = ChatPromptTemplate.from_template(
-        """You are an expert language identifier and translator.
-        Identify the language of the user's question (either 'ko' for Korean or 'en' for English).
-        If the language is Korean, translate the question to English.
-        If the language is English, return the original question.
-        Return a JSON object with two keys: 'language' and 'translated_question'.
-        Question: {question}"""
+# 문서 평가 방식: 문서마다 순차 호출 / 동시 호출 / 한 번의 호출로 일괄 평가
+GRADING_MODES = ("sequential", "concurrent", "single_call")
+GRADING_MAX_CONCURRENCY = 8
+
+def _threshold_from_env(name: str) -> Optional[float]:
+    """Reads an optional threshold; unset, empty or 'none' disables it."""
+    value = os.getenv(name, "").strip()
+    return None if value.lower() in ("", "none") else float(value)
+
+# 코사인 유사도(-1~1, retriever_utils 참고) 기반 평가 생략 기준: 이 값 이상은 LLM 없이 채택,
+# 미만은 LLM 없이 제외합니다. 두 값 사이(애매한 구간)의 문서만 LLM으로 평가합니다.
+# 임베딩 모델마다 관련 문서의 유사도 분포가 다르므로 기본값은 꺼져 있습니다(None).
+# 벡터 검색에서만 찾은 문서에만 적용하며, 어휘 검색(BM25)으로도 찾은 문서는 항상 LLM으로 평가합니다.
+GRADING_ACCEPT_THRESHOLD = _threshold_from_env("GRADING_ACCEPT_THRESHOLD")
+GRADING_REJECT_THRESHOLD = _threshold_from_env("GRADING_REJECT_THRESHOLD")
+
+# 프로세스 전체의 문서 평가 통계 (어드민 페이지에서 확인)
+_grading_stats = {"auto_accepted": 0, "auto_rejected": 0, "llm_graded": 0}
+_grading_stats_lock = threading.Lock()
+
+def get_grading_stats() -> dict:
+    """Returns how many documents were graded by the LLM and how many grading calls were avoided."""
+    with _grading_stats_lock:
+        stats = dict(_grading_stats)
+    stats["llm_grading_avoided"] = stats["auto_accepted"] + stats["auto_rejected"]
+    return stats
+
+class DocumentGrade(BaseModel):
+    index: int = Field(description="The number of the graded document, as given in the list.")
+    score: str = Field(description="'yes' if the document is relevant to the question, otherwise 'no'.")
+
+class DocumentGrades(BaseModel):
+    grades: List[DocumentGrade] = Field(description="One grade for every document in the list.")
+
+class AnswerWithKeywords(BaseModel):
+    answer: str = Field(description="The answer to the user's question.")
+    keywords: List[str] = Field(description="Exact keywords from the context used for the answer.")
+
+# --- 2. LLM 클라이언트, 프롬프트, 체인 (프로세스당 한 번 생성) ---
+LLM_MODEL_NAME = "gpt-4o-mini"
+
+# OpenAI HTTP 연결 풀 설정 (.env로 조정 가능)
+HTTP_MAX_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("OPENAI_HTTP_TIMEOUT_SECONDS", "60"))
+
+ROUTE_PROMPT = ChatPromptTemplate.from_template(
+    """You are an expert at routing a user question.
+    Use 'novel_related' for questions about a novel's content.
+    Use 'general' for all other questions.
+    Return a JSON with a single key 'question_type'.
+    Question: {question}"""
+)
+
+ANALYZE_PROMPT = ChatPromptTemplate.from_template(
+    """You are an expert language identifier, translator and question router.
+    Identify the language of the user's question (either 'ko' for Korean or 'en' for English).
+    If the language is Korean, translate the question to English.
+    If the language is English, return the original question.
+    Then classify the question: use 'novel_related' for questions about a novel's content
+    and 'general' for all other questions.
+    Return a JSON object with three keys: 'language', 'translated_question' and 'question_type'.
+    Question: {question}"""
+)
+
+GRADE_PROMPT = ChatPromptTemplate.from_template(
+    """You are a grader assessing relevance of a retrieved document to a user question.
+    Give a binary score 'yes' or 'no'.
+    Provide the binary score as a JSON with a single key 'score'.
+    Document: {document}
+    Question: {question}"""
+)
+
+GRADES_PARSER = PydanticOutputParser(pydantic_object=DocumentGrades)
+GRADE_ALL_PROMPT = ChatPromptTemplate.from_template(
+    """You are a grader assessing relevance of retrieved documents to a user question.
+    Give every document a binary score 'yes' or 'no'.
+    You must follow the format instructions below.
+
+    {format_instructions}
+
+    Documents:
+    {documents}
+
+    Question: {question}""",
+    partial_variables={"format_instructions": GRADES_PARSER.get_format_instructions()}
+)
+
+ANSWER_PARSER = PydanticOutputParser(pydantic_object=AnswerWithKeywords)
+ANSWER_PROMPT = ChatPromptTemplate.from_template(
+    """You are an assistant for question-answering tasks.
+        Use the following context to answer the question in {answer_language}.
+        You must follow the format instructions below.
+        
+        {format_instructions}
+
+        Context: {context}
+        Question: {question}""",
+    partial_variables={"format_instructions": ANSWER_PARSER.get_format_instructions()}
+)
+
+ANSWER_FALLBACK_PROMPT = ChatPromptTemplate.from_template(
+    "Answer the following question in {answer_language} based on the context.\nContext: {context}\nQuestion: {question}"
+)
+
+GENERAL_PROMPT = ChatPromptTemplate.from_template(
+    "You are a friendly chatbot named 'Novel Bot'. Answer the user's question in {answer_language}.\nQuestion: {question}"
+)
+
+TRANSLATE_ANSWER_PROMPT = ChatPromptTemplate.from_template("Translate the following English text to Korean: {text}")
+
+@lru_cache(maxsize=None)
+def get_http_clients():
+    """모든 ChatOpenAI 인스턴스가 공유하는 keep-alive HTTP 클라이언트(동기, 비동기)를 반환합니다."""
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    return (
+        httpx.Client(limits=limits, timeout=HTTP_TIMEOUT_SECONDS),
+        httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT_SECONDS),
     )
-    chain = prompt | llm | JsonOutputParser()
-    result = chain.invoke({"question": question})
-    print(f"원본 언어: [{result['language']}], 번역된 질문: [{result['translated_question']}]")
-    return {"question": result['translated_question'], "original_language": result['language']}
 
-def route_question(state: GraphState):
-    """질문 라우팅 노드"""
-    print("---노드: 질문 라우팅---")
-    question = state["question"]
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    prompt = ChatPromptTemplate.from_template(
-        """You are an expert at routing a user question.
-        Use 'novel_related' for questions about a novel's content.
-        Use 'general' for all other questions.
-        Return a JSON with a single key 'question_type'.
-        Question: {question}"""
+@lru_cache(maxsize=None)
+def get_llm(model: str = LLM_MODEL_NAME) -> ChatOpenAI:
+    """모델별로 한 번만 만든 ChatOpenAI 클라이언트를 반환합니다."""
+    http_client, http_async_client = get_http_clients()
+    # stream_usage: 스트리밍 응답에서도 토큰 사용량을 받아 추적(tracing_utils)에 기록합니다.
+    return ChatOpenAI(
+        model=model, temperature=0, stream_usage=True, http_client=http_client, http_async_client=http_async_client
     )
-    chain = prompt | llm | JsonOutputParser()
+
+class PipelineChains:
+    """그래프 노드들이 사용하는 체인 묶음입니다. LLM 하나당 한 번만 만들어 재사용합니다."""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.route = ROUTE_PROMPT | llm | JsonOutputParser()
+        self.analyze = ANALYZE_PROMPT | llm | JsonOutputParser()
+        self.grade = GRADE_PROMPT | llm | JsonOutputParser()
+        self.grade_all = GRADE_ALL_PROMPT | llm | GRADES_PARSER
+        self.answer = ANSWER_PROMPT | llm | ANSWER_PARSER
+        self.answer_fallback = ANSWER_FALLBACK_PROMPT | llm | StrOutputParser()
+        self.general = GENERAL_PROMPT | llm | StrOutputParser()
+        self.translate_answer = TRANSLATE_ANSWER_PROMPT | llm | StrOutputParser()
+
+@lru_cache(maxsize=None)
+def get_chains() -> PipelineChains:
+    """프로세스 전체에서 공유하는 기본 체인 묶음을 반환합니다."""
+    return PipelineChains(get_llm())
+
+# --- 3. Node 함수 정의 ---
+# 글자 중 한글 비율이 이 값 이상이면 한국어 질문으로 판단합니다.
+HANGUL_RATIO_THRESHOLD = 0.3
+# 답변 생성 프롬프트에 넣을 언어 이름
+LANGUAGE_NAMES = {"en": "English", "ko": "Korean"}
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """Normalizes stored language codes ('kr' in older rows of literature.db) to 'ko'/'en'."""
+    if language is None:
+        return None
+    language = language.strip().lower()
+    return "ko" if language in ("kr", "kor", "korean") else language
+
+def detect_language(text: str) -> str:
+    """LLM 호출 없이 한글 글자 비율로 질문의 언어('ko' 또는 'en')를 판단합니다."""
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        return "en"
+    hangul = sum(1 for ch in letters if '\uac00' <= ch <= '\ud7a3' or '\u3131' <= ch <= '\u318e')
+    return "ko" if hangul / len(letters) >= HANGUL_RATIO_THRESHOLD else "en"
+
+def _analysis_chain(question: str, chains: PipelineChains, corpus_language: Optional[str]):
+    """Returns (question language, chain to call): routing only, or translation and routing in one call."""
+    language = detect_language(question)
+    if language == "en" or language == corpus_language:
+        # 번역이 필요 없는 질문은 라우팅만 수행합니다.
+        return language, chains.route
+    return language, chains.analyze
+
+def _analysis_update(question: str, language: str, result: dict, translated: bool) -> dict:
+    if not translated:
+        result = {"language": language, "translated_question": question, "question_type": result["question_type"]}
+    # 원문 그대로 검색한 질문은 같은 언어로 답변하여 최종 번역을 생략합니다.
+    generation_language = language if result["translated_question"] == question else "en"
+    print(f"원본 언어: [{result['language']}], 번역된 질문: [{result['translated_question']}], 질문 유형: [{result['question_type']}]")
+    return {
+        "question": result['translated_question'],
+        "original_language": result['language'],
+        "question_type": result['question_type'],
+        "generation_language": generation_language,
+        "retries": 0,
+    }
+
+def analyze_question(state: GraphState, chains: PipelineChains, corpus_language: Optional[str] = None):
+    """
+    질문의 언어 감지, 영어 번역, 질문 유형 분류를 한 번에 처리하는 노드.
+    질문 언어가 작품(corpus) 언어와 같으면 번역하지 않고 그 언어로 검색하고 답변합니다.
+    """
+    print("---노드: 질문 분석 (언어 감지/번역/라우팅)---")
+    question = state["question"]
+    language, chain = _analysis_chain(question, chains, corpus_language)
     result = chain.invoke({"question": question})
-    print(f"질문 유형: [{result['question_type']}]")
-    return {"question_type": result['question_type'], "retries": 0}
+    return _analysis_update(question, language, result, translated=chain is chains.analyze)
 
-def retrieve(state: GraphState, vector_store):
-    """문서 검색 노드"""
-    print(f"---노드: 문서 검색 (시도: {state.get('retries', 0) + 1})---")
+async def aanalyze_question(state: GraphState, chains: PipelineChains, corpus_language: Optional[str] = None):
+    """analyze_question의 비동기 버전"""
+    print("---노드: 질문 분석 (언어 감지/번역/라우팅)---")
     question = state["question"]
-    retriever = vector_store.as_retriever()
-    documents = retriever.invoke(question)
-    return {"documents": documents}
+    language, chain = _analysis_chain(question, chains, corpus_language)
+    result = await chain.ainvoke({"question": question})
+    return _analysis_update(question, language, result, translated=chain is chains.analyze)
 
-def grade_documents(state: GraphState):
-    """검색된 문서 품질 평가 노드"""
-    print("---노드: 문서 품질 평가---")
+def retrieve(state: GraphState, retriever: HybridRetriever):
+    """문서 검색 노드 (재시도 시 이미 평가한 문서를 제외한 다음 후보를 가져옵니다)"""
+    print(f"---노드: 문서 검색 (시도: {state.get('retries', 0) + 1})---")
     question = state["question"]
-    documents = state["documents"]
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    prompt = ChatPromptTemplate.from_template(
-        """You are a grader assessing relevance of a retrieved document to a user question.
-        Give a binary score 'yes' or 'no'.
-        Provide the binary score as a JSON with a single key 'score'.
-        Document: {document}
-        Question: {question}"""
+    seen_chunk_ids = state.get("seen_chunk_ids") or []
+    # 첫 시도에서 계산한 질문 임베딩을 재시도에서도 재사용합니다.
+    documents, query_embedding = retriever.retrieve_page(
+        question, exclude_keys=seen_chunk_ids, query_embedding=state.get("query_embedding")
     )
-    chain = prompt | llm | JsonOutputParser()
-    filtered_docs = [d for d in documents if chain.invoke({"question": question, "document": d.page_content}).get("score", "no").lower() == "yes"]
+    return {
+        "documents": documents,
+        "query_embedding": query_embedding,
+        "seen_chunk_ids": seen_chunk_ids + [chunk_key(doc) for doc in documents],
+    }
+
+async def aretrieve(state: GraphState, retriever: HybridRetriever):
+    """retrieve의 비동기 버전 (질문 임베딩은 비동기로 계산하고, FAISS와 SQLite 검색은 스레드에서 실행합니다)"""
+    if state.get("query_embedding") is None and retriever.mode != "lexical":
+        state = {**state, "query_embedding": await retriever.vector_store.embeddings.aembed_query(state["question"])}
+    return await asyncio.to_thread(retrieve, state, retriever)
+
+def _split_by_similarity(documents: List[Document], accept_threshold: Optional[float], reject_threshold: Optional[float]):
+    """Returns (ids of documents accepted without the LLM, documents to grade with the LLM, count rejected without it)."""
+    accepted_ids, ambiguous_docs = set(), []
+    auto_rejected = 0
+    for doc in documents:
+        # 어휘 검색 순위(bm25)가 있는 문서는 벡터 유사도가 낮아도 관련 있을 수 있으므로 생략하지 않습니다.
+        similarity = doc.metadata.get("similarity") if "bm25" not in doc.metadata else None
+        if similarity is not None and accept_threshold is not None and similarity >= accept_threshold:
+            accepted_ids.add(id(doc))
+        elif similarity is not None and reject_threshold is not None and similarity < reject_threshold:
+            auto_rejected += 1
+        else:
+            ambiguous_docs.append(doc)
+    if len(ambiguous_docs) < len(documents):
+        print(f"유사도 기준으로 {len(accepted_ids)}개 채택, {auto_rejected}개 제외 (LLM 평가 생략)")
+    return accepted_ids, ambiguous_docs, auto_rejected
+
+def _is_relevant(result: dict) -> bool:
+    return result.get("score", "no").lower() == "yes"
+
+def _grading_update(state: GraphState, accepted_ids: set, ambiguous_docs: List[Document], auto_rejected: int, llm_accepted_docs: List[Document]):
+    with _grading_stats_lock:
+        _grading_stats["auto_accepted"] += len(accepted_ids)
+        _grading_stats["auto_rejected"] += auto_rejected
+        _grading_stats["llm_graded"] += len(ambiguous_docs)
+
+    accepted_ids = accepted_ids | {id(doc) for doc in llm_accepted_docs}
+    # 검색 순위를 유지합니다.
+    filtered_docs = [doc for doc in state["documents"] if id(doc) in accepted_ids]
     if not filtered_docs:
         return {"documents": [], "retries": state.get('retries', 0) + 1}
     return {"documents": filtered_docs}
 
-def generate(state: GraphState):
-    """답변 생성 노드 (Pydantic Parser 사용)"""
-    print("---노드: 답변 생성 (Pydantic Parser)---")
+def grade_documents(
+    state: GraphState,
+    chains: PipelineChains,
+    grading_mode: str = "concurrent",
+    max_concurrency: int = GRADING_MAX_CONCURRENCY,
+    accept_threshold: Optional[float] = GRADING_ACCEPT_THRESHOLD,
+    reject_threshold: Optional[float] = GRADING_REJECT_THRESHOLD,
+):
+    """검색된 문서 품질 평가 노드 (유사도가 확실한 문서는 LLM 평가를 생략합니다)"""
+    print(f"---노드: 문서 품질 평가 ({grading_mode})---")
+    question = state["question"]
+    accepted_ids, ambiguous_docs, auto_rejected = _split_by_similarity(state["documents"], accept_threshold, reject_threshold)
+
+    if grading_mode == "single_call":
+        llm_accepted_docs = _grade_documents_in_single_call(chains, question, ambiguous_docs, max_concurrency)
+    elif grading_mode in ("sequential", "concurrent"):
+        inputs = [{"question": question, "document": d.page_content} for d in ambiguous_docs]
+        if grading_mode == "concurrent":
+            # 모든 문서를 동시에 평가하되, 동시 요청 수는 max_concurrency로 제한합니다.
+            results = chains.grade.batch(inputs, config={"max_concurrency": max_concurrency})
+        else:
+            results = [chains.grade.invoke(grading_input) for grading_input in inputs]
+        llm_accepted_docs = [d for d, result in zip(ambiguous_docs, results) if _is_relevant(result)]
+    else:
+        raise ValueError(f"Unknown grading mode '{grading_mode}'. Choose one of {GRADING_MODES}.")
+    return _grading_update(state, accepted_ids, ambiguous_docs, auto_rejected, llm_accepted_docs)
+
+async def agrade_documents(
+    state: GraphState,
+    chains: PipelineChains,
+    grading_mode: str = "concurrent",
+    max_concurrency: int = GRADING_MAX_CONCURRENCY,
+    accept_threshold: Optional[float] = GRADING_ACCEPT_THRESHOLD,
+    reject_threshold: Optional[float] = GRADING_REJECT_THRESHOLD,
+):
+    """grade_documents의 비동기 버전"""
+    print(f"---노드: 문서 품질 평가 ({grading_mode})---")
+    question = state["question"]
+    accepted_ids, ambiguous_docs, auto_rejected = _split_by_similarity(state["documents"], accept_threshold, reject_threshold)
+
+    if grading_mode == "single_call":
+        llm_accepted_docs = await _agrade_documents_in_single_call(chains, question, ambiguous_docs, max_concurrency)
+    elif grading_mode in ("sequential", "concurrent"):
+        inputs = [{"question": question, "document": d.page_content} for d in ambiguous_docs]
+        if grading_mode == "concurrent":
+            results = await chains.grade.abatch(inputs, config={"max_concurrency": max_concurrency})
+        else:
+            results = [await chains.grade.ainvoke(grading_input) for grading_input in inputs]
+        llm_accepted_docs = [d for d, result in zip(ambiguous_docs, results) if _is_relevant(result)]
+    else:
+        raise ValueError(f"Unknown grading mode '{grading_mode}'. Choose one of {GRADING_MODES}.")
+    return _grading_update(state, accepted_ids, ambiguous_docs, auto_rejected, llm_accepted_docs)
+
+def _numbered_documents(documents: List[Document]) -> str:
+    return "\n\n".join(f"[{i}] {doc.page_content}" for i, doc in enumerate(documents))
+
+def _relevant_documents(documents: List[Document], result: DocumentGrades) -> List[Document]:
+    relevant_indexes = {grade.index for grade in result.grades if grade.score.lower() == "yes"}
+    return [doc for i, doc in enumerate(documents) if i in relevant_indexes]
+
+def _grade_documents_in_single_call(
+    chains: PipelineChains, question: str, documents: List[Document], max_concurrency: int = GRADING_MAX_CONCURRENCY,
+) -> List[Document]:
+    """
+    후보 문서 전체를 한 번의 LLM 호출로 평가하고, 관련 있다고 판단된 문서만 반환합니다.
+    구조화된 응답을 파싱하지 못하면 문서별 평가(chains.grade)로 다시 평가합니다.
+    """
+    if not documents:
+        return []
+    try:
+        result = chains.grade_all.invoke({"question": question, "documents": _numbered_documents(documents)})
+        return _relevant_documents(documents, result)
+    except Exception as e:
+        print(f"일괄 평가 파싱 실패: {e}. 문서 {len(documents)}개를 하나씩 다시 평가합니다.")
+    inputs = [{"question": question, "document": d.page_content} for d in documents]
+    results = chains.grade.batch(inputs, config={"max_concurrency": max_concurrency})
+    return [d for d, result in zip(documents, results) if _is_relevant(result)]
+
+async def _agrade_documents_in_single_call(
+    chains: PipelineChains, question: str, documents: List[Document], max_concurrency: int = GRADING_MAX_CONCURRENCY,
+) -> List[Document]:
+    if not documents:
+        return []
+    try:
+        result = await chains.grade_all.ainvoke({"question": question, "documents": _numbered_documents(documents)})
+        return _relevant_documents(documents, result)
+    except Exception as e:
+        print(f"일괄 평가 파싱 실패: {e}. 문서 {len(documents)}개를 하나씩 다시 평가합니다.")
+    inputs = [{"question": question, "document": d.page_content} for d in documents]
+    results = await chains.grade.abatch(inputs, config={"max_concurrency": max_concurrency})
+    return [d for d, result in zip(documents, results) if _is_relevant(result)]
+
+# 관련 문서를 찾지 못했을 때의 답변
+NO_DOCUMENTS_ANSWERS = {
+    "en": "I couldn't find relevant information in the novel.",
+    "ko": "소설에서 관련된 내용을 찾지 못했습니다.",
+}
+
+def _generation_request(state: GraphState):
+    """
+    Returns what generate has to do: ('answer', inputs) for a grounded answer, ('general', inputs)
+    for small talk, or ('fixed', answer) when no relevant document was found.
+    """
     question = state["question"]
     documents = state.get("documents", [])
-    question_type = state["question_type"]
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    generation_language = state.get("generation_language", "en")
+    answer_language = LANGUAGE_NAMES.get(generation_language, "English")
 
-    # Pydantic 모델 정의
-    class AnswerWithKeywords(BaseModel):
-        answer: str = Field(description="The answer to the user's question.")
-        keywords: List[str] = Field(description="Exact keywords from the context used for the answer.")
+    if state["question_type"] == 'novel_related' and documents:
+        # 겹치는 청크를 합치고 토큰 예산 안으로 줄인 문맥을 한 번만 만들어 두 프롬프트가 함께 사용합니다.
+        context = build_context(documents, LLM_MODEL_NAME)
+        return "answer", {"context": context, "question": question, "answer_language": answer_language}
+    if state["question_type"] == 'novel_related':
+        return "fixed", NO_DOCUMENTS_ANSWERS.get(generation_language, NO_DOCUMENTS_ANSWERS["en"])
+    return "general", {"question": question, "answer_language": answer_language}
 
-    if question_type == 'novel_related' and documents:
-        parser = PydanticOutputParser(pydantic_object=AnswerWithKeywords)
-        
-        prompt_template = """You are an assistant for question-answering tasks.
-            Use the following context to answer the question in English.
-            You must follow the format instructions below.
-            
-            {format_instructions}
-
-            Context: {context}
-            Question: {question}"""
-        
-        prompt = ChatPromptTemplate.from_template(
-            prompt_template,
-            partial_variables={"format_instructions": parser.get_format_instructions()}
-        )
-        
-        chain = prompt | llm | parser
-        
+def generate(state: GraphState, chains: PipelineChains):
+    """답변 생성 노드 (Pydantic Parser 사용)"""
+    print("---노드: 답변 생성 (Pydantic Parser)---")
+    kind, request = _generation_request(state)
+    keywords = []
+    if kind == "answer":
         try:
-            result = chain.invoke({
-                "context": "\n\n".join(doc.page_content for doc in documents),
-                "question": question
-            })
-            generation = result.answer
-            keywords = result.keywords
+            result = chains.answer.invoke(request)
+            generation, keywords = result.answer, result.keywords
         except Exception as e:
             print(f"Pydantic 파싱 실패: {e}. 답변만 생성하도록 재시도합니다.")
-            prompt_template_fallback = "Answer the following question in English based on the context.\nContext: {context}\nQuestion: {question}"
-            chain_fallback = ChatPromptTemplate.from_template(prompt_template_fallback) | llm | StrOutputParser()
-            generation = chain_fallback.invoke({"context": "\n\n".join(doc.page_content for doc in documents), "question": question})
-            keywords = []
+            generation = chains.answer_fallback.invoke(request)
+    elif kind == "general":
+        generation = chains.general.invoke(request)
+    else:
+        generation = request
+    return {"generation": generation, "keywords": keywords, "documents": state.get("documents", [])}
 
+async def agenerate(state: GraphState, chains: PipelineChains):
+    """generate의 비동기 버전"""
+    print("---노드: 답변 생성 (Pydantic Parser)---")
+    kind, request = _generation_request(state)
+    keywords = []
+    if kind == "answer":
+        try:
+            result = await chains.answer.ainvoke(request)
+            generation, keywords = result.answer, result.keywords
+        except Exception as e:
+            print(f"Pydantic 파싱 실패: {e}. 답변만 생성하도록 재시도합니다.")
+            generation = await chains.answer_fallback.ainvoke(request)
+    elif kind == "general":
+        generation = await chains.general.ainvoke(request)
     else:
-        if question_type == 'novel_related':
-             generation = "I couldn't find relevant information in the novel."
-        else:
-            prompt_template = "You are a friendly chatbot named 'Novel Bot'. Answer the user's question in English.\nQuestion: {question}"
-            chain = ChatPromptTemplate.from_template(prompt_template) | llm | StrOutputParser()
-            generation = chain.invoke({"question": question})
-        keywords = []
+        generation = request
+    return {"generation": generation, "keywords": keywords, "documents": state.get("documents", [])}
 
-    return {"generation": generation, "keywords": keywords, "documents": documents}
+def lookup_answer_cache(state: GraphState, answer_cache: SemanticAnswerCache, index_key: str, embeddings):
+    """비슷한 이전 질문의 답변을 찾는 노드 (찾지 못하면 계산한 질문 임베딩을 검색에 넘겨줍니다)"""
+    print("---노드: 답변 캐시 조회---")
+    query_embedding = state.get("query_embedding")
+    if query_embedding is None:
+        query_embedding = embeddings.embed_query(state["question"])
+    cached = answer_cache.lookup(index_key, state["original_language"], query_embedding)
+    if cached is None:
+        return {"query_embedding": query_embedding, "answer_cache_hit": False}
+    print(f"답변 캐시 적중 (유사도 {cached['similarity']:.3f}): [{cached['question']}]")
+    return {
+        "query_embedding": query_embedding,
+        "answer_cache_hit": True,
+        "generation": cached["answer"],
+        "keywords": cached["keywords"],
+        "documents": cached["documents"],
+    }
+
+async def alookup_answer_cache(state: GraphState, answer_cache: SemanticAnswerCache, index_key: str, embeddings):
+    """lookup_answer_cache의 비동기 버전 (캐시 조회는 SQLite를 사용하므로 스레드에서 실행합니다)"""
+    query_embedding = state.get("query_embedding")
+    if query_embedding is None:
+        query_embedding = await embeddings.aembed_query(state["question"])
+    return await asyncio.to_thread(lookup_answer_cache, {**state, "query_embedding": query_embedding}, answer_cache, index_key, embeddings)
+
+def store_answer_cache(state: GraphState, answer_cache: SemanticAnswerCache, scope: str, index_key: str):
+    """문서를 바탕으로 만든 최종 답변을 (번역된) 질문 임베딩과 함께 캐시에 저장하는 노드"""
+    if state["question_type"] == "novel_related" and state.get("documents") and state.get("query_embedding"):
+        answer_cache.store(
+            scope, index_key, state["original_language"], state["question"], state["query_embedding"],
+            state["generation"], state.get("keywords", []), state["documents"],
+        )
+    return {"answer_cache_hit": False}
 
+async def astore_answer_cache(state: GraphState, answer_cache: SemanticAnswerCache, scope: str, index_key: str):
+    """store_answer_cache의 비동기 버전 (캐시 저장은 SQLite를 사용하므로 스레드에서 실행합니다)"""
+    return await asyncio.to_thread(store_answer_cache, state, answer_cache, scope, index_key)
 
-def translate_generation(state: GraphState):
+def translate_generation(state: GraphState, chains: PipelineChains):
     """생성된 답변을 원본 언어로 번역하는 노드"""
     print("---노드: 최종 답변 번역---")
     generation = state["generation"]
@@ -151,16 +506,23 @@ def translate_generation(state: GraphState):
 
     if original_language == 'ko' and generation:
         print("답변을 한국어로 번역합니다.")
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-        prompt = ChatPromptTemplate.from_template("Translate the following English text to Korean: {text}")
-        chain = prompt | llm | StrOutputParser()
-        translated_generation = chain.invoke({"text": generation})
+        translated_generation = chains.translate_answer.invoke({"text": generation})
         return {"generation": translated_generation}
     
     print("번역이 필요 없습니다.")
     return {"generation": generation}
 
-# --- 3. Conditional Edge 로직 ---
+async def atranslate_generation(state: GraphState, chains: PipelineChains):
+    """translate_generation의 비동기 버전"""
+    print("---노드: 최종 답변 번역---")
+    generation = state["generation"]
+    if state["original_language"] == 'ko' and generation:
+        print("답변을 한국어로 번역합니다.")
+        return {"generation": await chains.translate_answer.ainvoke({"text": generation})}
+    print("번역이 필요 없습니다.")
+    return {"generation": generation}
+
+# --- 4. Conditional Edge 로직 ---
 def decide_route(state: GraphState):
     return state["question_type"]
 
@@ -169,33 +531,193 @@ def decide_after_grade(state: GraphState):
         return "retry" if state.get('retries', 0) < 2 else "failure"
     return "success"
 
-# --- 4. Graph 생성 함수 ---
-def create_graph(vector_store):
+def decide_after_cache_lookup(state: GraphState):
+    return "hit" if state.get("answer_cache_hit") else "miss"
+
+def decide_after_generate(state: GraphState):
+    # 질문과 같은 언어로 생성한 답변은 번역 노드를 거치지 않습니다.
+    if state.get("generation_language", "en") == state["original_language"]:
+        return "done"
+    return "translate"
+
+# --- 5. Graph 생성 함수 ---
+def create_graph(
+    vector_store,
+    grading_mode: str = "concurrent",
+    chains: PipelineChains = None,
+    retriever: HybridRetriever = None,
+    accept_threshold: Optional[float] = GRADING_ACCEPT_THRESHOLD,
+    reject_threshold: Optional[float] = GRADING_REJECT_THRESHOLD,
+    corpus_language: Optional[str] = None,
+    answer_cache: Optional[SemanticAnswerCache] = None,
+    answer_cache_scope: Optional[str] = None,
+    answer_cache_key: Optional[str] = None,
+):
+    """
+    RAG 워크플로우 그래프를 컴파일합니다.
+
+    Args:
+        vector_store: 검색에 사용할 벡터 저장소.
+        grading_mode: 문서 평가 방식 (GRADING_MODES 중 하나).
+        chains: 노드가 사용할 체인 묶음. 생략하면 프로세스 공유 체인(get_chains())을 사용합니다.
+        retriever: 검색기 (HybridRetriever). 생략하면 vector_store에 대한 벡터 검색만 사용합니다.
+        accept_threshold: 이 유사도 이상인 문서는 LLM 평가 없이 채택합니다 (None이면 사용하지 않음).
+        reject_threshold: 이 유사도 미만인 문서는 LLM 평가 없이 제외합니다 (None이면 사용하지 않음).
+        corpus_language: 검색 대상 작품의 언어 ('ko', 'en', DB의 'kr'도 허용). 질문 언어와 같으면
+            질문과 답변의 번역을 생략합니다. None이면 한국어 질문은 항상 영어로 번역합니다.
+        answer_cache: 의미 기반 답변 캐시. 주어지면 라우팅 직후 비슷한 이전 질문의 답변을 찾고,
+            새로 만든 답변을 마지막에 저장합니다. None이면 캐시 노드를 추가하지 않습니다.
+        answer_cache_scope: 캐시 항목의 범위 (그래프 구성과 샤드 경로).
+        answer_cache_key: 인덱스 식별자 (샤드 파일의 지문을 포함하여 인덱스가 바뀌면 달라집니다).
+    """
+    if grading_mode not in GRADING_MODES:
+        raise ValueError(f"Unknown grading mode '{grading_mode}'. Choose one of {GRADING_MODES}.")
+    chains = chains or get_chains()
+    retriever = retriever or HybridRetriever(vector_store=vector_store, mode="vector")
+    corpus_language = normalize_language(corpus_language)
     workflow = StateGraph(GraphState)
 
-    workflow.add_node("translate_question", translate_question)
-    workflow.add_node("route_question", route_question)
-    workflow.add_node("retrieve", lambda state: retrieve(state, vector_store))
-    workflow.add_node("grade_documents", grade_documents)
-    workflow.add_node("generate", generate)
-    workflow.add_node("translate_generation", translate_generation)
+    # 각 노드는 동기/비동기 구현을 함께 가지므로, invoke/stream은 동기 클라이언트를,
+    # ainvoke/astream(api_server.py)은 스레드를 점유하지 않고 비동기 HTTP 클라이언트를 사용합니다.
+    def add_node(name: str, node, anode, **kwargs):
+        workflow.add_node(name, RunnableLambda(
+            lambda state: node(state, **kwargs), afunc=lambda state: anode(state, **kwargs), name=name
+        ))
+
+    add_node("analyze_question", analyze_question, aanalyze_question, chains=chains, corpus_language=corpus_language)
+    add_node("retrieve", retrieve, aretrieve, retriever=retriever)
+    add_node(
+        "grade_documents", grade_documents, agrade_documents, chains=chains, grading_mode=grading_mode,
+        accept_threshold=accept_threshold, reject_threshold=reject_threshold,
+    )
+    add_node("generate", generate, agenerate, chains=chains)
+    add_node("translate_generation", translate_generation, atranslate_generation, chains=chains)
+    # 답변 캐시를 사용하지 않으면 생성(또는 번역) 후 바로 종료합니다.
+    final_node = END
+    if answer_cache is not None:
+        embeddings = retriever.vector_store.embeddings
+        add_node(
+            "lookup_answer_cache", lookup_answer_cache, alookup_answer_cache,
+            answer_cache=answer_cache, index_key=answer_cache_key, embeddings=embeddings,
+        )
+        add_node(
+            "store_answer_cache", store_answer_cache, astore_answer_cache,
+            answer_cache=answer_cache, scope=answer_cache_scope, index_key=answer_cache_key,
+        )
+        final_node = "store_answer_cache"
 
-    workflow.set_entry_point("translate_question")
-    workflow.add_edge("translate_question", "route_question")
+    workflow.set_entry_point("analyze_question")
     workflow.add_conditional_edges(
-        "route_question",
+        "analyze_question",
         decide_route,
-        {"novel_related": "retrieve", "general": "generate"},
+        {"novel_related": "retrieve" if answer_cache is None else "lookup_answer_cache", "general": "generate"},
     )
+    if answer_cache is not None:
+        workflow.add_conditional_edges(
+            "lookup_answer_cache",
+            decide_after_cache_lookup,
+            {"hit": END, "miss": "retrieve"},
+        )
+        workflow.add_edge("store_answer_cache", END)
     workflow.add_edge("retrieve", "grade_documents")
     workflow.add_conditional_edges(
         "grade_documents",
         decide_after_grade,
         {"success": "generate", "retry": "retrieve", "failure": "generate"},
     )
-    workflow.add_edge("generate", "translate_generation")
-    workflow.add_edge("translate_generation", END)
+    workflow.add_conditional_edges(
+        "generate",
+        decide_after_generate,
+        {"translate": "translate_generation", "done": final_node},
+    )
+    workflow.add_edge("translate_generation", final_node)
     
     app = workflow.compile()
     print("LangGraph 앱이 성공적으로 컴파일되었습니다. (최종 번역 노드 포함)")
-    return app
\ No newline at end of file
+    return app
+
+# --- 6. 토큰 스트리밍 ---
+# 사용자에게 보여줄 답변 토큰을 내보내는 노드
+STREAMED_ANSWER_NODES = ("generate", "translate_generation")
+
+def _extract_partial_answer(text: str) -> str:
+    """생성 중인 JSON 응답(AnswerWithKeywords)에서 지금까지 만들어진 'answer' 값만 꺼냅니다."""
+    stripped = text.strip()
+    if stripped.startswith("```"):
+        stripped = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+    if not stripped.startswith("{"):
+        # 일반 대화 또는 fallback 경로는 평문으로 생성됩니다.
+        return text
+    parsed = parse_partial_json(stripped.rstrip("`"))
+    if isinstance(parsed, dict) and isinstance(parsed.get("answer"), str):
+        return parsed["answer"]
+    return ""
+
+class _AnswerStream:
+    """stream_answer와 astream_answer가 공유하는, 그래프 스트림 조각을 이벤트로 바꾸는 상태입니다."""
+
+    def __init__(self):
+        self.original_language = self.generation_language = None
+        self.buffers = {node: "" for node in STREAMED_ANSWER_NODES}
+        # 노드별로 지금 스트리밍 중인 LLM 호출의 메시지 id
+        self.message_ids = {node: None for node in STREAMED_ANSWER_NODES}
+        self.shown_answer = ""
+
+    def events(self, mode: str, payload) -> list:
+        if mode == "updates":
+            events = []
+            for node_name, update in payload.items():
+                if node_name == "analyze_question":
+                    self.original_language = update.get("original_language")
+                    self.generation_language = update.get("generation_language", "en")
+                events.append(("node", node_name, update))
+                if node_name == "lookup_answer_cache" and update.get("answer_cache_hit"):
+                    # 캐시된 답변은 토큰 없이 한 번에 도착합니다.
+                    self.shown_answer = update["generation"]
+                    events.append(("answer", update["generation"]))
+            return events
+
+        message_chunk, metadata = payload
+        node_name = metadata.get("langgraph_node")
+        if node_name not in self.buffers or not isinstance(message_chunk.content, str) or not message_chunk.content:
+            return []
+        if message_chunk.id != self.message_ids[node_name]:
+            # 같은 노드의 새 LLM 호출(예: JSON 파싱 실패 후 평문 fallback)은 이전 응답에 이어 붙이지 않고 새로 시작합니다.
+            self.message_ids[node_name] = message_chunk.id
+            self.buffers[node_name] = ""
+        self.buffers[node_name] += message_chunk.content
+        if node_name == "generate":
+            # 번역될 답변은 보여주지 않고, 번역 노드의 토큰을 기다립니다.
+            if self.original_language != self.generation_language:
+                return []
+            partial_answer = _extract_partial_answer(self.buffers[node_name])
+        else:
+            partial_answer = self.buffers[node_name]
+        if partial_answer and partial_answer != self.shown_answer:
+            self.shown_answer = partial_answer
+            return [("answer", partial_answer)]
+        return []
+
+def stream_answer(rag_app, inputs: dict, config: Optional[dict] = None):
+    """
+    그래프를 실행하면서 노드 진행 상황과 답변 토큰을 순서대로 내보냅니다.
+    config는 그래프 실행에 그대로 전달됩니다 (예: 추적 콜백).
+
+    Yields:
+        ("node", node_name, update): 노드 하나가 끝날 때마다 해당 노드의 상태 업데이트
+        ("answer", text): 지금까지 생성된 (사용자 언어의) 답변 전체
+    """
+    answer_stream = _AnswerStream()
+    for mode, payload in rag_app.stream(inputs, config=config, stream_mode=["updates", "messages"]):
+        yield from answer_stream.events(mode, payload)
+
+async def astream_answer(rag_app, inputs: dict, config: Optional[dict] = None):
+    """
+    stream_answer의 비동기 버전입니다. 이벤트 루프를 막지 않고 그래프를 실행하므로
+    하나의 프로세스에서 여러 요청을 동시에 처리할 수 있습니다 (api_server.py).
+    내보내는 이벤트는 stream_answer와 같습니다.
+    """
+    answer_stream = _AnswerStream()
+    async for mode, payload in rag_app.astream(inputs, config=config, stream_mode=["updates", "messages"]):
+        for event in answer_stream.events(mode, payload):
+            yield event
@@ -2,26 +2,71 @@
 텍스트 하이라이팅 관련 유틸리티 함수를 모아놓은 파일입니다.
 
 주어진 텍스트에서 키워드 목록에 해당하는 단어들을 찾아
-HTML <mark> 태그로 감싸는 기능을 수행합니다.
+HTML <mark> 태그로 감싸는 기능을 수행합니다. 키워드 묶음마다 정규표현식을 한 번만
+컴파일하여 재사용하고, 일치 위치(offset)를 반환하므로 화면을 다시 그릴 때 본문을
+다시 검색하지 않아도 됩니다. 한국어 키워드는 조사가 붙은 형태(예: '초봉이는')도 찾습니다.
 """
 import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+def _is_hangul(ch: str) -> bool:
+    return '가' <= ch <= '힣' or 'ㄱ' <= ch <= 'ㆎ'
+
+def _keyword_pattern(keyword: str) -> str:
+    """
+    영어 키워드는 단어 전체가 일치해야 하고('his'가 'this'에 일치하지 않도록),
+    한국어 키워드는 뒤에 조사가 붙을 수 있으므로 앞쪽 경계만 확인합니다.
+    키워드 끝이 문장 부호이면 그쪽 경계는 확인하지 않습니다.
+    """
+    left = r"(?<!\w)" if re.match(r"\w", keyword[0]) else ""
+    if _is_hangul(keyword[-1]) or not re.match(r"\w", keyword[-1]):
+        right = ""
+    else:
+        right = r"(?!\w)"
+    return left + re.escape(keyword) + right
+
+@lru_cache(maxsize=256)
+def _compile_matcher(keywords: Tuple[str, ...]) -> Optional[Pattern]:
+    if not keywords:
+        return None
+    # 같은 위치에서는 긴 키워드가 먼저 일치하도록 길이 역순으로 나열합니다 ('Captain Ahab' > 'Ahab').
+    ordered = sorted(keywords, key=lambda keyword: (-len(keyword), keyword))
+    return re.compile("|".join(_keyword_pattern(keyword) for keyword in ordered), flags=re.IGNORECASE)
+
+def get_keyword_matcher(keywords: Iterable[str]) -> Optional[Pattern]:
+    """Returns the compiled matcher for a keyword set, built once per distinct set (case-insensitive)."""
+    normalized = {keyword.strip().lower() for keyword in keywords if keyword and keyword.strip()}
+    return _compile_matcher(tuple(sorted(normalized)))
+
+def find_keyword_spans(text: str, keywords: Iterable[str]) -> List[Tuple[int, int]]:
+    """
+    Finds the keywords in text.
+
+    Returns:
+        Non-overlapping (start, end) character offsets, in order.
+    """
+    matcher = get_keyword_matcher(keywords)
+    if matcher is None:
+        return []
+    return [match.span() for match in matcher.finditer(text)]
+
+def render_highlights(text: str, spans: List[Tuple[int, int]]) -> str:
+    """Wraps the given spans of text in <mark> tags, keeping the original casing."""
+    parts, position = [], 0
+    for start, end in spans:
+        parts.append(text[position:start])
+        parts.append(f"<mark>{text[start:end]}</mark>")
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
 
 def highlight_text(text: str, keywords: list[str]) -> str:
     """
     주어진 텍스트에서 키워드 목록에 해당하는 단어들을 <mark> 태그로 감쌉니다.
-    대소문자를 구분하지 않고, 단어 전체가 일치하는 경우에만 하이라이트합니다.
+    대소문자를 구분하지 않으며, 영어는 단어 전체가 일치하는 경우에만,
+    한국어는 조사가 붙은 경우에도 하이라이트합니다.
     """
     if not keywords:
         return text
-
-    # 키워드들을 OR(|)로 묶어 하나의 정규표현식 패턴 생성
-    # \b는 단어 경계를 의미하여 'his'가 'this'의 일부로 매칭되는 것을 방지
-    pattern = r"\b(" + "|".join(re.escape(key) for key in keywords) + r")\b"
-    
-    # re.sub의 repl 인자로 함수를 사용하여 원본의 대소문자를 유지
-    def mark_tag(match):
-        return f"<mark>{match.group(0)}</mark>"
-
-    highlighted_text = re.sub(pattern, mark_tag, text, flags=re.IGNORECASE)
-    
-    return highlighted_text
\ No newline at end of file
+    return render_highlights(text, find_keyword_spans(text, keywords))
@@ -0,0 +1,185 @@
+"""
+LLM 응답 캐시를 제공하는 유틸리티 파일입니다.
+
+그래프의 모든 노드는 temperature=0의 결정적인 프롬프트로 ChatOpenAI를 호출하므로,
+같은 모델·프롬프트·입력 조합의 응답은 다시 계산할 필요가 없습니다.
+LangChain의 전역 LLM 캐시(set_llm_cache)에 연결되어 프로세스 내 모든
+Streamlit 세션이 같은 캐시를 공유하며, SQLite 백엔드는 프로세스 간에도 공유됩니다.
+
+- LRUResponseCache: 메모리 기반 LRU 캐시
+- SQLiteResponseCache: 디스크(SQLite) 기반 캐시
+두 백엔드 모두 TTL, 최대 크기 기반 제거(eviction), 적중/실패 카운터를 지원합니다.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+from utils.tracing_utils import mark_llm_cache_hit
+
+LLM_CACHE_DB_PATH = Path(__file__).parent.parent / "data" / "llm_cache.db"
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    """
+    Builds the cache key from the serialized prompt (template rendered with its inputs)
+    and the llm_string (model name and invocation parameters).
+    """
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+class LRUResponseCache(BaseCache):
+    """메모리에 최근 사용된 응답을 최대 max_size개까지 보관하는 캐시입니다."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple[float, RETURN_VAL_TYPE]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = make_cache_key(prompt, llm_string)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        mark_llm_cache_hit()
+        return entry[1]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = make_cache_key(prompt, llm_string)
+        with self._lock:
+            self._entries[key] = (time.time(), return_val)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
+
+class SQLiteResponseCache(BaseCache):
+    """SQLite 파일에 응답을 저장하여 여러 프로세스와 재시작 후에도 공유하는 캐시입니다."""
+
+    def __init__(
+        self,
+        db_path: Path = LLM_CACHE_DB_PATH,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+    ):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            llm_string TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used_at)")
+        self._conn.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = make_cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        mark_llm_cache_hit()
+        return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = make_cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, response, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, llm_string, dumps(list(return_val)), now, now),
+            )
+            # 최대 크기를 넘으면 가장 오래 사용되지 않은 항목부터 제거합니다.
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"backend": "sqlite", "hits": self.hits, "misses": self.misses, "size": size, "max_size": self.max_size}
+
+_llm_cache: Optional[BaseCache] = None
+
+def configure_llm_cache(
+    backend: Optional[str] = "sqlite",
+    max_size: int = DEFAULT_MAX_SIZE,
+    ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+) -> Optional[BaseCache]:
+    """
+    Installs the process-wide LLM response cache used by every ChatOpenAI call.
+
+    Calling it again with the same backend keeps the existing cache (and its counters),
+    so it is safe to call on every Streamlit rerun.
+
+    Args:
+        backend: 'memory', 'sqlite' or None to disable caching.
+        max_size: Maximum number of cached responses before LRU eviction.
+        ttl_seconds: Responses older than this are treated as misses. None disables expiry.
+    """
+    global _llm_cache
+    if backend is None:
+        _llm_cache = None
+    elif _llm_cache is not None and _llm_cache.stats()["backend"] == backend:
+        return _llm_cache
+    elif backend == "memory":
+        _llm_cache = LRUResponseCache(max_size=max_size, ttl_seconds=ttl_seconds)
+    elif backend == "sqlite":
+        _llm_cache = SQLiteResponseCache(max_size=max_size, ttl_seconds=ttl_seconds)
+    else:
+        raise ValueError(f"Unknown LLM cache backend '{backend}'. Choose 'memory', 'sqlite' or None.")
+    set_llm_cache(_llm_cache)
+    return _llm_cache
+
+def get_llm_cache_stats() -> Optional[Dict[str, Any]]:
+    """Returns hit/miss counters and size of the active LLM cache, or None if caching is disabled."""
+    return _llm_cache.stats() if _llm_cache is not None else None
@@ -4,8 +4,15 @@
 LangChain의 Document Loader와 Text Splitter를 사용하여 긴 텍스트를
 RAG 모델이 처리하기 용이한 작은 조각(chunk)으로 만드는 기능을 수행합니다.
 """
+import hashlib
+from langchain_core.documents import Document
 from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from utils.db_utils import get_db_connection, get_chunks, get_literature_body, save_chunks
+
+# 청크 분할 파라미터 (벡터 저장소 샤드의 키에도 사용됩니다)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
 
 def load_document(file_path):
     """Loads a text document from a given file path."""
@@ -13,8 +20,65 @@ def load_document(file_path):
     documents = loader.load()
     return documents
 
-def split_documents(documents):
+def split_documents(documents, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
     """Splits documents into smaller chunks for processing."""
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     chunks = text_splitter.split_documents(documents)
     return chunks
+
+def chunk_content_hash(content: str) -> str:
+    """Returns the hash stored as 'chunk_hash' for a chunk text (also recorded in index manifests)."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def split_text_with_offsets(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    """
+    Splits a body into chunks and records where each chunk starts and ends in the body.
+
+    Returns:
+        A list of dicts with 'ordinal', 'start_offset', 'end_offset', 'chunk_hash' and 'content',
+        ready to be stored with db_utils.save_chunks.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    chunks = []
+    for ordinal, doc in enumerate(text_splitter.create_documents([text])):
+        start_offset = doc.metadata["start_index"]
+        chunks.append({
+            "ordinal": ordinal,
+            "start_offset": start_offset,
+            "end_offset": start_offset + len(doc.page_content),
+            "chunk_hash": chunk_content_hash(doc.page_content),
+            "content": doc.page_content,
+        })
+    return chunks
+
+def chunks_to_documents(chunks, literature):
+    """Converts stored chunk rows of one literature into LangChain Documents for indexing."""
+    return [
+        Document(
+            id=str(chunk["id"]),
+            page_content=chunk["content"],
+            metadata={
+                "chunk_id": chunk["id"],
+                "literature_id": literature["id"],
+                "title": literature["title"],
+                "ordinal": chunk["ordinal"],
+                "start_index": chunk["start_offset"],
+                "end_index": chunk["end_offset"],
+            },
+        )
+        for chunk in chunks
+    ]
+
+def get_or_create_chunks(literature_id: int, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    """
+    Returns the stored chunks of a literature. If the literature has not been chunked
+    by setup_database.py yet, its body is split once and the chunks are stored.
+    """
+    chunks = get_chunks(literature_id, chunk_size, chunk_overlap)
+    if chunks:
+        return chunks
+    print(f"No stored chunks for literature {literature_id}; splitting its body...")
+    with get_db_connection() as conn:
+        save_chunks(conn, literature_id, split_text_with_offsets(get_literature_body(literature_id), chunk_size, chunk_overlap), chunk_size, chunk_overlap)
+        conn.commit()
+    return get_chunks(literature_id, chunk_size, chunk_overlap)
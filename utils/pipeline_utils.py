@@ -0,0 +1,135 @@
+"""
+선택한 작품들에 대한 RAG 그래프를 준비하는 공통 함수를 모아놓은 파일입니다.
+
+Streamlit 앱(app.py)과 HTTP API 서버(api_server.py)가 같은 방식으로 샤드를 불러오고
+그래프를 만들도록, 작품 언어 확인부터 레지스트리 등록까지의 과정을 한곳에 모았습니다.
+샤드와 그래프는 레지스트리에서 인덱스 식별자별로 한 번만 만들어져 모든 요청이 공유합니다.
+"""
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.documents import Document
+
+from utils.answer_cache_utils import get_answer_cache, ANSWER_CACHE_ENABLED
+from utils.embedding_cache_utils import CachedEmbeddings
+from utils.db_utils import get_chunk_hashes, get_chunks_by_ids
+from utils.graph_utils import PipelineChains, create_graph, normalize_language
+from utils.load_and_split_text_utils import get_or_create_chunks, chunks_to_documents, CHUNK_SIZE, CHUNK_OVERLAP
+from utils.registry_utils import ResourceRegistry, get_vector_store_registry
+from utils.retriever_utils import HybridRetriever, DEFAULT_RETRIEVAL_MODE
+from utils.vector_store_utils import (
+    get_or_create_sharded_vector_store, get_shard_fingerprint, get_shard_path, DEFAULT_INDEX_TYPE,
+)
+
+EMBEDDING_MODEL_NAME = "text-embedding-3-small"
+# 작품별 샤드는 한 번만 임베딩되고, 선택된 조합은 검색 시점에 샤드를 합쳐서 사용합니다.
+SHARD_ROOT = Path(__file__).parent.parent / "faiss_literature" / "shards"
+
+class MixedLanguageError(ValueError):
+    """Raised when the selected books are not all written in the same language."""
+
+def get_corpus_language(details: List[Dict[str, Any]]) -> str:
+    """Returns the normalized language shared by the books ('kr' and 'ko' are the same language)."""
+    languages = {normalize_language(detail['language']) for detail in details}
+    if len(languages) > 1:
+        raise MixedLanguageError(f"Books in different languages cannot be searched together: {sorted(languages)}")
+    return languages.pop()
+
+@lru_cache(maxsize=None)
+def get_embeddings(model_name: str = EMBEDDING_MODEL_NAME) -> CachedEmbeddings:
+    """Returns the process-wide OpenAI embedding model; already embedded texts come from the local cache."""
+    from langchain_openai import OpenAIEmbeddings
+    return CachedEmbeddings(OpenAIEmbeddings(model=model_name), model_name)
+
+def load_book_chunks(book: Dict[str, Any]) -> List[Document]:
+    """Loads (or splits and stores) the chunks of one book as Documents for indexing."""
+    chunks = get_or_create_chunks(book['id'], CHUNK_SIZE, CHUNK_OVERLAP)
+    return chunks_to_documents(chunks, book)
+
+def load_book_chunk_entries(book: Dict[str, Any]) -> List[List[str]]:
+    """Returns the manifest entries [chunk id, content hash] of one book's stored chunks without reading their text."""
+    return [[str(chunk["id"]), chunk["chunk_hash"]] for chunk in get_chunk_hashes(book['id'], CHUNK_SIZE, CHUNK_OVERLAP)]
+
+def load_book_chunks_by_ids(book: Dict[str, Any], chunk_ids: List[str]) -> List[Document]:
+    """Loads the given stored chunks of one book as Documents, in the order of chunk_ids (unknown ids are skipped)."""
+    chunks = get_chunks_by_ids([int(chunk_id) for chunk_id in chunk_ids])
+    return chunks_to_documents([chunks[int(chunk_id)] for chunk_id in chunk_ids if int(chunk_id) in chunks], book)
+
+def prepare_rag_app(
+    details: List[Dict[str, Any]],
+    owner: str,
+    embeddings=None,
+    embedding_model_name: str = EMBEDDING_MODEL_NAME,
+    load_chunks: Callable[[Dict[str, Any]], List[Document]] = load_book_chunks,
+    registry: Optional[ResourceRegistry] = None,
+    shard_root: Path = SHARD_ROOT,
+    index_type: str = DEFAULT_INDEX_TYPE,
+    retrieval_mode: str = DEFAULT_RETRIEVAL_MODE,
+    grading_mode: str = "concurrent",
+    chains: Optional[PipelineChains] = None,
+    use_answer_cache: bool = ANSWER_CACHE_ENABLED,
+    progress_callback: Optional[Callable[[Dict[str, Any], int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    선택한 작품들의 샤드를 불러오고(없으면 생성하고) 그 조합에 대한 그래프를 레지스트리에서 가져옵니다.
+
+    Args:
+        details: Literature rows with 'id', 'title' and 'language'.
+        owner: Reference holder registered on every shard and on the graph (session id, API client, ...).
+        embeddings: Embedding model; the cached OpenAI model of embedding_model_name by default.
+        load_chunks: Called with each book row when its shard has to be built or rebuilt. Existing shards are
+            compared with the stored chunk hashes and read only the added chunks (load_book_chunks_by_ids).
+        chains: Model chains for the graph; the shared OpenAI chains by default.
+        use_answer_cache: Put the semantic answer cache in front of retrieval (ANSWER_CACHE_ENABLED by default).
+        progress_callback: Called as progress_callback(book, done_texts, total_texts) while a shard (or its added chunks) is embedded.
+
+    Returns:
+        dict: 'rag_app', 'language', 'graph_key' and 'resource_keys' (every registry key the owner now holds).
+
+    Raises:
+        MixedLanguageError: If the books are written in different languages.
+    """
+    language = get_corpus_language(details)
+    registry = registry or get_vector_store_registry()
+    embeddings = embeddings or get_embeddings(embedding_model_name)
+
+    vector_store = get_or_create_sharded_vector_store(
+        details, shard_root, embeddings, embedding_model_name,
+        CHUNK_SIZE, CHUNK_OVERLAP, load_chunks,
+        registry=registry, owner=owner, index_type=index_type, progress_callback=progress_callback,
+        load_chunk_entries=load_book_chunk_entries, load_chunks_by_ids=load_book_chunks_by_ids,
+    )
+    # 샤드 키에는 작품의 현재 청크 지문이 들어가므로, 청크가 다시 만들어지면 그래프도 새로 만들어집니다.
+    shard_keys = tuple(sorted(vector_store.shard_keys.values()))
+    shard_paths = tuple(sorted(
+        str(get_shard_path(shard_root, d['id'], embedding_model_name, CHUNK_SIZE, CHUNK_OVERLAP, index_type))
+        for d in details
+    ))
+    graph_options = ("graph", retrieval_mode, grading_mode, language, use_answer_cache)
+    graph_key = graph_options + shard_keys
+    retriever = HybridRetriever(vector_store=vector_store, literatures=details, mode=retrieval_mode)
+
+    def build_graph():
+        answer_cache_options = {}
+        if use_answer_cache:
+            # 샤드 파일의 지문이 바뀌면(인덱스 재생성) 이전 인덱스로 만든 답변은 지웁니다.
+            # 범위(scope)는 청크 지문이 없는 샤드 경로로 정하여, 청크가 바뀐 뒤에도 이전 답변이 정리되도록 합니다.
+            scope = str(graph_options + shard_paths)
+            fingerprints = [get_shard_fingerprint(Path(path)) for path in shard_paths]
+            index_key = hashlib.sha256("\n".join([scope, *fingerprints]).encode("utf-8")).hexdigest()
+            answer_cache = get_answer_cache()
+            answer_cache.invalidate_stale(scope, index_key)
+            answer_cache_options = {"answer_cache": answer_cache, "answer_cache_scope": scope, "answer_cache_key": index_key}
+        return create_graph(
+            vector_store, grading_mode=grading_mode, chains=chains, retriever=retriever, corpus_language=language,
+            **answer_cache_options,
+        )
+
+    rag_app = registry.acquire(graph_key, build_graph, owner, kind="graph", depends_on=shard_keys)
+    return {
+        "rag_app": rag_app,
+        "language": language,
+        "graph_key": graph_key,
+        "resource_keys": shard_keys + (graph_key,),
+    }
@@ -0,0 +1,72 @@
+"""
+OpenAI API의 요청 한도(rate limit)에 맞춰 호출 속도를 조절하는 유틸리티 파일입니다.
+
+- RequestBudget: 분당 요청 수(RPM)와 토큰 수(TPM) 한도 안에서만 새 요청을 시작하도록 기다립니다.
+- RateLimitBackoff: 한도 초과(429) 응답을 받으면 모든 작업자가 함께 지수 백오프로 기다립니다.
+
+인덱스 생성 시의 일괄 임베딩(vector_store_utils)과 질문 일괄 실행 스크립트가 함께 사용합니다.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+def is_rate_limit_error(error: Exception) -> bool:
+    # openai.RateLimitError와 HTTP 429 응답을 모두 한도 초과로 봅니다.
+    return type(error).__name__ == "RateLimitError" or getattr(error, "status_code", None) == 429
+
+class RequestBudget:
+    """
+    최근 window_seconds 동안 시작한 요청의 수와 토큰 합계를 기록하는 슬라이딩 윈도우 제한기입니다.
+    acquire()는 새 요청이 두 한도를 모두 지킬 수 있을 때까지 기다립니다.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, window_seconds: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window_seconds = window_seconds
+        self._events: "deque[tuple]" = deque()
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """Blocks until a request of the given token count fits in the budget, then records it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._events and now - self._events[0][0] >= self.window_seconds:
+                    self._tokens_in_window -= self._events.popleft()[1]
+                fits_requests = len(self._events) < self.requests_per_minute
+                # 한도보다 큰 요청 하나는 윈도우가 비었을 때 보냅니다 (영원히 기다리지 않도록).
+                fits_tokens = self._tokens_in_window + tokens <= self.tokens_per_minute or not self._events
+                if fits_requests and fits_tokens:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                wait_seconds = self._events[0][0] + self.window_seconds - now
+            time.sleep(max(wait_seconds, 0.01))
+
+class RateLimitBackoff:
+    """
+    모든 작업자가 공유하는 백오프 상태입니다. 한 요청이 한도에 걸리면 다른 작업자도
+    같은 시각까지 새 요청을 보내지 않으므로, 한도에 걸린 상태에서 요청이 쏟아지지 않습니다.
+    """
+
+    def __init__(self, initial_seconds: float, max_seconds: float):
+        self.initial_seconds = initial_seconds
+        self.max_seconds = max_seconds
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def hit(self, attempt: int) -> float:
+        """Pushes the shared resume time back after the attempt-th rate-limit error and returns the delay."""
+        delay = min(self.max_seconds, self.initial_seconds * 2 ** attempt) * random.uniform(1.0, 1.5)
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return delay
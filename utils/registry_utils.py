@@ -0,0 +1,172 @@
+"""
+프로세스 전체에서 벡터 저장소 샤드와 컴파일된 그래프를 공유하기 위한 레지스트리입니다.
+
+Streamlit 세션마다 같은 인덱스를 디스크에서 따로 불러오면 사용자 수만큼 메모리를
+차지하므로, 인덱스 식별자(key)별로 한 번만 만들어 모든 세션이 공유합니다.
+각 항목은 사용 중인 세션(owner)을 기록하는 참조 카운트를 가지며, 메모리 예산을
+넘으면 아무도 사용하지 않는 항목부터 LRU 순서로 제거합니다.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+# 레지스트리가 보관할 수 있는 인덱스의 대략적인 메모리 예산
+VECTOR_STORE_MEMORY_BUDGET_MB = float(os.getenv("VECTOR_STORE_MEMORY_BUDGET_MB", "2048"))
+# 이 시간 동안 재실행(rerun)이 없는 세션의 참조는 만료된 것으로 봅니다.
+SESSION_REF_TTL_SECONDS = float(os.getenv("SESSION_REF_TTL_SECONDS", "1800"))
+
+class _Entry:
+    def __init__(self, value: Any, kind: str, size_bytes: int, depends_on: Iterable[Hashable]):
+        self.value = value
+        self.kind = kind
+        self.size_bytes = size_bytes
+        self.depends_on = tuple(depends_on)
+        self.owners: Dict[str, float] = {}
+        self.created_at = time.time()
+        self.last_used_at = self.created_at
+        self.hits = 0
+
+class ResourceRegistry:
+    """
+    키별로 한 번만 생성한 객체를 여러 세션이 공유하도록 관리합니다.
+
+    - acquire(): 없으면 factory로 만들고, 호출한 세션을 참조자로 등록합니다.
+    - release(): 세션이 더 이상 사용하지 않는 항목의 참조를 해제합니다.
+    - 전체 크기가 max_bytes를 넘으면 참조가 없는 항목부터 LRU 순서로 제거합니다.
+    """
+
+    def __init__(self, max_bytes: int, session_ttl_seconds: float = SESSION_REF_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.session_ttl_seconds = session_ttl_seconds
+        self._entries: Dict[Hashable, _Entry] = {}
+        # 생성 중인 키: 같은 키를 동시에 요청한 호출은 하나의 생성 결과를 기다립니다.
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.RLock()
+
+    def acquire(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+        owner: str,
+        kind: str = "resource",
+        size_fn: Optional[Callable[[Any], int]] = None,
+        depends_on: Iterable[Hashable] = (),
+    ) -> Any:
+        """
+        Returns the shared object for key, creating it with factory if it is not resident.
+
+        factory runs without holding the registry lock, so other keys stay available while a
+        shard is being embedded; concurrent callers for the same key wait for that one build
+        (and see its exception if it fails).
+
+        Args:
+            key: Identity of the resource (e.g. shard path or index identity).
+            owner: Session id holding a reference to the resource.
+            kind: Label shown on the Admin View ('shard', 'graph', ...).
+            size_fn: Estimates the resident size in bytes of a newly created object.
+            depends_on: Keys this resource holds on to; it is dropped when any of them is evicted.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.hits += 1
+                    self._touch(entry, owner)
+                    return entry.value
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = Future()
+                    break
+            # 다른 호출이 같은 키를 만드는 중이면 그 결과를 기다린 뒤 등록된 항목을 사용합니다.
+            pending.result()
+
+        # 생성(임베딩 등)은 오래 걸릴 수 있으므로 전역 잠금 밖에서 실행하여 다른 키의 조회를 막지 않습니다.
+        try:
+            value = factory()
+            size_bytes = size_fn(value) if size_fn else 0
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            entry = _Entry(value, kind, size_bytes, depends_on)
+            self._entries[key] = entry
+            del self._pending[key]
+            self._touch(entry, owner)
+        pending.set_result(None)
+        return value
+
+    def _touch(self, entry: _Entry, owner: str):
+        now = time.time()
+        entry.owners[owner] = now
+        entry.last_used_at = now
+        self._evict_if_needed()
+
+    def release(self, owner: str, keep: Iterable[Hashable] = ()):
+        """Drops the owner's reference on every resource except those in keep."""
+        keep = set(keep)
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key not in keep:
+                    entry.owners.pop(owner, None)
+            self._evict_if_needed()
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size_bytes for entry in self._entries.values())
+
+    def _expire_owners(self, now: float):
+        for entry in self._entries.values():
+            for owner, touched_at in list(entry.owners.items()):
+                if now - touched_at > self.session_ttl_seconds:
+                    del entry.owners[owner]
+
+    def _remove(self, key: Hashable):
+        self._entries.pop(key, None)
+        # 제거된 항목을 붙잡고 있는 항목(예: 샤드를 사용하는 그래프)도 함께 제거해야 메모리가 해제됩니다.
+        for dependent_key in [k for k, e in self._entries.items() if key in e.depends_on]:
+            self._remove(dependent_key)
+
+    def _evict_if_needed(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        self._expire_owners(time.time())
+        unreferenced = sorted(
+            (key for key, entry in self._entries.items() if not entry.owners),
+            key=lambda key: self._entries[key].last_used_at,
+        )
+        for key in unreferenced:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key in self._entries:
+                print(f"레지스트리 메모리 예산 초과: '{key}' 항목을 제거합니다.")
+                self._remove(key)
+        if self.total_bytes > self.max_bytes:
+            print("레지스트리 메모리 예산을 초과했지만, 남은 항목은 모두 사용 중입니다.")
+
+    def resident(self) -> List[Dict[str, Any]]:
+        """Describes resident resources for the Admin View."""
+        now = time.time()
+        with self._lock:
+            self._expire_owners(now)
+            return [
+                {
+                    "key": str(key),
+                    "kind": entry.kind,
+                    "size_mb": round(entry.size_bytes / 1024 / 1024, 2),
+                    "sessions": len(entry.owners),
+                    "hits": entry.hits,
+                    "idle_seconds": round(now - entry.last_used_at),
+                }
+                for key, entry in sorted(self._entries.items(), key=lambda item: -item[1].last_used_at)
+            ]
+
+@lru_cache(maxsize=None)
+def get_vector_store_registry() -> ResourceRegistry:
+    """Returns the process-wide registry shared by every Streamlit session."""
+    return ResourceRegistry(max_bytes=int(VECTOR_STORE_MEMORY_BUDGET_MB * 1024 * 1024))
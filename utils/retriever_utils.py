@@ -0,0 +1,194 @@
+"""
+어휘(BM25) 검색과 벡터 검색을 결합한 하이브리드 검색기를 제공하는 파일입니다.
+
+벡터 검색은 질문마다 임베딩 API 호출이 필요하고, 인물 이름이나 정확한 구절
+("Queequeg", "Achilles' shield")에 약합니다. 'literature.db'의 FTS5 색인으로
+어휘 검색을 수행하고, 두 결과를 Reciprocal Rank Fusion(RRF)으로 합칩니다.
+어휘 검색만 사용하는 모드는 임베딩 호출 없이 동작합니다.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from utils.db_utils import search_chunks_fts
+from utils.load_and_split_text_utils import chunks_to_documents, CHUNK_SIZE, CHUNK_OVERLAP
+from utils.vector_store_utils import ShardedVectorStore
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+DEFAULT_RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# RRF의 순위 완화 상수 (일반적으로 60을 사용합니다)
+RRF_K = 60
+
+PROJECT_ROOT = Path(__file__).parent.parent
+STOPWORD_FILES = (
+    PROJECT_ROOT / "nltk_data" / "corpora" / "stopwords" / "english",
+    PROJECT_ROOT / "utils" / "korean_stopwords.txt",
+)
+# 질의어 끝에 붙은 흔한 한국어 조사 (예: '초봉이는' -> '초봉이')
+KOREAN_PARTICLES = ("에게서", "에서", "에게", "으로", "은", "는", "이", "가", "을", "를", "의", "에", "와", "과", "도", "로", "만")
+
+def _load_stopwords() -> set:
+    stopwords = set()
+    for path in STOPWORD_FILES:
+        if path.exists():
+            stopwords.update(line.strip().lower() for line in path.read_text(encoding="utf-8").splitlines() if line.strip())
+    return stopwords
+
+STOPWORDS = _load_stopwords()
+
+def _is_hangul(token: str) -> bool:
+    return any('가' <= ch <= '힣' for ch in token)
+
+def build_match_query(question: str) -> str:
+    """
+    Turns a natural-language question into an FTS5 MATCH expression.
+    Stopwords are dropped and the remaining terms are OR-ed so BM25 can rank partial matches.
+    Korean terms lose a trailing particle and are matched as prefixes.
+    """
+    terms = []
+    for token in re.findall(r"\w+", question.lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if _is_hangul(token):
+            for particle in KOREAN_PARTICLES:
+                if token.endswith(particle) and len(token) - len(particle) >= 2:
+                    token = token[:-len(particle)]
+                    break
+            term = f'"{token}"*'
+        else:
+            term = f'"{token}"'
+        if term not in terms:
+            terms.append(term)
+    return " OR ".join(terms)
+
+def chunk_key(doc: Document) -> Any:
+    """Identity used to recognise the same chunk across result lists."""
+    return doc.metadata.get("chunk_id", doc.page_content)
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], top_k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """
+    Fuses several ranked lists into one: each document scores sum(1 / (rrf_k + rank)).
+    The fused score is stored in metadata['rrf_score'], and the metadata of every list that
+    found the document is kept (e.g. both 'similarity' and 'bm25').
+    """
+    scores: Dict[Any, float] = {}
+    documents: Dict[Any, Document] = {}
+    metadatas: Dict[Any, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = chunk_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+            metadatas[key] = {**doc.metadata, **metadatas.get(key, {})}
+
+    fused = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    # 벡터 저장소의 문서는 세션 간에 공유되므로 복사본에 점수를 기록합니다.
+    return [
+        documents[key].model_copy(update={"metadata": {**metadatas[key], "rrf_score": scores[key]}})
+        for key in fused
+    ]
+
+def lexical_search(
+    question: str,
+    literatures: List[Dict[str, Any]],
+    k: int = 4,
+    offset: int = 0,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+) -> List[Document]:
+    """Searches the FTS5 index of the given literatures; needs no embedding call."""
+    rows = search_chunks_fts(
+        build_match_query(question), [lit["id"] for lit in literatures], chunk_size, chunk_overlap, k=k, offset=offset
+    )
+    literatures_by_id = {lit["id"]: lit for lit in literatures}
+    documents = []
+    for row in rows:
+        doc = chunks_to_documents([row], literatures_by_id[row["literature_id"]])[0]
+        doc.metadata["bm25"] = row["bm25"]
+        documents.append(doc)
+    return documents
+
+class HybridRetriever(BaseRetriever):
+    """
+    선택된 작품들에 대해 벡터/어휘/하이브리드 검색을 수행하는 검색기입니다.
+
+    - vector: FAISS 벡터 검색만 사용합니다 (기존 동작).
+    - lexical: FTS5(BM25) 검색만 사용하며, 임베딩 호출이 없습니다.
+    - hybrid: 두 검색 결과를 RRF로 결합합니다.
+    """
+
+    # 단일 FAISS 저장소 또는 작품별 샤드를 합친 검색 전용 저장소
+    vector_store: Union[VectorStore, ShardedVectorStore]
+    mode: str = "hybrid"
+    k: int = 4
+    chunk_size: int = CHUNK_SIZE
+    chunk_overlap: int = CHUNK_OVERLAP
+
+    literatures: List[Dict[str, Any]] = []
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents, _ = self.retrieve_page(query)
+        return documents
+
+    def retrieve_page(
+        self,
+        query: str,
+        exclude_keys: Iterable[Any] = (),
+        query_embedding: Optional[List[float]] = None,
+    ) -> Tuple[List[Document], Optional[List[float]]]:
+        """
+        Returns the next k candidates that are not in exclude_keys.
+
+        Retries call this with the chunks already graded as exclude_keys, so each attempt
+        deepens the candidate window instead of fetching the same documents again.
+        The query embedding is computed at most once and returned for reuse.
+
+        Returns:
+            (documents, query_embedding) — query_embedding is None in lexical mode.
+        """
+        if self.mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{self.mode}'. Choose one of {RETRIEVAL_MODES}.")
+        exclude_keys = set(exclude_keys)
+        # 이미 평가한 문서를 제외하고도 k개가 남도록 검색 창을 넓힙니다.
+        window = self.k + len(exclude_keys)
+
+        candidate_lists = []
+        if self.mode in ("vector", "hybrid"):
+            if query_embedding is None:
+                query_embedding = self.vector_store.embeddings.embed_query(query)
+            vector_window = window if self.mode == "vector" else window * 2
+            candidate_lists.append(self._vector_search_with_similarity(query_embedding, vector_window))
+        if self.mode in ("lexical", "hybrid"):
+            lexical_window = window if self.mode == "lexical" else window * 2
+            candidate_lists.append(lexical_search(
+                query, self.literatures, k=lexical_window, chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+            ))
+
+        if self.mode == "hybrid":
+            # 두 검색기에서 후보를 넉넉히 가져온 뒤 RRF로 순위를 합칩니다.
+            candidates = reciprocal_rank_fusion(candidate_lists, top_k=window * 2)
+        else:
+            candidates = candidate_lists[0]
+        documents = [doc for doc in candidates if chunk_key(doc) not in exclude_keys][:self.k]
+        return documents, query_embedding
+
+    def _vector_search_with_similarity(self, query_embedding: List[float], k: int) -> List[Document]:
+        """
+        Vector search that keeps the score: metadata['similarity'] holds the cosine similarity
+        in [-1, 1] (higher is more similar), used by grade_documents to skip LLM grading.
+
+        The shards are L2 indexes that return squared distances, and OpenAI (and the fake) embeddings
+        are unit length, so cosine = 1 - d / 2. LangChain's relevance function (1 - d / sqrt(2))
+        is not used because it treats d as a plain distance and goes negative below cosine ~0.29.
+        """
+        results = self.vector_store.similarity_search_with_score_by_vector(query_embedding, k=k)
+        # 벡터 저장소의 문서는 세션 간에 공유되므로 복사본에 점수를 기록합니다.
+        return [
+            doc.model_copy(update={"metadata": {**doc.metadata, "similarity": 1.0 - float(score) / 2.0}})
+            for doc, score in results
+        ]
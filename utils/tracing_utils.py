@@ -0,0 +1,342 @@
+"""
+그래프 실행을 요청(질문) 단위로 추적하는 계측 유틸리티 파일입니다.
+
+LangChain 콜백으로 그래프 노드와 LLM 호출의 소요 시간, 토큰 수, 예상 비용,
+캐시 적중 여부를 기록하고, 임베딩 호출은 CachedEmbeddings가, 답변 생성 문맥의 구절 수와
+토큰 수는 build_context가 현재 요청의 추적 객체에 직접 기록합니다. 완료된 요청은 프로세스 전체의 집계기(최근 TRACE_WINDOW개)에 쌓여
+어드민 페이지에서 노드별 지연 시간 분포로 확인할 수 있으며, TRACE_EXPORT_PATH를
+지정하면 요청마다 한 줄씩 JSONL 파일로도 내보냅니다.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+
+# 집계에 사용하는 최근 요청 수
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "500"))
+# 지정하면 완료된 요청의 추적 결과를 JSONL로 추가 기록합니다.
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+# 모델별 100만 토큰당 가격(USD): (입력, 출력)
+MODEL_PRICES_PER_MILLION_TOKENS = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+# 노드 지연 시간 히스토그램의 구간 경계(ms)
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+# 실행 중인 LLM 호출의 캐시 적중 표시. LangChain은 배치와 비동기 호출을 복사된 컨텍스트에서 실행하므로,
+# 값을 바꾸는 대신 호출마다 만든 변경 가능한 표시 객체를 공유합니다.
+_llm_cache_marker: ContextVar[Optional[Dict[str, bool]]] = ContextVar("llm_cache_marker", default=None)
+
+def estimate_cost(model: Optional[str], input_tokens: int, output_tokens: int = 0) -> float:
+    """Estimated USD cost of a call; unknown models are counted as free."""
+    for name, (input_price, output_price) in sorted(MODEL_PRICES_PER_MILLION_TOKENS.items(), key=lambda item: -len(item[0])):
+        if model and model.startswith(name):
+            return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return 0.0
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for calls that do not report usage: about 4 characters per token
+    for English, and at least one token per character for Hangul (multi-byte characters).
+    """
+    return max(1, len(text) // 4 + (len(text.encode("utf-8")) - len(text)) // 2)
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in [0, 100]) of a non-empty list."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class RequestTrace:
+    """질문 하나를 처리하는 동안의 노드, LLM 호출, 임베딩 호출 기록입니다."""
+
+    def __init__(self, question: str):
+        self.request_id = uuid.uuid4().hex
+        self.question = question
+        self.started_at = time.time()
+        self.total_seconds: Optional[float] = None
+        self.nodes: List[Dict[str, Any]] = []
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.embedding_calls: List[Dict[str, Any]] = []
+        self.contexts: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, record: Dict[str, Any]):
+        with self._lock:
+            getattr(self, kind).append(record)
+
+    @property
+    def retries(self) -> int:
+        return max(0, sum(1 for node in self.nodes if node["node"] == "retrieve") - 1)
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self._started
+
+    def to_dict(self) -> Dict[str, Any]:
+        llm_and_embedding = self.llm_calls + self.embedding_calls
+        return {
+            "request_id": self.request_id,
+            "question": self.question,
+            "started_at": self.started_at,
+            "total_seconds": self.total_seconds,
+            "retries": self.retries,
+            "input_tokens": sum(call["input_tokens"] for call in llm_and_embedding),
+            "output_tokens": sum(call.get("output_tokens", 0) for call in self.llm_calls),
+            "cost_usd": sum(call["cost_usd"] for call in llm_and_embedding),
+            "nodes": self.nodes,
+            "llm_calls": self.llm_calls,
+            "embedding_calls": self.embedding_calls,
+            "contexts": self.contexts,
+        }
+
+def mark_llm_cache_hit():
+    """Called by the LLM response caches on a hit; the LLM call running in this context is then recorded as cached."""
+    marker = _llm_cache_marker.get()
+    if marker is not None:
+        marker["hit"] = True
+
+def record_embedding_call(model: str, texts: List[str], embedded_texts: List[str], seconds: float):
+    """
+    Records an embedding call on the current request, if one is being traced.
+
+    Args:
+        texts: All texts requested.
+        embedded_texts: The texts that actually went to the embedding API (cache misses).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    input_tokens = sum(estimate_tokens(text) for text in embedded_texts)
+    trace.add("embedding_calls", {
+        "model": model,
+        "seconds": seconds,
+        "texts": len(texts),
+        "cache_hits": len(texts) - len(embedded_texts),
+        "input_tokens": input_tokens,
+        "cost_usd": estimate_cost(model, input_tokens),
+    })
+
+def record_context(chunks: int, passages: int, used_passages: int, tokens: int, token_budget: int, truncated: bool):
+    """
+    Records how a generation context was built on the current request, if one is being traced.
+
+    Args:
+        chunks: Graded chunks given to build_context.
+        passages: Passages left after merging overlapping chunks.
+        used_passages: Passages that fit in the token budget (including a truncated one).
+        truncated: Whether passages were cut or left out to stay within token_budget.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    trace.add("contexts", {
+        "chunks": chunks,
+        "passages": passages,
+        "used_passages": used_passages,
+        "tokens": tokens,
+        "token_budget": token_budget,
+        "truncated": truncated,
+    })
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """그래프 노드와 LLM 호출의 시작/종료를 받아 RequestTrace에 기록하는 콜백입니다."""
+
+    # 비동기 실행에서도 이벤트 루프 스레드에서 바로 기록합니다.
+    run_inline = True
+
+    def __init__(self, trace: RequestTrace):
+        self.trace = trace
+        self._nodes: Dict[Any, tuple] = {}
+        self._llm_runs: Dict[Any, tuple] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # 노드 안에서 실행되는 체인도 같은 메타데이터를 가지므로, 노드 자체의 실행만 기록합니다.
+        if node and kwargs.get("name") == node:
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def _end_node(self, run_id, error: bool):
+        if run_id in self._nodes:
+            node, started = self._nodes.pop(run_id)
+            self.trace.add("nodes", {"node": node, "seconds": time.perf_counter() - started, "error": error})
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_node(run_id, error=False)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_node(run_id, error=True)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (kwargs.get("invocation_params") or {}).get("model")
+        # 캐시 조회는 이 콜백과 같은 컨텍스트(또는 그 복사본)에서 실행되므로 호출마다 새 표시 객체를 둡니다.
+        marker = {"hit": False}
+        _llm_cache_marker.set(marker)
+        self._llm_runs[run_id] = (metadata.get("langgraph_node"), model, time.perf_counter(), marker)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if run_id not in self._llm_runs:
+            return
+        node, model, started, marker = self._llm_runs.pop(run_id)
+        cached = marker["hit"]
+
+        usage = {}
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        if message is not None and getattr(message, "usage_metadata", None):
+            usage = message.usage_metadata
+        elif response.llm_output and response.llm_output.get("token_usage"):
+            token_usage = response.llm_output["token_usage"]
+            usage = {"input_tokens": token_usage.get("prompt_tokens", 0), "output_tokens": token_usage.get("completion_tokens", 0)}
+        input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+        self.trace.add("llm_calls", {
+            "node": node,
+            "model": model,
+            "seconds": time.perf_counter() - started,
+            "cached": cached,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            # 캐시에서 꺼낸 응답은 API 비용이 들지 않습니다.
+            "cost_usd": 0.0 if cached else estimate_cost(model, input_tokens, output_tokens),
+        })
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._llm_runs.pop(run_id, None)
+
+def _latency_stats(seconds: List[float]) -> Dict[str, Any]:
+    if not seconds:
+        return {"count": 0}
+    return {
+        "count": len(seconds),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 1),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 1),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 1),
+    }
+
+def _histogram(seconds: List[float]) -> Dict[str, int]:
+    buckets = {f"<{edge}ms": 0 for edge in LATENCY_BUCKETS_MS}
+    buckets[f">={LATENCY_BUCKETS_MS[-1]}ms"] = 0
+    for value in seconds:
+        ms = value * 1000
+        label = next((f"<{edge}ms" for edge in LATENCY_BUCKETS_MS if ms < edge), f">={LATENCY_BUCKETS_MS[-1]}ms")
+        buckets[label] += 1
+    return buckets
+
+class TraceAggregator:
+    """최근 요청들의 추적 결과를 모아 노드별 지연 시간, 토큰, 비용, 캐시 적중률을 집계합니다."""
+
+    def __init__(self, window: int = TRACE_WINDOW, export_path: Optional[str] = TRACE_EXPORT_PATH):
+        self.export_path = Path(export_path) if export_path else None
+        self._traces: "deque[Dict[str, Any]]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, trace: RequestTrace):
+        data = trace.to_dict()
+        with self._lock:
+            self._traces.append(data)
+            if self.export_path:
+                self.export_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+    def recent(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._traces)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Aggregates the rolling window.
+
+        Returns:
+            A dictionary with request-level latency/cost/retry figures, one row per node
+            (latency percentiles, share of total time, LLM calls, tokens, cost, histogram)
+            and embedding call figures.
+        """
+        traces = self.recent()
+        totals = [t["total_seconds"] for t in traces if t["total_seconds"] is not None]
+        total_time = sum(totals) or 1.0
+
+        node_seconds: Dict[str, List[float]] = {}
+        for t in traces:
+            for node in t["nodes"]:
+                node_seconds.setdefault(node["node"], []).append(node["seconds"])
+        llm_calls = [call for t in traces for call in t["llm_calls"]]
+        embedding_calls = [call for t in traces for call in t["embedding_calls"]]
+        contexts = [context for t in traces for context in t.get("contexts", [])]
+
+        nodes = []
+        for node, seconds in node_seconds.items():
+            calls = [call for call in llm_calls if call["node"] == node]
+            nodes.append({
+                "node": node,
+                **_latency_stats(seconds),
+                "share_of_total": round(sum(seconds) / total_time, 3),
+                "llm_calls": len(calls),
+                "llm_cache_hits": sum(1 for call in calls if call["cached"]),
+                "input_tokens": sum(call["input_tokens"] for call in calls),
+                "output_tokens": sum(call["output_tokens"] for call in calls),
+                "cost_usd": round(sum(call["cost_usd"] for call in calls), 6),
+                "histogram": _histogram(seconds),
+            })
+        nodes.sort(key=lambda row: -row["share_of_total"])
+
+        embedding_texts = sum(call["texts"] for call in embedding_calls)
+        return {
+            "requests": len(traces),
+            "latency": _latency_stats(totals),
+            "cost_usd": round(sum(t["cost_usd"] for t in traces), 6),
+            "input_tokens": sum(t["input_tokens"] for t in traces),
+            "output_tokens": sum(t["output_tokens"] for t in traces),
+            "llm_calls": len(llm_calls),
+            "llm_cache_hit_rate": round(sum(1 for c in llm_calls if c["cached"]) / len(llm_calls), 3) if llm_calls else None,
+            "embedding_calls": len(embedding_calls),
+            "embedding_cache_hit_rate": round(sum(c["cache_hits"] for c in embedding_calls) / embedding_texts, 3) if embedding_texts else None,
+            "mean_retries": round(sum(t["retries"] for t in traces) / len(traces), 2) if traces else None,
+            "requests_with_retries": sum(1 for t in traces if t["retries"]),
+            "contexts": len(contexts),
+            "mean_context_tokens": round(sum(c["tokens"] for c in contexts) / len(contexts), 1) if contexts else None,
+            "mean_context_passages": round(sum(c["used_passages"] for c in contexts) / len(contexts), 2) if contexts else None,
+            "truncated_contexts": sum(1 for c in contexts if c["truncated"]),
+            "nodes": nodes,
+        }
+
+@lru_cache(maxsize=None)
+def get_trace_aggregator() -> TraceAggregator:
+    """Returns the process-wide aggregator shared by every Streamlit session."""
+    return TraceAggregator()
+
+@contextmanager
+def trace_request(question: str, aggregator: Optional[TraceAggregator] = None):
+    """
+    Traces one graph run. Pass the yielded handler in the run config:
+
+        with trace_request(question) as tracer:
+            rag_app.invoke(inputs, config={"callbacks": [tracer]})
+
+    The finished trace is recorded on the aggregator (the process-wide one by default).
+    """
+    trace = RequestTrace(question)
+    token = _current_trace.set(trace)
+    try:
+        yield TracingCallbackHandler(trace)
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+        (aggregator or get_trace_aggregator()).record(trace)
@@ -3,31 +3,788 @@
 
 분할된 텍스트 조각(chunk)들을 임베딩하여 벡터로 변환하고,
 이를 FAISS 벡터 저장소에 저장하거나 이미 저장된 인덱스를 불러오는
-기능을 수행합니다.
+기능을 수행합니다. 인덱스는 작품(literature) 단위의 샤드로 한 번만 만들어지며,
+여러 작품을 선택한 경우 샤드들을 검색 시점에 합쳐서 사용합니다.
+
+인덱스 종류(Flat, HNSW, IVF-Flat, IVF-PQ, SQ8, fp16)를 고를 수 있으며, 학습이 필요한
+인덱스는 청크 임베딩으로 자동 학습합니다. 선택한 종류는 샤드 디렉토리의
+'index_meta.json'에 기록되고 샤드 경로(키)에도 포함됩니다.
+
+기본 저장 형식('sqlite')은 청크 본문을 pickle로 저장하지 않고 'literature.db'의
+chunks 테이블에서 검색 결과(top-k)에 해당하는 청크만 id로 읽어옵니다. 벡터 인덱스는
+mmap으로 불러오므로 로딩이 거의 즉시 끝나고, 여러 프로세스가 페이지 캐시를 공유합니다.
+
+인덱스를 만들 때는 청크를 배치로 나누어 분당 요청/토큰 한도 안에서 동시에 임베딩합니다.
+완료된 배치는 바로 임베딩 캐시(embedding_cache_utils)에 기록되므로, 생성 도중 중단되어도
+다시 실행하면 이미 임베딩한 배치는 API를 호출하지 않고 이어서 진행합니다.
+
+각 인덱스와 함께 'index_manifest.json'(임베딩 모델, 청크 설정, 원본 작품 id, 벡터별 청크 id와
+내용 해시)을 저장합니다. 인덱스를 불러올 때 현재 청크와 비교하여 사라진 청크의 벡터는 지우고
+새 청크만 임베딩하므로, 'literature.db'의 본문이 고쳐지면 수정한 분량만큼만 다시 계산합니다.
+파일은 임시 이름으로 쓴 뒤 os.replace로 교체하므로(매니페스트는 마지막), 기존 인덱스를
+mmap으로 사용 중인 프로세스는 이전 파일을 계속 읽을 수 있습니다.
 """
+import hashlib
+import json
+import math
+import os
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 
-def get_or_create_vector_store(chunks, path: Path, embeddings):
+from utils.db_utils import get_chunks_by_ids
+from utils.embedding_cache_utils import CachedEmbeddings
+from utils.load_and_split_text_utils import chunk_content_hash, chunks_to_documents
+from utils.rate_limit_utils import RateLimitBackoff, RequestBudget, is_rate_limit_error
+from utils.tracing_utils import estimate_tokens
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq8", "fp16")
+DEFAULT_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+INDEX_META_FILENAME = "index_meta.json"
+# 인덱스를 만든 설정과 벡터별 청크(id, 내용 해시)를 기록하는 파일
+INDEX_MANIFEST_FILENAME = "index_manifest.json"
+INDEX_MANIFEST_VERSION = 1
+
+# 저장 형식: 'sqlite'(벡터만 저장, 청크는 DB에서 조회) 또는 'pickle'(LangChain 기본 형식)
+VECTOR_STORE_FORMATS = ("sqlite", "pickle")
+DEFAULT_VECTOR_STORE_FORMAT = os.getenv("VECTOR_STORE_FORMAT", "sqlite")
+INDEX_FILENAME = "index.faiss"
+DOCSTORE_IDS_FILENAME = "index_to_docstore_id.json"
+PICKLE_DOCSTORE_FILENAME = "index.pkl"
+# 벡터 코드를 힙으로 복사하지 않고 파일을 그대로 매핑합니다.
+FAISS_MMAP_IO_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+# 인덱스 생성 시 임베딩 배치 크기, 동시 요청 수, 분당 한도 (OpenAI 계정 등급에 맞게 조정)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "3000"))
+EMBEDDING_TOKENS_PER_MINUTE = float(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))
+# 한도 초과(429) 시 배치 하나를 다시 시도하는 횟수
+EMBEDDING_MAX_ATTEMPTS = 6
+
+# 바뀐 청크가 인덱스의 이 비율을 넘으면 부분 갱신 대신 새로 만듭니다.
+INCREMENTAL_UPDATE_MAX_CHANGE_RATIO = 0.5
+# 저장된 벡터를 손실 없이 복원할 수 없어 부분 갱신 대신 새로 만드는 인덱스 종류
+LOSSY_INDEX_TYPES = ("ivf_pq",)
+
+# HNSW: 노드당 이웃 수와 검색 시 탐색 폭
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+# IVF: 검색 시 살펴볼 클러스터 수
+IVF_NPROBE = 8
+# k-means 중심점 하나당 필요한 최소 학습 벡터 수 (FAISS가 이보다 적으면 경고하고 품질이 떨어집니다)
+MIN_TRAINING_POINTS_PER_CENTROID = 39
+# PQ 코드 비트 수의 범위. 4비트(중심점 16개)도 학습할 수 없을 만큼 작은 샤드는 PQ를 사용하지 않습니다.
+PQ_MAX_NBITS = 8
+PQ_MIN_NBITS = 4
+
+def get_index_factory_string(index_type: str, dimension: int, n_vectors: int) -> str:
     """
-    Checks if a vector store exists at the given path for the given embeddings.
-    If it exists, loads it. Otherwise, creates a new one and saves it.
+    Returns the faiss.index_factory description for an index type, sized for n_vectors.
+
+    IVF indexes use about 4*sqrt(n) lists (at least 39 training points per list),
+    and PQ uses one sub-quantizer per 16 dimensions with as many bits (up to 8) as leave
+    39 training points per centroid. Shards too small for 4-bit PQ use IVF-Flat instead,
+    or Flat when they are too small for more than one IVF list.
     """
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path_str = str(path)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+    nlist = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // MIN_TRAINING_POINTS_PER_CENTROID))
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        m = next(m for m in range(max(1, dimension // 16), 0, -1) if dimension % m == 0)
+        # 각 서브 양자화기는 2^nbits개의 중심점을 모든 학습 벡터로 학습합니다.
+        nbits = min(PQ_MAX_NBITS, int(math.log2(max(n_vectors // MIN_TRAINING_POINTS_PER_CENTROID, 1))))
+        if nbits >= PQ_MIN_NBITS:
+            return f"IVF{nlist},PQ{m}x{nbits}"
+        fallback = f"IVF{nlist},Flat" if nlist > 1 else "Flat"
+        print(
+            f"벡터 {n_vectors}개로는 PQ를 학습할 수 없어 (최소 {MIN_TRAINING_POINTS_PER_CENTROID * 2 ** PQ_MIN_NBITS}개 필요) "
+            f"'{fallback}' 인덱스를 사용합니다."
+        )
+        return fallback
+    if index_type == "sq8":
+        return "SQ8"
+    return "SQfp16"
 
-    if path.exists():
-        print(f"Loading existing vector store from {path_str}...")
+def build_faiss_index(vectors: np.ndarray, index_type: str = "flat") -> Tuple[faiss.Index, str]:
+    """
+    Builds, trains (if needed) and fills a FAISS index of the given type.
+
+    Returns:
+        (index, factory_string)
+    """
+    n_vectors, dimension = vectors.shape
+    factory_string = get_index_factory_string(index_type, dimension, n_vectors)
+    index = faiss.index_factory(dimension, factory_string, faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    if index_type == "hnsw":
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif faiss.try_extract_index_ivf(index) is not None:
+        # 작은 샤드의 ivf_pq는 Flat으로 대체될 수 있으므로 실제로 만든 인덱스를 확인합니다.
+        faiss.extract_index_ivf(index).nprobe = IVF_NPROBE
+    index.add(vectors)
+    return index, factory_string
+
+@lru_cache(maxsize=None)
+def get_embedding_budget() -> RequestBudget:
+    """Returns the per-minute request/token budget shared by every index build in the process."""
+    return RequestBudget(EMBEDDING_REQUESTS_PER_MINUTE, EMBEDDING_TOKENS_PER_MINUTE)
+
+def embed_documents_in_batches(
+    texts: List[str],
+    embeddings: Embeddings,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+    budget: Optional[RequestBudget] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> List[List[float]]:
+    """
+    Embeds texts in batches with bounded concurrency, under the per-minute request/token budget.
+
+    Rate-limited batches are retried with a backoff shared by all workers. With CachedEmbeddings,
+    every finished batch is committed to the embedding cache, so a build that is interrupted
+    resumes from the batches already embedded; only the uncached texts count against the budget.
+
+    Args:
+        progress_callback: Called as progress_callback(done_texts, total_texts) from the calling
+            thread after each batch (safe for Streamlit elements).
+
+    Returns:
+        The vectors, in the order of texts.
+    """
+    budget = budget or get_embedding_budget()
+    backoff = RateLimitBackoff(initial_seconds=1.0, max_seconds=60.0)
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+
+    def embed_batch(batch: List[str]) -> List[List[float]]:
+        for attempt in range(EMBEDDING_MAX_ATTEMPTS):
+            # 캐시에 있는 텍스트는 API를 호출하지 않으므로 한도에서 빼고, 모두 캐시에 있으면 기다리지 않습니다.
+            uncached = embeddings.uncached_texts(batch) if isinstance(embeddings, CachedEmbeddings) else batch
+            if uncached:
+                backoff.wait()
+                budget.acquire(sum(estimate_tokens(text) for text in uncached))
+            try:
+                return embeddings.embed_documents(batch)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == EMBEDDING_MAX_ATTEMPTS - 1:
+                    raise
+                delay = backoff.hit(attempt)
+                print(f"임베딩 요청 한도 초과: {delay:.1f}초 후 배치를 다시 임베딩합니다.")
+
+    results: List[Optional[List[List[float]]]] = [None] * len(batches)
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(batches)))) as executor:
+        futures = {executor.submit(embed_batch, batch): i for i, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            done += len(batches[i])
+            if progress_callback:
+                progress_callback(done, len(texts))
+    return [vector for batch_vectors in results for vector in batch_vectors]
+
+def build_vector_store(
+    chunks: List[Document],
+    embeddings: Embeddings,
+    index_type: str = "flat",
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[FAISS, Dict[str, Any]]:
+    """
+    Embeds the chunks (see embed_documents_in_batches) and builds a FAISS store with the requested index type.
+
+    Returns:
+        (vector_store, index_meta) — index_meta describes the index for 'index_meta.json'.
+    """
+    texts = [doc.page_content for doc in chunks]
+    vectors = np.asarray(embed_documents_in_batches(texts, embeddings, progress_callback=progress_callback), dtype="float32")
+    index, factory_string = build_faiss_index(vectors, index_type)
+    ids = [doc.id or str(uuid.uuid4()) for doc in chunks]
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, chunks))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+    index_meta = {
+        "index_type": index_type,
+        "factory": factory_string,
+        "dimension": int(vectors.shape[1]),
+        "ntotal": int(index.ntotal),
+    }
+    return vector_store, index_meta
+
+class SQLiteChunkDocstore(Docstore):
+    """
+    'literature.db'의 chunks 테이블을 FAISS의 docstore로 사용하는 읽기 전용 저장소입니다.
+    검색 결과에 해당하는 청크만 id로 조회하므로 청크 본문을 메모리에 올려두지 않습니다.
+    """
+
+    def __init__(self, literature: Dict[str, Any]):
+        self.literature = literature
+
+    def search(self, search: str):
+        document = self.mget([search])[0]
+        return f"ID {search} not found." if document is None else document
+
+    def mget(self, ids: List[str]) -> List[Optional[Document]]:
+        """Reads the chunks of several ids in one query (None for chunks that no longer exist)."""
+        chunks = get_chunks_by_ids([int(chunk_id) for chunk_id in ids])
+        return [
+            chunks_to_documents([chunks[int(chunk_id)]], self.literature)[0] if int(chunk_id) in chunks else None
+            for chunk_id in ids
+        ]
+
+def read_faiss_index(index_path: Path) -> faiss.Index:
+    """Memory-maps a FAISS index file, falling back to a regular read if the index type does not support it."""
+    try:
+        return faiss.read_index(str(index_path), FAISS_MMAP_IO_FLAGS)
+    except RuntimeError:
+        return faiss.read_index(str(index_path))
+
+def file_sha256(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stage_file(path: Path, filename: str, write: Callable[[Path], None]) -> Path:
+    """Writes a store file under a unique temporary name in the store directory and returns that path."""
+    temp_path = path / f".{filename}.{uuid.uuid4().hex}.tmp"
+    write(temp_path)
+    return temp_path
+
+def commit_store_files(path: Path, staged: Dict[str, Path], manifest: Optional[Dict[str, Any]] = None):
+    """
+    Moves staged files into place with os.replace, writing the manifest last.
+
+    Processes that memory-mapped the old index keep reading the old file (its inode stays alive).
+    If the process dies midway, the old manifest no longer matches 'index.faiss', so the store
+    is rebuilt on the next load instead of being used with a mismatched id list.
+    """
+    if manifest is not None:
+        index_path = staged.get(INDEX_FILENAME, path / INDEX_FILENAME)
+        manifest = {**manifest, "index_sha256": file_sha256(index_path)}
+        staged = {**staged, INDEX_MANIFEST_FILENAME: stage_file(
+            path, INDEX_MANIFEST_FILENAME,
+            lambda p: p.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8"),
+        )}
+    for filename, temp_path in staged.items():
+        os.replace(temp_path, path / filename)
+
+def save_sqlite_vector_store(
+    vector_store: FAISS, path: Path, index_meta: Dict[str, Any], literature: Dict[str, Any],
+    manifest: Optional[Dict[str, Any]] = None,
+):
+    """
+    Saves only the vectors and the position -> chunk id mapping; chunk texts stay in literature.db.
+    Files are written to temporary names first so a store that is mapped elsewhere is never truncated.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    ids = [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+    meta = {**index_meta, "docstore": "sqlite", "literature": literature}
+    staged = {
+        INDEX_FILENAME: stage_file(path, INDEX_FILENAME, lambda p: faiss.write_index(vector_store.index, str(p))),
+        DOCSTORE_IDS_FILENAME: stage_file(path, DOCSTORE_IDS_FILENAME, lambda p: p.write_text(json.dumps(ids), encoding="utf-8")),
+        INDEX_META_FILENAME: stage_file(
+            path, INDEX_META_FILENAME,
+            lambda p: p.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8"),
+        ),
+    }
+    commit_store_files(path, staged, manifest)
+
+def save_pickle_vector_store(
+    vector_store: FAISS, path: Path, index_meta: Dict[str, Any], manifest: Optional[Dict[str, Any]] = None
+):
+    """Saves a store in LangChain's format ('index.faiss' + 'index.pkl'), swapping the files in like the sqlite format."""
+    path.mkdir(parents=True, exist_ok=True)
+    staging_dir = path / f".staging_{uuid.uuid4().hex}"
+    vector_store.save_local(str(staging_dir))
+    staged = {
+        INDEX_FILENAME: staging_dir / INDEX_FILENAME,
+        PICKLE_DOCSTORE_FILENAME: staging_dir / PICKLE_DOCSTORE_FILENAME,
+        INDEX_META_FILENAME: stage_file(path, INDEX_META_FILENAME, lambda p: p.write_text(json.dumps(index_meta, indent=2), encoding="utf-8")),
+    }
+    commit_store_files(path, staged, manifest)
+    staging_dir.rmdir()
+
+def load_sqlite_vector_store(path: Path, embeddings: Embeddings, index_meta: Dict[str, Any]) -> FAISS:
+    """Loads a 'sqlite' format store: a memory-mapped index and a docstore backed by the chunks table."""
+    ids = json.loads((path / DOCSTORE_IDS_FILENAME).read_text(encoding="utf-8"))
+    return FAISS(
+        embedding_function=embeddings,
+        index=read_faiss_index(path / INDEX_FILENAME),
+        docstore=SQLiteChunkDocstore(index_meta["literature"]),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+def read_index_meta(path: Path) -> Dict[str, Any]:
+    """Reads a store's index metadata; stores built before index types existed are flat."""
+    meta_path = path / INDEX_META_FILENAME
+    if meta_path.exists():
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    return {"index_type": "flat", "factory": "Flat"}
+
+def read_index_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    """Reads a store's manifest; None for stores saved before manifests existed."""
+    manifest_path = path / INDEX_MANIFEST_FILENAME
+    if manifest_path.exists():
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    return None
+
+def describe_chunks(chunks: List[Document]) -> List[List[str]]:
+    """
+    Returns the manifest entries [key, content hash] of chunks, in index position order.
+    The key is the chunk id (stable while the chunk text is unchanged), or the hash for chunks without an id.
+    """
+    entries = []
+    for doc in chunks:
+        content_hash = chunk_content_hash(doc.page_content)
+        entries.append([doc.id or content_hash, content_hash])
+    return entries
+
+def literature_ids_of(chunks: List[Document]) -> List[int]:
+    return sorted({doc.metadata["literature_id"] for doc in chunks if "literature_id" in doc.metadata})
+
+def build_index_manifest(
+    entries: List[List[str]], literature_ids: List[int], index_meta: Dict[str, Any], index_params: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Describes what a store was built from: index parameters, source books and one entry per vector."""
+    return {
+        "version": INDEX_MANIFEST_VERSION,
+        **(index_params or {}),
+        "index_type": index_meta["index_type"],
+        "literature_ids": literature_ids,
+        "ntotal": len(entries),
+        "chunks": entries,
+    }
+
+def describe_stored_chunks(vector_store: FAISS, chunks: List[Document]) -> List[List[str]]:
+    """Rebuilds the manifest entries of a store saved before manifests existed."""
+    ids = [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+    if isinstance(vector_store.docstore, SQLiteChunkDocstore):
+        # 청크 id는 본문이 바뀌지 않은 동안에만 유지되므로, 현재 청크에 남아 있는 id는 내용도 같습니다.
+        hashes = {doc.id: chunk_content_hash(doc.page_content) for doc in chunks}
+        return [[chunk_id, hashes.get(chunk_id)] for chunk_id in ids]
+    return describe_chunks([vector_store.docstore.search(docstore_id) for docstore_id in ids])
+
+def diff_chunk_entries(stored_entries: List[List[str]], chunk_entries: List[List[str]]) -> Tuple[List[int], List[int]]:
+    """
+    Compares a store's manifest entries with the entries of the current chunks.
+
+    Returns:
+        (positions of stored vectors whose chunk no longer exists, positions of current chunks that have no vector yet)
+    """
+    current_entries = [tuple(entry) for entry in chunk_entries]
+    unmatched = Counter(current_entries)
+    removed_positions = []
+    for position, entry in enumerate(stored_entries):
+        entry = tuple(entry)
+        if unmatched[entry] > 0:
+            unmatched[entry] -= 1
+        else:
+            removed_positions.append(position)
+    added_positions = []
+    for position, entry in enumerate(current_entries):
+        if unmatched[entry] > 0:
+            unmatched[entry] -= 1
+            added_positions.append(position)
+    return removed_positions, added_positions
+
+def remove_and_add_vectors(index: faiss.Index, removed_positions: List[int], new_vectors: np.ndarray) -> faiss.Index:
+    """
+    Deletes the vectors at removed_positions from a writable (not memory-mapped) index and appends
+    new_vectors. The remaining vectors keep their relative order and are renumbered from 0.
+    """
+    if isinstance(faiss.downcast_index(index), faiss.IndexFlatCodes):
+        if removed_positions:
+            index.remove_ids(np.asarray(removed_positions, dtype="int64"))
+    elif removed_positions:
+        # HNSW는 삭제를 지원하지 않고 IVF는 삭제 후 위치(id)를 다시 매기지 않으므로,
+        # 남은 벡터를 복원하여 학습된 인덱스를 비운 뒤 다시 넣습니다.
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        kept_vectors = np.delete(index.reconstruct_n(0, index.ntotal), removed_positions, axis=0)
+        index.reset()
+        index.add(kept_vectors)
+    if len(new_vectors):
+        index.add(new_vectors)
+    return index
+
+def create_vector_store(
+    chunks: List[Document],
+    path: Path,
+    embeddings: Embeddings,
+    index_type: str = "flat",
+    store_format: str = DEFAULT_VECTOR_STORE_FORMAT,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    index_params: Optional[Dict[str, Any]] = None,
+) -> FAISS:
+    """Builds a store from every chunk and saves it with its manifest (replacing any store at path)."""
+    if store_format not in VECTOR_STORE_FORMATS:
+        raise ValueError(f"Unknown vector store format '{store_format}'. Choose one of {VECTOR_STORE_FORMATS}.")
+    if store_format == "sqlite" and not all("chunk_id" in doc.metadata and "literature_id" in doc.metadata for doc in chunks):
+        print("Chunks are not stored in literature.db; falling back to the pickle format.")
+        store_format = "pickle"
+
+    print(f"Creating new vector store ({index_type}, {store_format}) and saving to {path}...")
+    vector_store, index_meta = build_vector_store(chunks, embeddings, index_type, progress_callback)
+    manifest = build_index_manifest(describe_chunks(chunks), literature_ids_of(chunks), index_meta, index_params)
+    if store_format == "sqlite":
+        literature = {"id": chunks[0].metadata["literature_id"], "title": chunks[0].metadata["title"]}
+        save_sqlite_vector_store(vector_store, path, index_meta, literature, manifest)
+        # 저장한 파일을 mmap으로 다시 열어, 방금 만든 청크 사본을 메모리에 두지 않습니다.
+        vector_store = load_sqlite_vector_store(path, embeddings, read_index_meta(path))
+    else:
+        save_pickle_vector_store(vector_store, path, index_meta, manifest)
+    print("Vector store created and saved successfully.")
+    return vector_store
+
+def sync_vector_store(
+    vector_store: FAISS,
+    path: Path,
+    embeddings: Embeddings,
+    chunk_entries: List[List[str]],
+    load_chunks: Callable[[], List[Document]],
+    load_chunks_by_ids: Optional[Callable[[List[str]], List[Document]]] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    index_params: Optional[Dict[str, Any]] = None,
+) -> FAISS:
+    """
+    Brings a loaded store up to date with the current chunks using its manifest.
+
+    Vectors of removed chunks are deleted and only added chunks are embedded, so the cost of an
+    update follows the size of the edit rather than the size of the book. The store is rebuilt
+    instead when its manifest was written for other parameters or does not match the index file,
+    when most chunks changed, or when the index cannot give back its vectors exactly (IVF-PQ).
+
+    Args:
+        chunk_entries: Manifest entries [key, content hash] of the current chunks (see describe_chunks).
+        load_chunks: Returns every current chunk; only called when the store has to be rebuilt or has no manifest.
+        load_chunks_by_ids: Returns the chunks with the given keys in that order, so that an update reads only
+            the added chunks. By default they are picked out of load_chunks().
+    """
+    index_meta = read_index_meta(path)
+    store_format = "sqlite" if index_meta.get("docstore") == "sqlite" else "pickle"
+    index_type = index_meta["index_type"]
+
+    def rebuild(reason: str) -> FAISS:
+        print(f"{reason} 인덱스를 새로 만듭니다 (바뀌지 않은 청크는 임베딩 캐시를 사용합니다).")
+        return create_vector_store(load_chunks(), path, embeddings, index_type, store_format, progress_callback, index_params)
+
+    manifest = read_index_manifest(path)
+    if manifest is not None:
+        if any(manifest.get(key) != value for key, value in (index_params or {}).items()):
+            return rebuild("매니페스트의 임베딩 모델 또는 청크 설정이 현재와 다릅니다.")
+        if manifest.get("ntotal") != vector_store.index.ntotal or manifest.get("index_sha256") != file_sha256(path / INDEX_FILENAME):
+            return rebuild("매니페스트가 인덱스 파일과 맞지 않습니다.")
+        stored_entries = manifest["chunks"]
+        literature_ids = manifest.get("literature_ids", [])
+    else:
+        chunks = load_chunks()
+        stored_entries = describe_stored_chunks(vector_store, chunks)
+        literature_ids = literature_ids_of(chunks)
+
+    removed_positions, added_positions = diff_chunk_entries(stored_entries, chunk_entries)
+    if not removed_positions and not added_positions:
+        if manifest is None:
+            # 매니페스트 없이 저장된 기존 인덱스에는 현재 청크 기준의 매니페스트를 기록해 둡니다.
+            commit_store_files(path, {}, build_index_manifest(stored_entries, literature_ids, index_meta, index_params))
+        return vector_store
+
+    print(f"청크 변경 감지 ({path.name}): 벡터 {len(removed_positions)}개 삭제, 청크 {len(added_positions)}개 추가")
+    changed = len(removed_positions) + len(added_positions)
+    if index_type in LOSSY_INDEX_TYPES:
+        return rebuild(f"'{index_type}' 인덱스는 저장된 벡터를 그대로 복원할 수 없으므로")
+    if changed > INCREMENTAL_UPDATE_MAX_CHANGE_RATIO * max(len(stored_entries), 1):
+        return rebuild("바뀐 청크가 많으므로")
+
+    if load_chunks_by_ids is None:
+        chunks = load_chunks()
+        added_chunks = [chunks[position] for position in added_positions]
+    else:
+        # 추가된 청크의 본문만 읽습니다.
+        added_chunks = load_chunks_by_ids([chunk_entries[position][0] for position in added_positions])
+    added_entries = [chunk_entries[position] for position in added_positions]
+    if describe_chunks(added_chunks) != added_entries:
+        return rebuild("추가할 청크를 읽는 동안 청크가 바뀌었으므로")
+
+    new_vectors = np.asarray(
+        embed_documents_in_batches([doc.page_content for doc in added_chunks], embeddings, progress_callback=progress_callback),
+        dtype="float32",
+    ).reshape(len(added_chunks), -1)
+    # mmap으로 연 인덱스는 수정할 수 없으므로 파일을 메모리로 읽어 고친 뒤 통째로 교체합니다.
+    index = remove_and_add_vectors(faiss.read_index(str(path / INDEX_FILENAME)), removed_positions, new_vectors)
+
+    removed = set(removed_positions)
+    kept_ids = [vector_store.index_to_docstore_id[i] for i in range(len(stored_entries)) if i not in removed]
+    added_ids = [doc.id or str(uuid.uuid4()) for doc in added_chunks]
+    entries = [entry for i, entry in enumerate(stored_entries) if i not in removed] + added_entries
+    index_meta = {**index_meta, "ntotal": int(index.ntotal)}
+    literature_ids = sorted(set(literature_ids) | set(literature_ids_of(added_chunks)))
+    manifest = build_index_manifest(entries, literature_ids, index_meta, index_params)
+
+    if store_format == "sqlite":
+        updated = FAISS(
+            embedding_function=embeddings, index=index, docstore=InMemoryDocstore({}),
+            index_to_docstore_id=dict(enumerate(kept_ids + added_ids)),
+        )
+        save_sqlite_vector_store(updated, path, index_meta, index_meta["literature"], manifest)
+        return load_sqlite_vector_store(path, embeddings, read_index_meta(path))
+
+    docstore = vector_store.docstore
+    docstore.delete([vector_store.index_to_docstore_id[i] for i in removed_positions])
+    docstore.add(dict(zip(added_ids, added_chunks)))
+    vector_store.index = index
+    vector_store.index_to_docstore_id = dict(enumerate(kept_ids + added_ids))
+    save_pickle_vector_store(vector_store, path, index_meta, manifest)
+    return vector_store
+
+def load_vector_store(path: Path, embeddings: Embeddings) -> FAISS:
+    """Loads a saved store in whichever format it was saved."""
+    print(f"Loading existing vector store from {path}...")
+    index_meta = read_index_meta(path)
+    if index_meta.get("docstore") == "sqlite":
+        vector_store = load_sqlite_vector_store(path, embeddings, index_meta)
+    else:
         vector_store = FAISS.load_local(
-            path_str, 
-            embeddings, 
+            str(path),
+            embeddings,
             allow_dangerous_deserialization=True
         )
-        print("Vector store loaded successfully.")
+    print("Vector store loaded successfully.")
+    return vector_store
+
+def get_or_create_vector_store(
+    chunks,
+    path: Path,
+    embeddings,
+    index_type: str = "flat",
+    store_format: str = DEFAULT_VECTOR_STORE_FORMAT,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    index_params: Optional[Dict[str, Any]] = None,
+):
+    """
+    Checks if a vector store exists at the given path for the given embeddings.
+    If it exists, loads it (in whichever format it was saved) and, when the current chunks are
+    given, updates it to match them (see sync_vector_store). Otherwise, creates a new one with
+    the given index type and saves it in store_format, reporting embedding progress to
+    progress_callback(done_texts, total_texts).
+
+    The 'sqlite' format needs chunks read from the chunks table (Documents whose id is the chunk id);
+    other chunks are saved in the 'pickle' format. index_params (embedding model, chunk size and
+    overlap) are recorded in the store's manifest; a manifest written for other values forces a rebuild.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if path.exists():
+        vector_store = load_vector_store(path, embeddings)
+        if chunks:
+            vector_store = sync_vector_store(
+                vector_store, path, embeddings, describe_chunks(chunks), lambda: chunks,
+                progress_callback=progress_callback, index_params=index_params,
+            )
     else:
-        print(f"Creating new vector store and saving to {path_str}...")
-        vector_store = FAISS.from_documents(chunks, embedding=embeddings)
-        vector_store.save_local(path_str)
-        print("Vector store created and saved successfully.")
+        vector_store = create_vector_store(chunks, path, embeddings, index_type, store_format, progress_callback, index_params)
     
     return vector_store
+
+def get_shard_fingerprint(path: Path) -> str:
+    """
+    Returns a fingerprint of a saved store that changes whenever it is rebuilt or updated
+    (its index metadata plus the name, size and modification time of every file).
+    """
+    digest = hashlib.sha256(str(path).encode("utf-8"))
+    if path.exists():
+        for file_path in sorted(p for p in path.iterdir() if p.is_file() and not p.name.startswith(".")):
+            stat = file_path.stat()
+            digest.update(f"{file_path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        digest.update(json.dumps(read_index_meta(path), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+def get_chunk_entries_fingerprint(chunk_entries: List[List[str]]) -> str:
+    """Returns a short fingerprint of a book's current chunks (their ids and content hashes)."""
+    return hashlib.sha256(json.dumps(chunk_entries).encode("utf-8")).hexdigest()[:16]
+
+def search_shard(shard: FAISS, embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+    """
+    Same search as FAISS.similarity_search_with_score_by_vector, but reads the hits of a SQLite docstore
+    in one query and skips hits whose chunk no longer exists instead of raising.
+
+    A shard that stays loaded while 'literature.db' is re-chunked (setup_database) keeps the deleted
+    chunk ids until it is reloaded; those hits are dropped so the request still gets the remaining ones.
+    """
+    vector = np.array([embedding], dtype=np.float32)
+    if shard._normalize_L2:
+        faiss.normalize_L2(vector)
+    scores, indices = shard.index.search(vector, k)
+    hits = [(shard.index_to_docstore_id[i], float(score)) for i, score in zip(indices[0], scores[0]) if i != -1]
+    if isinstance(shard.docstore, SQLiteChunkDocstore):
+        documents = shard.docstore.mget([docstore_id for docstore_id, _ in hits])
+    else:
+        documents = [shard.docstore.search(docstore_id) for docstore_id, _ in hits]
+    results = [(doc, score) for doc, (_, score) in zip(documents, hits) if isinstance(doc, Document)]
+    if len(results) < len(hits):
+        print(f"벡터 검색: 청크 {len(hits) - len(results)}개가 DB에 없어 제외했습니다 (샤드를 다시 불러오면 정리됩니다).")
+    return results
+
+def get_shard_path(
+    root: Path, literature_id: int, model_name: str, chunk_size: int, chunk_overlap: int, index_type: str = "flat"
+) -> Path:
+    """
+    Returns the directory of a single book's shard.
+    The shard is keyed by literature id, embedding model, chunking parameters and index type,
+    so the same book is embedded only once regardless of which titles it is selected with.
+    Flat shards keep the original directory name.
+    """
+    sanitized_model_name = model_name.replace("-", "_").replace("/", "_")
+    suffix = "" if index_type == "flat" else f"_{index_type}"
+    return root / f"book_{literature_id}_{sanitized_model_name}_cs{chunk_size}_co{chunk_overlap}{suffix}"
+
+def get_or_create_sharded_vector_store(
+    books: List[Dict[str, Any]],
+    root: Path,
+    embeddings,
+    model_name: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    load_chunks: Callable[[Dict[str, Any]], List[Document]],
+    registry=None,
+    owner: str = None,
+    index_type: str = "flat",
+    progress_callback: Optional[Callable[[Dict[str, Any], int, int], None]] = None,
+    load_chunk_entries: Optional[Callable[[Dict[str, Any]], List[List[str]]]] = None,
+    load_chunks_by_ids: Optional[Callable[[Dict[str, Any], List[str]], List[Document]]] = None,
+):
+    """
+    Loads (or builds, if missing) one shard per book and composes them into a
+    single searchable store.
+
+    Args:
+        books: Literature rows; each must contain at least 'id'.
+        root: Directory under which the shards are stored.
+        embeddings: Embedding model used for building and querying.
+        model_name: Embedding model name, part of the shard key.
+        chunk_size / chunk_overlap: Chunking parameters, part of the shard key.
+        load_chunks: Called with a book row to get its chunks when its shard has to be built (or rebuilt),
+            or to be diffed against the manifest of an existing shard when load_chunk_entries is not given.
+        registry: Optional ResourceRegistry; shards are then loaded once per process and shared. With
+            load_chunk_entries, the registry key includes the fingerprint of the book's current chunks, so a
+            shard loaded before the book was re-chunked is not reused (the new one is synced on load).
+        owner: Session id registered as a reference holder in the registry.
+        index_type: FAISS index type used when a shard has to be built (one of INDEX_TYPES).
+        progress_callback: Called as progress_callback(book, done_texts, total_texts) while a shard (or its added chunks) is embedded.
+        load_chunk_entries: Optional; called with a book row to get the manifest entries [chunk id, content hash]
+            of its current chunks without their text (empty if the book has no stored chunks yet). An existing
+            shard is then compared with its manifest without loading the chunks.
+        load_chunks_by_ids: Optional; called as load_chunks_by_ids(book, chunk_ids) to read only the chunks
+            added since the shard was saved (see sync_vector_store).
+
+    Returns:
+        ShardedVectorStore: A store that queries every shard and merges the top-k
+            ('shard_keys' holds the registry key of each book's shard).
+    """
+    shards = {}
+    shard_keys = {}
+    for book in books:
+        path = get_shard_path(root, book['id'], model_name, chunk_size, chunk_overlap, index_type)
+        chunk_entries = load_chunk_entries(book) if load_chunk_entries else None
+        chunks = None
+        if load_chunk_entries and not chunk_entries:
+            # 아직 청크가 없는 작품은 먼저 청크를 만들어 두어야 샤드 키의 지문이 정해집니다.
+            chunks = load_chunks(book)
+            chunk_entries = describe_chunks(chunks)
+        shard_key = f"{path}@{get_chunk_entries_fingerprint(chunk_entries)}" if chunk_entries else str(path)
+
+        def load_shard(path=path, book=book, chunk_entries=chunk_entries, chunks=chunks):
+            # 샤드가 있어도 현재 청크를 매니페스트와 비교하므로, 본문이 고쳐진 작품은 바뀐 청크만 다시 임베딩됩니다.
+            report = (lambda done, total, book=book: progress_callback(book, done, total)) if progress_callback else None
+            index_params = {"embedding_model": model_name, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+            if chunks is not None or not chunk_entries or not path.exists():
+                return get_or_create_vector_store(
+                    chunks if chunks is not None else load_chunks(book), path, embeddings, index_type,
+                    progress_callback=report, index_params=index_params,
+                )
+            # 청크 본문은 인덱스를 다시 만들거나 청크가 추가되었을 때만 읽습니다.
+            return sync_vector_store(
+                load_vector_store(path, embeddings), path, embeddings, chunk_entries,
+                lambda: load_chunks(book),
+                (lambda chunk_ids: load_chunks_by_ids(book, chunk_ids)) if load_chunks_by_ids else None,
+                progress_callback=report, index_params=index_params,
+            )
+
+        shard_keys[book['id']] = shard_key
+        if registry is None:
+            shards[book['id']] = load_shard()
+        else:
+            # 이미 다른 세션이 불러온 샤드는 디스크에서 다시 읽지 않고 공유합니다.
+            shards[book['id']] = registry.acquire(
+                shard_key, load_shard, owner, kind="shard", size_fn=estimate_vector_store_bytes
+            )
+    return ShardedVectorStore(shards, embeddings, shard_keys)
+
+def estimate_vector_store_bytes(vector_store: FAISS) -> int:
+    """Roughly estimates the resident size of a FAISS store: its vectors plus the stored chunk texts."""
+    index = vector_store.index
+    # HNSW는 벡터를 내부 storage 인덱스에 보관합니다 (그래프 링크는 제외한 추정치).
+    code_size = getattr(index, "code_size", None) or getattr(getattr(index, "storage", None), "code_size", index.d * 4)
+    docstore_bytes = sum(
+        len(doc.page_content.encode("utf-8")) for doc in getattr(vector_store.docstore, "_dict", {}).values()
+    )
+    return index.ntotal * code_size + docstore_bytes
+
+class ShardedVectorStore:
+    """
+    여러 작품의 FAISS 샤드를 하나의 벡터 저장소처럼 검색하는 읽기 전용 래퍼입니다.
+
+    각 샤드에서 top-k를 구한 뒤 거리(distance) 기준으로 병합하므로,
+    샤드를 메모리에서 다시 합치거나 재임베딩할 필요가 없습니다.
+    샤드는 레지스트리에서 모든 세션이 공유하고 매니페스트와 함께 저장되므로 검색만 제공하며,
+    LangChain VectorStore의 추가(add_texts/from_texts) 인터페이스는 구현하지 않습니다.
+    작품을 고치려면 'literature.db'의 본문을 수정하면 다음에 샤드를 불러올 때 바뀐 청크만 임베딩됩니다.
+    """
+
+    def __init__(self, shards: Dict[int, FAISS], embeddings: Embeddings, shard_keys: Optional[Dict[int, str]] = None):
+        self.shards = shards
+        self.shard_keys = shard_keys or {}
+        self._embeddings = embeddings
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """Queries every shard with the same vector and merges the results by distance (see search_shard)."""
+        results = []
+        for shard in self.shards.values():
+            results.extend(search_shard(shard, embedding, k))
+        results.sort(key=lambda pair: pair[1])
+        return results[:k]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        embedding = self._embeddings.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k)]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]